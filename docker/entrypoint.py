@@ -1,21 +1,27 @@
 #!/usr/bin/env python3
 """
 Spaetzli Docker Entrypoint
-Starts the mock premium server, then Rotki backend, colibri, and nginx
+Starts the mock premium server, Rotki backend, colibri and nginx, then
+supervises them and restarts any that exit
 """
+import http.client
 import json
 import logging
 import os
-import shutil
+import select
+import socket
 import subprocess
 import sys
+import threading
 import time
-from datetime import UTC, datetime, timedelta
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from pathlib import Path
-from signal import SIGINT, SIGQUIT, SIGTERM, signal
+from signal import SIGCHLD, SIGINT, SIGQUIT, SIGTERM, set_wakeup_fd, signal
 from types import FrameType
 from typing import Any
 from urllib.error import HTTPError, URLError
+from urllib.parse import quote
 from urllib.request import Request, urlopen
 
 logger = logging.getLogger('spaetzli')
@@ -23,51 +29,466 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 
 DEFAULT_LOG_LEVEL = 'critical'
 MOCK_PORT = 18090
+# When set, the mock server listens on this Unix socket and Rotki reaches it
+# through an http+unix:// URL, skipping the TCP stack
+MOCK_SOCKET = os.environ.get('SPAETZLI_MOCK_SOCKET')
 
+PROBE_INITIAL_DELAY = 0.05
+PROBE_MAX_DELAY = 1.0
+TIMING_REPORT_FILE = Path('/logs/spaetzli_startup.json')
+SUPERVISOR_STATUS_FILE = Path('/logs/spaetzli_supervisor.json')
 
-def check_api_availability(url: str, name: str, retries: int = 30, wait_seconds: int = 2) -> bool:
-    """Check if an API endpoint is available."""
-    for attempt in range(retries):
+# Set as soon as any service fails to start, so the others stop waiting
+startup_failed = threading.Event()
+
+
+def http_probe(url: str) -> Callable[[], bool]:
+    """Readiness probe that expects a 200 from an HTTP endpoint."""
+    def probe() -> bool:
         try:
-            request = Request(url)
-            with urlopen(request, timeout=5) as response:
-                if response.status == 200:
-                    logger.info(f'{name} is ready (attempt {attempt + 1})')
-                    return True
-        except (HTTPError, URLError, Exception) as e:
-            logger.debug(f'{name} not ready: {e}')
-        
-        if attempt < retries - 1:
-            time.sleep(wait_seconds)
+            with urlopen(Request(url), timeout=2) as response:
+                return response.status == 200
+        except (HTTPError, URLError, OSError):
+            return False
+    return probe
+
+
+def tcp_probe(port: int, host: str = '127.0.0.1') -> Callable[[], bool]:
+    """Readiness probe that only checks that a port accepts connections."""
+    def probe() -> bool:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            return False
+    return probe
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """http.client connection over a Unix domain socket."""
     
-    logger.error(f'{name} failed to start after {retries} attempts')
-    return False
+    def __init__(self, socket_path: str, timeout: float = 2):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+    
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def unix_http_probe(socket_path: str, path: str) -> Callable[[], bool]:
+    """Readiness probe that expects a 200 from an HTTP endpoint on a Unix socket."""
+    def probe() -> bool:
+        conn = UnixHTTPConnection(socket_path)
+        try:
+            conn.request('GET', path)
+            return conn.getresponse().status == 200
+        except OSError:
+            return False
+        finally:
+            conn.close()
+    return probe
+
+
+@dataclass
+class RestartPolicy:
+    """How often and how fast a crashed service is restarted."""
+    max_restarts: int = 5  # within `window` seconds, beyond that it's a crash loop
+    window: float = 300.0
+    initial_backoff: float = 1.0
+    max_backoff: float = 30.0
+
 
+@dataclass
+class Service:
+    """A child process, the services it must wait for and how to tell it is ready."""
+    name: str
+    cmd: list[str]
+    probe: Callable[[], bool]
+    depends_on: tuple[str, ...] = ()
+    timeout: float = 60.0
+    env: dict[str, str] | None = None
+    cwd: str | None = None
+    process: subprocess.Popen | None = None
+    ready: bool = False
+    settled: threading.Event = field(default_factory=threading.Event)
+    launched_at: float | None = None
+    ready_at: float | None = None
+    restart_policy: RestartPolicy = field(default_factory=RestartPolicy)
+    restarting: bool = False
+    restart_times: list[float] = field(default_factory=list)
+    restarts: int = 0
+    last_exit_code: int | None = None
+    last_recovery_seconds: float | None = None
 
-def can_delete(file: Path, cutoff: int) -> bool:
-    return int(os.stat(file).st_mtime) <= cutoff or file.name.startswith('_MEI')
+
+def wait_until_ready(service: Service) -> bool:
+    """Probe a service with exponential backoff until it is ready, exits or times out."""
+    delay = PROBE_INITIAL_DELAY
+    deadline = time.monotonic() + service.timeout
+    attempts = 0
+    while True:
+        attempts += 1
+        if service.probe():
+            logger.debug(f'{service.name} is ready (attempt {attempts})')
+            return True
+        if service.process is not None and service.process.poll() is not None:
+            logger.error(f'{service.name} exited with code {service.process.returncode} during startup')
+            return False
+        if startup_failed.is_set():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.error(f'{service.name} not ready after {service.timeout:.0f}s ({attempts} probes)')
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, PROBE_MAX_DELAY)
+
+
+def launch(service: Service) -> subprocess.Popen:
+    return subprocess.Popen(service.cmd, env=service.env, cwd=service.cwd)
 
 
-def cleanup_tmp() -> None:
-    logger.info('Cleaning up tmp directory')
-    tmp_dir = Path('/tmp/').glob('*')
-    cache_cutoff = datetime.now(tz=UTC) - timedelta(hours=6)
-    cutoff_epoch = int(cache_cutoff.strftime('%s'))
-    to_delete = filter(lambda x: can_delete(x, cutoff_epoch), tmp_dir)
+def start_service(service: Service, services: dict[str, Service], boot_start: float) -> None:
+    """Wait for dependencies, launch the service and wait for it to become ready."""
+    try:
+        for dep in service.depends_on:
+            services[dep].settled.wait()
+            if not services[dep].ready:
+                logger.error(f'Not starting {service.name}: dependency {dep} failed')
+                return
 
-    deleted = 0
-    for item in to_delete:
-        path = Path(item)
+        logger.info(f'Starting {service.name}...')
+        service.process = launch(service)
+        service.launched_at = time.monotonic() - boot_start
+
+        if wait_until_ready(service):
+            service.ready = True
+            service.ready_at = time.monotonic() - boot_start
+            logger.info(f'✅ {service.name} ready')
+    except Exception:
+        logger.exception(f'Failed to start {service.name}')
+    finally:
+        if not service.ready:
+            startup_failed.set()
+        service.settled.set()
+
+
+def start_services(services: dict[str, Service]) -> bool:
+    """Start all services concurrently, each gated on its dependencies being ready."""
+    boot_start = time.monotonic()
+    threads = [
+        threading.Thread(target=start_service, args=(service, services, boot_start), name=name)
+        for name, service in services.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report_startup_timing(services, time.monotonic() - boot_start)
+    return all(service.ready for service in services.values())
+
+
+def report_startup_timing(services: dict[str, Service], total: float) -> None:
+    """Log per-service startup timings and persist them for tracking boot time."""
+    report: dict[str, Any] = {'total_seconds': round(total, 3), 'services': {}}
+    logger.info('Startup timing:')
+    for name, service in services.items():
+        launched = f'+{service.launched_at:.2f}s' if service.launched_at is not None else 'not launched'
+        ready = f'+{service.ready_at:.2f}s' if service.ready_at is not None else 'not ready'
+        logger.info(f'   {name:<12} launched {launched:<14} ready {ready}')
+        report['services'][name] = {
+            'launched_seconds': round(service.launched_at, 3) if service.launched_at is not None else None,
+            'ready_seconds': round(service.ready_at, 3) if service.ready_at is not None else None,
+        }
+    logger.info(f'   total        {total:.2f}s')
+
+    try:
+        TIMING_REPORT_FILE.write_text(json.dumps(report))
+    except OSError as e:
+        logger.debug(f'Could not write startup timing report: {e}')
+
+
+class Supervisor:
+    """
+    Restarts services as soon as they exit.
+    
+    SIGCHLD wakes the main thread through a self-pipe (signal.set_wakeup_fd),
+    so exits are noticed immediately and nothing polls while all is well.
+    """
+    
+    def __init__(self, services: dict[str, Service]):
+        self.services = services
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._status_lock = threading.Lock()
+        self.gave_up: str | None = None
+    
+    def install(self) -> None:
+        """Route SIGCHLD to the wakeup pipe. Must be called from the main thread."""
+        set_wakeup_fd(self._wake_w)
+        # A Python-level handler is required for the wakeup fd to be written
+        signal(SIGCHLD, lambda _signum, _frame: None)
+    
+    def run(self) -> None:
+        """Block until a child exits, then handle it. Never returns normally."""
+        self.write_status()
+        while True:
+            self.check_children()
+            if self.gave_up:
+                logger.error(f'{self.gave_up} is crash looping, shutting down')
+                stop_services()
+                sys.exit(1)
+            select.select([self._wake_r], [], [])
+            self._drain()
+    
+    def wake(self) -> None:
         try:
-            if path.is_file():
-                path.unlink()
-            else:
-                shutil.rmtree(item)
-            deleted += 1
-        except (PermissionError, OSError):
-            continue
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # pipe already full, a wakeup is pending anyway
+    
+    def check_children(self) -> None:
+        for service in self.services.values():
+            if service.restarting or service.process is None:
+                continue
+            code = service.process.poll()
+            if code is not None:
+                self.handle_exit(service, code)
+    
+    def handle_exit(self, service: Service, code: int) -> None:
+        exited_at = time.monotonic()
+        policy = service.restart_policy
+        service.last_exit_code = code
+        service.restarting = True
+        
+        recent = [t for t in service.restart_times if exited_at - t < policy.window]
+        service.restart_times = recent
+        if len(recent) >= policy.max_restarts:
+            self.gave_up = service.name
+            self.write_status()
+            return
+        
+        delay = min(policy.initial_backoff * 2 ** len(recent), policy.max_backoff)
+        logger.error(f'{service.name} exited with code {code}, restarting in {delay:.1f}s')
+        threading.Thread(
+            target=self._restart,
+            args=(service, delay, exited_at),
+            name=f'restart-{service.name}',
+            daemon=True,
+        ).start()
+        self.write_status()
+    
+    def _restart(self, service: Service, delay: float, exited_at: float) -> None:
+        time.sleep(delay)
+        service.restart_times.append(time.monotonic())
+        service.restarts += 1
+        try:
+            service.process = launch(service)
+            if wait_until_ready(service):
+                service.last_recovery_seconds = round(time.monotonic() - exited_at, 3)
+                logger.info(f'✅ {service.name} recovered in {service.last_recovery_seconds:.1f}s '
+                            f'(restart #{service.restarts})')
+            elif service.process.poll() is None:
+                # Running but never became ready, treat it as another crash
+                service.process.kill()
+                service.process.wait()
+        except OSError as e:
+            logger.error(f'Could not restart {service.name}: {e}')
+        finally:
+            service.restarting = False
+            self.write_status()
+            # Let the main loop re-check in case it exited while we were restarting
+            self.wake()
+    
+    def status(self) -> dict[str, Any]:
+        return {
+            name: {
+                'pid': service.process.pid if service.process else None,
+                'running': bool(service.process and service.process.poll() is None),
+                'restarting': service.restarting,
+                'restarts': service.restarts,
+                'last_exit_code': service.last_exit_code,
+                'last_recovery_seconds': service.last_recovery_seconds,
+            }
+            for name, service in self.services.items()
+        }
+    
+    def write_status(self) -> None:
+        """Persist restart counts and recovery times for monitoring."""
+        with self._status_lock:
+            try:
+                SUPERVISOR_STATUS_FILE.write_text(json.dumps(self.status()))
+            except OSError as e:
+                logger.debug(f'Could not write supervisor status: {e}')
+    
+    def _drain(self) -> None:
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+
 
-    logger.info(f'Cleaned up {deleted} items from /tmp')
+@dataclass
+class CleanupBudget:
+    """Limits how long and how many filesystem operations one janitor pass may use."""
+    deadline: float
+    ops_left: int
+    
+    def spend(self) -> None:
+        self.ops_left -= 1
+    
+    def exhausted(self) -> bool:
+        return self.ops_left <= 0 or time.monotonic() >= self.deadline
+
+
+class TmpJanitor:
+    """
+    Periodically removes stale entries from /tmp in a background thread.
+    
+    Each pass is bounded in time and filesystem operations; when a pass runs
+    out of budget the next one picks up where it left off after a short pause.
+    PyInstaller `_MEI*` extraction dirs are only removed if they already
+    existed when the janitor was created, i.e. before any service started,
+    since a running Rotki still uses its own.
+    """
+    
+    def __init__(
+        self,
+        root: Path = Path('/tmp'),
+        max_age: float = 6 * 3600,
+        interval: float = 3600,
+        time_budget: float = 0.2,
+        op_budget: int = 2000,
+        pause: float = 1.0,
+    ):
+        self.root = root
+        self.max_age = max_age
+        self.interval = interval
+        self.time_budget = time_budget
+        self.op_budget = op_budget
+        self.pause = pause
+        self._boot_leftovers = self._scan_leftovers()
+        self._resume: list[str] = []  # directories partly removed by an earlier pass
+        self._kept: set[str] = set()  # names already judged not stale this cycle
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.cycles = 0
+        self.items_deleted = 0
+        self.bytes_reclaimed = 0
+    
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='tmp-janitor', daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+    
+    def run_pass(self) -> bool:
+        """Run one budgeted pass. Returns True once a full cleanup cycle is complete."""
+        budget = CleanupBudget(time.monotonic() + self.time_budget, self.op_budget)
+        cutoff = time.time() - self.max_age
+        
+        while self._resume:
+            if not self._remove_tree(self._resume[-1], budget):
+                return False
+            self._resume.pop()
+            self.items_deleted += 1
+        
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if budget.exhausted():
+                    return False
+                if entry.name in self._kept or not self._is_stale(entry, cutoff, budget):
+                    self._kept.add(entry.name)
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    self._resume.append(entry.path)
+                    if not self._remove_tree(entry.path, budget):
+                        return False
+                    self._resume.pop()
+                elif not self._remove_file(entry, budget):
+                    self._kept.add(entry.name)
+                    continue
+                self.items_deleted += 1
+        
+        self._kept.clear()
+        self._boot_leftovers.clear()
+        return True
+    
+    def _run(self) -> None:
+        cycle_items, cycle_bytes = self.items_deleted, self.bytes_reclaimed
+        while not self._stop.is_set():
+            try:
+                complete = self.run_pass()
+            except OSError as e:
+                logger.warning(f'tmp cleanup pass failed: {e}')
+                complete = True
+            if not complete:
+                self._stop.wait(self.pause)
+                continue
+            
+            self.cycles += 1
+            logger.info(
+                f'Cleaned up {self.items_deleted - cycle_items} items '
+                f'({(self.bytes_reclaimed - cycle_bytes) / 1024 / 1024:.1f} MB) from {self.root}'
+            )
+            cycle_items, cycle_bytes = self.items_deleted, self.bytes_reclaimed
+            self._stop.wait(self.interval)
+    
+    def _scan_leftovers(self) -> set[str]:
+        try:
+            with os.scandir(self.root) as entries:
+                return {entry.name for entry in entries if entry.name.startswith('_MEI')}
+        except OSError:
+            return set()
+    
+    def _is_stale(self, entry: os.DirEntry, cutoff: float, budget: CleanupBudget) -> bool:
+        if entry.name.startswith('_MEI'):
+            return entry.name in self._boot_leftovers
+        budget.spend()
+        try:
+            return entry.stat(follow_symlinks=False).st_mtime <= cutoff
+        except OSError:
+            return False
+    
+    def _remove_file(self, entry: os.DirEntry, budget: CleanupBudget) -> bool:
+        budget.spend()
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+            os.unlink(entry.path)
+        except OSError:
+            return False
+        self.bytes_reclaimed += size
+        return True
+    
+    def _remove_tree(self, path: str, budget: CleanupBudget) -> bool:
+        """Remove a directory bottom-up. Returns False if the budget ran out first."""
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return True  # gone or unreadable, nothing more we can do
+        
+        for entry in entries:
+            if budget.exhausted():
+                return False
+            if entry.is_dir(follow_symlinks=False):
+                if not self._remove_tree(entry.path, budget):
+                    return False
+            else:
+                self._remove_file(entry, budget)
+        
+        budget.spend()
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+        return True
 
 
 def load_config() -> tuple[list[str], str]:
@@ -95,18 +516,14 @@ def load_config() -> tuple[list[str], str]:
     return args, loglevel
 
 
-# Global process references
-mock_server = None
-rotki = None
-colibri = None
-nginx = None
+# Services by name, in start order
+services: dict[str, Service] = {}
 
 
-def graceful_exit(received_signal: int, _frame: FrameType | None) -> None:
-    """Handle shutdown gracefully."""
-    logger.info(f'Received signal {received_signal}. Shutting down...')
-    
-    for name, proc in [('nginx', nginx), ('colibri', colibri), ('rotki', rotki), ('mock_server', mock_server)]:
+def stop_services() -> None:
+    """Terminate all running services in reverse start order."""
+    for name, service in reversed(services.items()):
+        proc = service.process
         if proc and proc.poll() is None:
             logger.info(f'Terminating {name}')
             proc.terminate()
@@ -114,44 +531,31 @@ def graceful_exit(received_signal: int, _frame: FrameType | None) -> None:
                 proc.wait(timeout=5)
             except subprocess.TimeoutExpired:
                 proc.kill()
-    
+
+
+def graceful_exit(received_signal: int, _frame: FrameType | None) -> None:
+    """Handle shutdown gracefully."""
+    logger.info(f'Received signal {received_signal}. Shutting down...')
+    stop_services()
     sys.exit(0)
 
 
-def main():
-    global mock_server, rotki, colibri, nginx
-    
-    cleanup_tmp()
-    config_args, log_level = load_config()
-    
-    # Set up signal handlers
-    signal(SIGINT, graceful_exit)
-    signal(SIGTERM, graceful_exit)
-    signal(SIGQUIT, graceful_exit)
-    
-    # ============ Start Mock Premium Server ============
-    logger.info('🐦 Starting Spaetzli mock premium server...')
-    
+def build_services(config_args: list[str], log_level: str) -> dict[str, Service]:
+    """Describe the container's services and their start-up dependencies."""
     mock_env = os.environ.copy()
     mock_env['PYTHONPATH'] = '/opt/spaetzli/deps'
     
-    mock_server = subprocess.Popen(
-        ['python3', '-m', 'spaetzli_mock_server', '--port', str(MOCK_PORT)],
-        cwd='/opt/spaetzli',
-        env=mock_env,
-    )
-    
-    if not check_api_availability(f'http://127.0.0.1:{MOCK_PORT}/health', 'Mock server', retries=15):
-        logger.error('Mock server failed to start')
-        sys.exit(1)
-    
-    logger.info(f'✅ Mock server running on port {MOCK_PORT}')
-    
-    # ============ Start Rotki Backend ============
-    logger.info('Starting Rotki backend...')
-    
+    mock_cmd = ['python3', '-m', 'spaetzli_mock_server']
     rotki_env = os.environ.copy()
-    rotki_env['SPAETZLI_MOCK_URL'] = f'http://127.0.0.1:{MOCK_PORT}'
+    if MOCK_SOCKET:
+        Path(MOCK_SOCKET).parent.mkdir(parents=True, exist_ok=True)
+        mock_cmd += ['--uds', MOCK_SOCKET]
+        mock_probe = unix_http_probe(MOCK_SOCKET, '/health')
+        rotki_env['SPAETZLI_MOCK_URL'] = f"http+unix://{quote(MOCK_SOCKET, safe='')}"
+    else:
+        mock_cmd += ['--port', str(MOCK_PORT)]
+        mock_probe = http_probe(f'http://127.0.0.1:{MOCK_PORT}/health')
+        rotki_env['SPAETZLI_MOCK_URL'] = f'http://127.0.0.1:{MOCK_PORT}'
     
     rotki_cmd = [
         '/usr/sbin/rotki',
@@ -159,18 +563,7 @@ def main():
         '--api-cors', 'http://localhost:*/*,app://localhost/*',
         '--api-host', '0.0.0.0',
     ] + config_args
-    
     logger.info(f'Rotki command: {rotki_cmd}')
-    rotki = subprocess.Popen([str(arg) for arg in rotki_cmd], env=rotki_env)
-    
-    if not check_api_availability('http://127.0.0.1:4242/api/1/ping', 'Rotki backend', retries=30, wait_seconds=3):
-        logger.error('Rotki backend failed to start')
-        sys.exit(1)
-    
-    logger.info('✅ Rotki backend ready')
-    
-    # ============ Start Colibri ============
-    logger.info('Starting Colibri...')
     
     colibri_cmd = [
         '/usr/sbin/colibri',
@@ -181,27 +574,64 @@ def main():
         '--api-cors=http://localhost:*/*,app://localhost/*',
     ]
     
-    colibri = subprocess.Popen(colibri_cmd)
-    time.sleep(2)
-    
-    if colibri.poll() is not None:
-        logger.error('Colibri failed to start')
-        sys.exit(1)
-    
-    logger.info('✅ Colibri ready')
+    service_list = [
+        Service(
+            name='mock_server',
+            cmd=mock_cmd,
+            probe=mock_probe,
+            timeout=30,
+            env=mock_env,
+            cwd='/opt/spaetzli',
+        ),
+        # Colibri doesn't talk to the mock server, so it starts right away
+        Service(
+            name='colibri',
+            cmd=colibri_cmd,
+            probe=tcp_probe(4343),
+            timeout=30,
+        ),
+        # Rotki needs the mock server to verify premium on login
+        Service(
+            name='rotki',
+            cmd=[str(arg) for arg in rotki_cmd],
+            probe=http_probe('http://127.0.0.1:4242/api/1/ping'),
+            depends_on=('mock_server',),
+            timeout=90,
+            env=rotki_env,
+        ),
+        # nginx fronts rotki and colibri, start it once they answer
+        Service(
+            name='nginx',
+            cmd=['nginx', '-g', 'daemon off;'],
+            probe=tcp_probe(80),
+            depends_on=('rotki', 'colibri'),
+            timeout=15,
+        ),
+    ]
+    return {service.name: service for service in service_list}
+
+
+def main():
+    # Created before any service starts so it knows which _MEI dirs are leftovers
+    janitor = TmpJanitor()
+    janitor.start()
+    config_args, log_level = load_config()
     
-    # ============ Start Nginx ============
-    logger.info('Starting Nginx...')
+    # Set up signal handlers
+    signal(SIGINT, graceful_exit)
+    signal(SIGTERM, graceful_exit)
+    signal(SIGQUIT, graceful_exit)
     
-    nginx = subprocess.Popen(['nginx', '-g', 'daemon off;'])
-    time.sleep(1)
+    logger.info('🐦 Starting Spaetzli services...')
+    services.update(build_services(config_args, log_level))
+    supervisor = Supervisor(services)
+    supervisor.install()
     
-    if nginx.poll() is not None:
-        logger.error('Nginx failed to start')
+    if not start_services(services):
+        logger.error('Not all services started, shutting down')
+        stop_services()
         sys.exit(1)
     
-    logger.info('✅ Nginx ready')
-    
     # ============ Ready! ============
     logger.info('')
     logger.info('=' * 50)
@@ -212,16 +642,8 @@ def main():
     logger.info('=' * 50)
     logger.info('')
     
-    # Monitor processes
-    while True:
-        time.sleep(30)
-        
-        for name, proc in [('mock_server', mock_server), ('rotki', rotki), ('nginx', nginx), ('colibri', colibri)]:
-            if proc.poll() is not None:
-                logger.error(f'{name} has terminated unexpectedly')
-                graceful_exit(0, None)
-        
-        logger.debug('All processes running')
+    # Supervise processes, restarting any that exit
+    supervisor.run()
 
 
 if __name__ == '__main__':
@@ -2,7 +2,9 @@
 """Apply Spaetzli patch to Rotki premium.py"""
 
 import re
+import shutil
 import sys
+from pathlib import Path
 
 if len(sys.argv) < 2:
     print("Usage: apply_patch.py <path_to_premium.py>")
@@ -10,6 +12,19 @@ if len(sys.argv) < 2:
 
 premium_py = sys.argv[1]
 
+# http+unix:// support: the requests adapter is copied next to premium.py so
+# that it is bundled with Rotki. Look for it next to this script (Docker build)
+# or in the source tree.
+here = Path(__file__).resolve().parent
+unix_http_src = next(
+    (p for p in (here / 'unix_http.py', here.parent / 'spaetzli_mock_server' / 'unix_http.py') if p.exists()),
+    None,
+)
+if unix_http_src is None:
+    print("❌ Could not find unix_http.py")
+    sys.exit(1)
+shutil.copyfile(unix_http_src, Path(premium_py).parent / 'spaetzli_unix_http.py')
+
 with open(premium_py, 'r') as f:
     content = f.read()
 
@@ -21,6 +36,9 @@ if 'SPAETZLI_MOCK_URL' in content:
 new_code = """# Support custom mock server via environment variables (Spaetzli)
         if mock_url := os.environ.get('SPAETZLI_MOCK_URL'):
             log.info(f'Using Spaetzli mock server at {mock_url}')
+            if mock_url.startswith('http+unix://'):
+                from rotkehlchen.premium.spaetzli_unix_http import mount_unix_adapter
+                mount_unix_adapter(self.session)
             self.rotki_api = f'{mock_url}/api/{self.apiversion}/'
             self.rotki_web = f'{mock_url}/webapi/{self.apiversion}/'
             self.rotki_nest = f'{mock_url}/nest/{self.apiversion}/'
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Compare HTTP/1.1 (uvicorn) and HTTP/2 h2c (hypercorn) for one device's concurrent requests.
+
+Simulates a device uploading backup chunks in parallel while polling metadata,
+and reports the number of TCP connections used and the request throughput.
+Requires httpx with HTTP/2 support and hypercorn: pip install "httpx[http2]" hypercorn
+
+Usage: python scripts/bench_http2.py [--requests 2000] [--concurrency 50] [--chunk-kb 64]
+"""
+
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEADERS = {"API-KEY": "bench"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not become ready")
+
+
+async def one_request(client: httpx.AsyncClient, i: int, chunk: bytes, connections: set) -> None:
+    if i % 2:
+        response = await client.get("/api/1/last_data_metadata", headers=HEADERS)
+    else:
+        response = await client.post(
+            "/nest/1/backup/range",
+            headers=HEADERS,
+            files={"chunk_data": ("chunk", chunk)},
+            data={"file_hash": "x", "last_modify_ts": "1", "total_size": str(len(chunk))},
+        )
+    response.raise_for_status()
+    stream = response.extensions.get("network_stream")
+    if stream is not None:
+        connections.add(stream.get_extra_info("client_addr"))
+
+
+async def run_load(base_url: str, http2: bool, args) -> tuple:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, http1=not http2, http2=http2, limits=limits, timeout=30,
+    ) as client:
+        await wait_ready(client)
+        chunk = b"\0" * (args.chunk_kb * 1024)
+        connections: set = set()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(i):
+            async with semaphore:
+                await one_request(client, i, chunk, connections)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    return len(connections), args.requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    modes = [("HTTP/1.1 (uvicorn)", [], False), ("HTTP/2 h2c (hypercorn)", ["--http2"], True)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, extra, http2 in modes:
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "spaetzli_mock_server", "--host", "127.0.0.1",
+                 "--port", str(port), "--data-dir", data_dir] + extra,
+                cwd=REPO_ROOT,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                connections, rps = asyncio.run(run_load(f"http://127.0.0.1:{port}", http2, args))
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            print(f"{name:<24} connections {connections:4d}   throughput {rps:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
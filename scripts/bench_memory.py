@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Measure memory per stored device, watcher and backup metadata record.
+
+Compares the previous model layout (plain dataclasses with a __dict__ and no
+string interning) with the current slotted models and with DeviceTable.
+Records are built from freshly made strings, as they are when decoded from
+request bodies, so interning has something to share.
+
+Usage: python scripts/bench_memory.py [--count 200000]
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spaetzli_mock_server.models import BackupMetadata, Device, DeviceTable, Watcher  # noqa: E402
+
+PLATFORMS = ["linux", "windows", "macos"]
+WATCHER_TYPE = "makervault_collateralization_ratio"
+
+
+# The models as they were before slots and interning
+@dataclass
+class LegacyDevice:
+    device_identifier: str
+    device_name: str
+    platform: str
+    user: str = "default"
+    created_at: int = field(default_factory=lambda: int(time.time()))
+    last_seen_at: int = field(default_factory=lambda: int(time.time()))
+
+
+@dataclass
+class LegacyWatcher:
+    identifier: str = field(default_factory=lambda: str(uuid.uuid4()))
+    watcher_type: str = ""
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class LegacyBackupMetadata:
+    user: str
+    upload_ts: int
+    last_modify_ts: int
+    data_hash: str
+    data_size: int
+    compression: str = "zlib"
+    file_path: Optional[str] = None
+
+
+def fresh(s: str) -> str:
+    """A new string object equal to `s`, like one decoded from JSON."""
+    return "".join(list(s))
+
+
+def measure(build, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return (after - before) / count
+
+
+def devices(cls, store_factory=dict):
+    def build(count):
+        store = store_factory()
+        for i in range(count):
+            device_id = str(uuid.uuid4())
+            store[device_id] = cls(
+                device_identifier=device_id,
+                device_name=f"device {i}",
+                platform=fresh(PLATFORMS[i % 3]),
+                user=fresh(f"user-{i % 100}"),
+                created_at=1_700_000_000 + i,
+                last_seen_at=1_700_000_000 + i,
+            )
+        return store
+    return build
+
+
+def watchers(cls):
+    def build(count):
+        store = {}
+        for i in range(count):
+            watcher = cls(
+                watcher_type=fresh(WATCHER_TYPE),
+                args={"vault_id": str(i), "ratio": "150", "op": "lt"},
+            )
+            store[watcher.identifier] = watcher
+        return store
+    return build
+
+
+def backups(cls):
+    def build(count):
+        store = {}
+        for i in range(count):
+            user = f"user-{i}"
+            store[user] = cls(
+                user=user,
+                upload_ts=1_700_000_000 + i,
+                last_modify_ts=1_700_000_000 + i,
+                data_hash=f"{i:064x}",
+                data_size=1_000_000 + i,
+                compression=fresh("zlib"),
+            )
+        return store
+    return build
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = [
+        ("Device (dataclass, before)", devices(LegacyDevice)),
+        ("Device (slots + interning)", devices(Device)),
+        ("Device (DeviceTable)", devices(Device, DeviceTable)),
+        ("Watcher (dataclass, before)", watchers(LegacyWatcher)),
+        ("Watcher (slots + interning)", watchers(Watcher)),
+        ("BackupMetadata (before)", backups(LegacyBackupMetadata)),
+        ("BackupMetadata (slots)", backups(BackupMetadata)),
+    ]
+    print(f"{args.count} records each, bytes per record including keys and strings")
+    for name, build in rows:
+        print(f"{name:<30} {measure(build, args.count):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Measure mock server cold start: process spawn until the first 200 on /health.
+
+Usage: python scripts/bench_startup.py [--runs 5] [--max-ms 2000]
+
+With --max-ms the script exits non-zero when the median exceeds the budget,
+so it can be used as a regression check.
+"""
+
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def health_ok(port: int) -> bool:
+    """Issue a raw HTTP/1.1 request, cheaper and more precise than urllib."""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5) as s:
+            s.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            return s.recv(16).startswith(b"HTTP/1.1 200")
+    except OSError:
+        return False
+
+
+def measure_once(timeout: float) -> float:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "spaetzli_mock_server", "--host", "127.0.0.1",
+             "--port", str(port), "--data-dir", data_dir],
+            cwd=REPO_ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - start < timeout:
+                if health_ok(port):
+                    return (time.perf_counter() - start) * 1000
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with code {proc.returncode}")
+                time.sleep(0.005)
+            raise RuntimeError(f"server not healthy after {timeout}s")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median exceeds this")
+    args = parser.parse_args()
+
+    # First run warms the bytecode cache and is not counted
+    measure_once(args.timeout)
+    timings = sorted(measure_once(args.timeout) for _ in range(args.runs))
+    median = statistics.median(timings)
+    print(f"startup to first 200 on /health over {args.runs} runs: "
+          f"median {median:.0f} ms  min {timings[0]:.0f} ms  max {timings[-1]:.0f} ms")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"REGRESSION: median {median:.0f} ms exceeds budget of {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
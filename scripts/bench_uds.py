@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Compare request latency to the mock server over loopback TCP and a Unix socket.
+
+Usage: python scripts/bench_uds.py [--requests 5000] [--path /health]
+"""
+
+import argparse
+import http.client
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str):
+        super().__init__("localhost", timeout=5)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TCPConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        # Same as any sensible HTTP client, don't let Nagle skew small requests
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: str, listen_args: list) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "spaetzli_mock_server", "--data-dir", data_dir] + listen_args,
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(make_conn, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = make_conn()
+        try:
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.05)
+        finally:
+            conn.close()
+    raise RuntimeError("server did not become ready")
+
+
+def run(make_conn, path: str, count: int, keep_alive: bool) -> list:
+    headers = {"API-KEY": "bench"}
+    timings = []
+    conn = make_conn()
+    for _ in range(count):
+        if not keep_alive:
+            conn = make_conn()
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        timings.append((time.perf_counter() - start) * 1e6)
+        if not keep_alive:
+            conn.close()
+    conn.close()
+    return sorted(timings)
+
+
+def summary(name: str, timings: list) -> str:
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    return f"{name:<26} median {statistics.median(timings):7.1f} us   p99 {p99:7.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        socket_path = str(Path(tmp) / "mock.sock")
+        servers = [
+            start_server(tmp, ["--host", "127.0.0.1", "--port", str(port)]),
+            start_server(tmp, ["--uds", socket_path]),
+        ]
+        transports = {
+            "tcp": lambda: TCPConnection("127.0.0.1", port, timeout=5),
+            "uds": lambda: UnixHTTPConnection(socket_path),
+        }
+        try:
+            for make_conn in transports.values():
+                wait_ready(make_conn)
+            for keep_alive in (True, False):
+                label = "keep-alive" if keep_alive else "new connection"
+                for name, make_conn in transports.items():
+                    run(make_conn, args.path, min(500, args.requests), keep_alive)  # warm up
+                    print(summary(f"{name} ({label})", run(make_conn, args.path, args.requests, keep_alive)))
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
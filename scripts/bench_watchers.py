@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Benchmark vectorized watcher evaluation.
+
+Usage: python scripts/bench_watchers.py [--watchers 100000] [--vaults 5000] [--ticks 50]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spaetzli_mock_server.evaluation import WatcherEngine  # noqa: E402
+from spaetzli_mock_server.feeds import Tick  # noqa: E402
+from spaetzli_mock_server.models import Watcher  # noqa: E402
+
+VAULT_RATIO = "makervault_collateralization_ratio"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--watchers", type=int, default=100_000)
+    parser.add_argument("--vaults", type=int, default=5_000)
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    watchers = [
+        Watcher(
+            watcher_type=VAULT_RATIO,
+            args={
+                "vault_id": str(rng.randrange(args.vaults)),
+                "ratio": str(rng.uniform(110, 300)),
+                "op": rng.choice(["gt", "ge", "lt", "le"]),
+            },
+        )
+        for _ in range(args.watchers)
+    ]
+
+    engine = WatcherEngine(max_events=args.watchers)
+    start = time.perf_counter()
+    engine.load(watchers)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Ratios follow a random walk, like a real feed, so only some watchers flip per tick
+    ratios = {str(v): rng.uniform(110, 300) for v in range(args.vaults)}
+    timings = []
+    triggered = 0
+    for _ in range(args.ticks):
+        ratios = {k: r + rng.gauss(0, 2) for k, r in ratios.items()}
+        tick = Tick(VAULT_RATIO, ratios)
+        start = time.perf_counter()
+        triggered += len(engine.evaluate(tick))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"watchers: {len(engine)}  vaults: {args.vaults}  ticks: {args.ticks}")
+    print(f"load:     {load_ms:.1f} ms")
+    print(f"per tick: median {statistics.median(timings):.2f} ms  "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms  max {timings[-1]:.2f} ms")
+    print(f"triggered events: {triggered}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Replay a captured traffic log against a test server.
+
+Captures are written by a server started with --capture FILE: sanitized
+/api/ and /nest/ requests with their arrival offsets. Requests are re-issued
+at the captured pace scaled by --speed (1, 10, ... or "max", which sends them
+back to back in capture order with up to --concurrency in flight).
+
+Bodies are rebuilt from the capture: JSON and form fields as recorded
+(pseudonymized), uploads as deterministic filler of the recorded size whose
+sha256 is sent as file_hash, so re-uploads of an unchanged backup stay
+unchanged. Chunked uploads wait for the upload id the server assigned to
+their first chunk. Requests with credentials send --api-key, so the server
+must run without signature validation (the default).
+
+The summary has latency percentiles per route, how many statuses match the
+capture and how far sending fell behind schedule; --json also writes it to a
+file. Run the same capture against two builds to compare them.
+
+Requires httpx: pip install httpx
+
+Usage: python scripts/replay.py capture.jsonl.gz --url http://127.0.0.1:8080 --speed 10
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import sys
+import time
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spaetzli_mock_server.capture import read_capture, synthetic_blob  # noqa: E402
+
+BINDING_TIMEOUT = 30.0  # seconds a chunk waits for its upload id
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """'max' -> None, '10' or '10x' -> 10.0."""
+    if value.lower() == "max":
+        return None
+    speed = float(value.lower().rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, api_key: str):
+        self.client = client
+        self.api_key = api_key
+        self.latencies: Dict[str, List[float]] = defaultdict(list)  # route -> ms
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)  # route -> status (0: transport error)
+        self.matched = 0
+        self.replayed = 0
+        self.skipped = 0  # chunks of uploads whose first chunk is not in the capture
+        self.send_lag: List[float] = []  # ms behind schedule
+        self._upload_ids: Dict[str, asyncio.Future] = {}
+        self._blobs: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def _upload_id(self, pseudonym: str) -> asyncio.Future:
+        if pseudonym not in self._upload_ids:
+            self._upload_ids[pseudonym] = asyncio.get_running_loop().create_future()
+        return self._upload_ids[pseudonym]
+
+    def _blob(self, seed: str, size: int) -> tuple:
+        key = (seed, size)
+        if key not in self._blobs:
+            blob = synthetic_blob(seed, size)
+            self._blobs[key] = (blob, hashlib.sha256(blob).hexdigest())
+            while len(self._blobs) > 8:
+                self._blobs.popitem(last=False)
+        return self._blobs[key]
+
+    async def _build(self, index: int, record: dict) -> Optional[dict]:
+        """httpx request arguments for a record, None if it can't be replayed."""
+        headers = dict(record.get("h", {}))
+        if record.get("a"):
+            headers["API-KEY"] = self.api_key
+        request = {"method": record["m"], "url": record["p"], "headers": headers}
+        if record.get("q"):
+            request["url"] += "?" + record["q"]
+
+        body = record.get("b") or {}
+        if "json" in body:
+            request["json"] = body["json"]
+        elif "form" in body:
+            form = dict(body["form"])
+            if form.get("upload_id"):
+                try:
+                    form["upload_id"] = await asyncio.wait_for(
+                        asyncio.shield(self._upload_id(form["upload_id"])), BINDING_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    return None
+                if form["upload_id"] is None:
+                    return None
+            files = {}
+            for name, size in body["files"].items():
+                total = int(form.get("total_size") or size)
+                blob, blob_hash = self._blob(form.get("file_hash", ""), total)
+                start = int(headers.get("content-range", "bytes 0-").split()[1].split("-")[0])
+                files[name] = ("backup", blob[start:start + size])
+                form["file_hash"] = blob_hash
+            request["data"] = form
+            request["files"] = files
+        elif "size" in body:
+            request["content"] = synthetic_blob(str(index), body["size"])
+        return request
+
+    async def replay(self, index: int, record: dict) -> None:
+        request = await self._build(index, record)
+        route = f"{record['m']} {record['p']}"
+        if request is None:
+            self.skipped += 1
+            self._bind(record, None)
+            return
+
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(**request)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        self.statuses[route][status] += 1
+        self.replayed += 1
+        self.matched += status == record["s"]
+
+        upload_id = None
+        if response is not None and status == 206:
+            upload_id = response.json().get("upload_id")
+        self._bind(record, upload_id)
+
+    def _bind(self, record: dict, upload_id: Optional[str]) -> None:
+        """Resolve the upload id a first chunk was answered with (None if it failed)."""
+        if record.get("u"):
+            future = self._upload_id(record["u"])
+            if not future.done():
+                future.set_result(upload_id)
+
+    def summary(self, elapsed: float, captured_span: float) -> dict:
+        lag = sorted(self.send_lag)
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "statuses": dict(self.statuses[route]),
+            }
+        return {
+            "requests": self.replayed,
+            "skipped": self.skipped,
+            "status_match_rate": round(self.matched / self.replayed, 4) if self.replayed else 0.0,
+            "elapsed_s": round(elapsed, 2),
+            "captured_span_s": round(captured_span, 2),
+            "throughput_rps": round(self.replayed / elapsed, 1) if elapsed else 0.0,
+            "send_lag_p99_ms": round(percentile(lag, 99), 2),
+            "routes": routes,
+        }
+
+
+async def run(args) -> dict:
+    # Captures are in completion order, replay follows arrival order
+    records = sorted(read_capture(args.capture), key=lambda record: record["t"])
+    speed = args.speed
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        replayer = Replayer(client, args.api_key)
+        slots = asyncio.Semaphore(args.concurrency)
+        start = time.perf_counter()
+
+        async def fire(index, record):
+            try:
+                await replayer.replay(index, record)
+            finally:
+                slots.release()
+
+        first = records[0]["t"] if records else 0.0
+        tasks = []
+        for index, record in enumerate(records):
+            if speed is not None:
+                due = start + (record["t"] - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                replayer.send_lag.append(max(0.0, time.perf_counter() - due) * 1000)
+            await slots.acquire()
+            tasks.append(asyncio.create_task(fire(index, record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return replayer.summary(elapsed, records[-1]["t"] - first if records else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", type=Path, help="Capture file written by --capture")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, ... or max (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max requests in flight")
+    parser.add_argument("--api-key", default="replay", help="Sent with requests that had credentials")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", type=Path, default=None, help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
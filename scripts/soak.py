@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Soak test a running mock server with N simulated Rotki devices.
+
+Each device follows the premium sync protocol: it registers with
+PUT /nest/1/devices and POST /nest/1/devices/check, then repeatedly polls
+GET /api/1/last_data_metadata. When the remote backup is newer than its own
+it downloads it with GET /nest/1/backup, otherwise it sometimes "modifies" its
+database and uploads it in Content-Range chunks to POST /nest/1/backup/range.
+
+Backup sizes are log-normal around --backup-kb, sync intervals exponential
+around --sync-interval. Progress lines are printed every --report-interval
+seconds and a summary (latency percentiles, error rates, throughput, server
+RSS over time) at the end; --json also writes it to a file.
+
+Registrations beyond the server's device limit are counted as errors (422),
+as are transport errors and 5xx responses. The default of 10 devices fits the
+server's default limit; for more, start it with --limit-of-devices.
+
+Server RSS is read from /debug/memory when --debug-token is given, or from
+/proc/<pid> with --server-pid when the server runs on this machine.
+
+Requires httpx: pip install httpx
+
+Usage: python scripts/soak.py --url http://127.0.0.1:8080 --devices 10 --duration 600
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+    """Latencies and status codes per operation, overall and for the current report window."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)  # op -> ms
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)  # op -> status (0: transport error)
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.window: List[tuple] = []  # (latency ms, failed) since the last report
+        self.rss: List[tuple] = []  # (seconds since start, bytes)
+
+    def record(self, op: str, latency_ms: float, status: int) -> None:
+        self.latencies[op].append(latency_ms)
+        self.statuses[op][status] += 1
+        self.window.append((latency_ms, is_error(status)))
+
+
+def is_error(status: int) -> bool:
+    # 409 (already registered) and 404 (no backup yet) are normal protocol answers
+    return status == 0 or status >= 500 or status in (401, 403, 413, 422)
+
+
+class Device:
+    """One simulated Rotki installation."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, metrics: Metrics, args):
+        self.client = client
+        self.metrics = metrics
+        self.args = args
+        self.identifier = str(uuid.uuid4())
+        self.name = f"soak-device-{index}"
+        self.headers = {"API-KEY": f"soak-key-{index % args.users}"}
+        self.last_modify_ts = 0
+
+    async def request(self, op: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            headers = {**self.headers, **kwargs.pop("headers", {})}
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+            await response.aread()
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.metrics.record(op, (time.perf_counter() - start) * 1000, status)
+        return response
+
+    async def register(self) -> None:
+        body = {"device_identifier": self.identifier, "device_name": self.name, "platform": "linux"}
+        await self.request("register", "PUT", "/nest/1/devices", json=body)
+        await self.request("check", "POST", "/nest/1/devices/check", json={"device_identifier": self.identifier})
+
+    def backup_size(self) -> int:
+        size = random.lognormvariate(math.log(self.args.backup_kb * 1024), self.args.backup_sigma)
+        return max(1, min(int(size), self.args.backup_max_mb * 1024 * 1024))
+
+    async def upload(self) -> None:
+        size = self.backup_size()
+        data = os.urandom(size)
+        self.last_modify_ts = int(time.time())
+        form = {
+            "file_hash": hashlib.sha256(data).hexdigest(),
+            "last_modify_ts": str(self.last_modify_ts),
+            "compression": "zlib",
+            "total_size": str(size),
+        }
+        chunk_size = self.args.chunk_kb * 1024
+        for start in range(0, size, chunk_size):
+            chunk = data[start:start + chunk_size]
+            headers = {"Content-Range": f"bytes {start}-{start + len(chunk) - 1}/{size}"}
+            response = None
+            for _ in range(self.args.retries + 1):
+                response = await self.request(
+                    "upload_chunk", "POST", "/nest/1/backup/range",
+                    headers=headers, data=form, files={"chunk_data": ("chunk", chunk)},
+                )
+                if response is None or response.status_code != 503:
+                    break
+                # Admission control pushed back, wait as told like Rotki does
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            if response is None or response.status_code not in (200, 206):
+                return
+            self.metrics.bytes_up += len(chunk)
+            if response.status_code == 206:
+                form["upload_id"] = response.json()["upload_id"]
+
+    async def download(self, remote_modify_ts: int) -> None:
+        response = await self.request("download", "GET", "/nest/1/backup")
+        if response is not None and response.status_code == 200:
+            self.metrics.bytes_down += len(response.content)
+            self.last_modify_ts = remote_modify_ts
+
+    async def run(self, deadline: float) -> None:
+        await self.register()
+        while time.monotonic() < deadline:
+            response = await self.request("metadata", "GET", "/api/1/last_data_metadata")
+            if response is not None and response.status_code == 200:
+                remote_modify_ts = response.json().get("last_modify_ts", 0)
+                if remote_modify_ts > self.last_modify_ts:
+                    await self.download(remote_modify_ts)
+                elif random.random() < self.args.upload_ratio:
+                    await self.upload()
+            await asyncio.sleep(min(random.expovariate(1 / self.args.sync_interval), deadline - time.monotonic()))
+
+
+async def read_rss(client: httpx.AsyncClient, args) -> Optional[int]:
+    if args.debug_token:
+        try:
+            response = await client.get("/debug/memory", headers={"X-Debug-Token": args.debug_token})
+            return response.json()["rss_bytes"]
+        except (httpx.HTTPError, KeyError, ValueError):
+            return None
+    if args.server_pid:
+        try:
+            with open(f"/proc/{args.server_pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return None
+    return None
+
+
+async def reporter(client: httpx.AsyncClient, metrics: Metrics, started: float, deadline: float, args) -> None:
+    while True:
+        await asyncio.sleep(args.report_interval)
+        elapsed = time.monotonic() - started
+        window, metrics.window = metrics.window, []
+        latencies = sorted(latency for latency, _ in window)
+        errors = sum(failed for _, failed in window)
+        rss = await read_rss(client, args)
+        if rss is not None:
+            metrics.rss.append((round(elapsed, 1), rss))
+        print(
+            f"[{elapsed:7.1f}s] {len(window) / args.report_interval:8.1f} req/s  "
+            f"errors {errors:5d}  p50 {percentile(latencies, 50):7.1f} ms  "
+            f"p99 {percentile(latencies, 99):7.1f} ms"
+            + (f"  rss {rss / 2**20:7.1f} MiB" if rss is not None else ""),
+            flush=True,
+        )
+        if time.monotonic() >= deadline:
+            return
+
+
+def summarize(metrics: Metrics, elapsed: float) -> dict:
+    operations = {}
+    for op, values in sorted(metrics.latencies.items()):
+        values = sorted(values)
+        statuses = metrics.statuses[op]
+        errors = sum(count for status, count in statuses.items() if is_error(status))
+        operations[op] = {
+            "requests": len(values),
+            "errors": errors,
+            "error_rate": round(errors / len(values), 4),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "p50_ms": round(percentile(values, 50), 2),
+            "p90_ms": round(percentile(values, 90), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "p999_ms": round(percentile(values, 99.9), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    total = sum(op["requests"] for op in operations.values())
+    return {
+        "duration_s": round(elapsed, 1),
+        "requests": total,
+        "requests_per_s": round(total / elapsed, 1),
+        "error_rate": round(sum(op["errors"] for op in operations.values()) / total, 4) if total else 0.0,
+        "upload_mb_per_s": round(metrics.bytes_up / elapsed / 2**20, 2),
+        "download_mb_per_s": round(metrics.bytes_down / elapsed / 2**20, 2),
+        "operations": operations,
+        "rss_bytes": metrics.rss,
+    }
+
+
+def print_summary(summary: dict) -> None:
+    print(f"\n{summary['requests']} requests in {summary['duration_s']}s: "
+          f"{summary['requests_per_s']} req/s, error rate {summary['error_rate']:.2%}, "
+          f"up {summary['upload_mb_per_s']} MB/s, down {summary['download_mb_per_s']} MB/s")
+    print(f"{'operation':<14}{'requests':>9}{'errors':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}{'max':>9}  (ms)")
+    for op, stats in summary["operations"].items():
+        print(f"{op:<14}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['p999_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+    if summary["rss_bytes"]:
+        values = [rss for _, rss in summary["rss_bytes"]]
+        print(f"server RSS: start {values[0] / 2**20:.1f} MiB, max {max(values) / 2**20:.1f} MiB, "
+              f"end {values[-1] / 2**20:.1f} MiB")
+
+
+async def soak(args) -> dict:
+    metrics = Metrics()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        devices = [Device(i, client, metrics, args) for i in range(args.devices)]
+
+        async def start_device(device: Device, delay: float) -> None:
+            await asyncio.sleep(delay)
+            await device.run(deadline)
+
+        report = asyncio.create_task(reporter(client, metrics, started, deadline, args))
+        await asyncio.gather(*(
+            start_device(device, args.ramp_up * i / max(1, args.devices)) for i, device in enumerate(devices)
+        ))
+        await report
+        return summarize(metrics, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Server base URL")
+    parser.add_argument("--devices", type=int, default=10, help="Simulated devices, up to the server's device limit")
+    parser.add_argument("--users", type=int, default=1, help="Distinct API keys the devices are spread over")
+    parser.add_argument("--duration", type=float, default=60, help="Test duration in seconds")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which devices start")
+    parser.add_argument("--sync-interval", type=float, default=5, help="Mean seconds between metadata polls")
+    parser.add_argument("--upload-ratio", type=float, default=0.3, help="Chance a poll is followed by an upload")
+    parser.add_argument("--backup-kb", type=float, default=256, help="Median backup size in KiB")
+    parser.add_argument("--backup-sigma", type=float, default=1.0, help="Log-normal spread of backup sizes")
+    parser.add_argument("--backup-max-mb", type=int, default=64, help="Largest backup in MiB")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="Upload chunk size in KiB")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of a chunk refused with 503")
+    parser.add_argument("--connections", type=int, default=100, help="Client connection pool size")
+    parser.add_argument("--timeout", type=float, default=30, help="Request timeout in seconds")
+    parser.add_argument("--report-interval", type=float, default=5, help="Seconds between progress lines")
+    parser.add_argument("--debug-token", default=os.environ.get("SPAETZLI_DEBUG_TOKEN"),
+                        help="Read server RSS from /debug/memory with this token")
+    parser.add_argument("--server-pid", type=int, help="Read server RSS from /proc/<pid> instead")
+    parser.add_argument("--json", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(soak(args))
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,52 @@
 """Entry point for the mock premium server."""
 
 import argparse
-import uvicorn
+import importlib.util
+import os
 
 from .config import config
 
 
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def _run_archive_command(args) -> None:
+    """Run the export or import subcommand against config.data_dir."""
+    import json
+    import sys
+    from contextlib import nullcontext
+    
+    from .archive import export_archive, import_archive
+    
+    if args.command == "export":
+        with (nullcontext(sys.stdout.buffer) if args.output == "-" else open(args.output, "wb")) as out:
+            stats = export_archive(config.data_dir, out, args.compression, args.level, args.threads)
+    else:
+        with (nullcontext(sys.stdin.buffer) if args.input == "-" else open(args.input, "rb")) as src:
+            stats = import_archive(src, config.data_dir, args.workers)
+    # stdout may carry the archive itself
+    print(json.dumps(stats), file=sys.stderr)
+
+
+def _run_rebalance_command(args, parser) -> None:
+    """Copy the backups this node hands over when the cluster changes to args.to."""
+    import json
+    
+    from .cluster import HashRing, apply_rebalance, rebalance_plan
+    from .storage import Storage
+    
+    if not config.cluster_nodes:
+        parser.error("rebalance needs the current --cluster-nodes and --cluster-self")
+    new_nodes = [node.strip().rstrip("/") for node in args.to.split(",") if node.strip()]
+    storage = Storage(config)
+    storage.load_state()
+    users = [metadata.user for metadata in storage.list_backup_metadata()]
+    plan = rebalance_plan(HashRing(config.cluster_nodes), HashRing(new_nodes), users)
+    result = apply_rebalance(storage, plan, config.cluster_self, config.replication_token)
+    print(json.dumps({"planned": len(plan), **result}))
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -23,43 +64,280 @@ def main():
         default=8080,
         help="Port to listen on (default: 8080)",
     )
+    parser.add_argument(
+        "--uds",
+        default=None,
+        help="Listen on this Unix domain socket instead of host/port",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Serve with HTTP/2 support via hypercorn (h2c, or h2 over TLS with a certificate)",
+    )
+    parser.add_argument(
+        "--certfile",
+        default=None,
+        help="TLS certificate for --http2",
+    )
+    parser.add_argument(
+        "--keyfile",
+        default=None,
+        help="TLS private key for --http2",
+    )
+    parser.add_argument(
+        "--self-signed",
+        action="store_true",
+        help="With --http2, serve TLS using a generated self-signed localhost certificate (testing only)",
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
-        help="Enable debug mode",
+        help="Enable debug mode (auto-reload, debug logging)",
+    )
+    parser.add_argument(
+        "--access-log-sample",
+        type=float,
+        default=0.0,
+        help="Fraction of requests to write to the structured access log (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--capture",
+        default=None,
+        metavar="FILE",
+        help="Record sanitized /api/ and /nest/ traffic to FILE (gzipped) for scripts/replay.py",
     )
     parser.add_argument(
         "--validate-signatures",
         action="store_true",
         help="Enable strict signature validation",
     )
+    parser.add_argument(
+        "--debug-token",
+        default=os.environ.get("SPAETZLI_DEBUG_TOKEN"),
+        help="Enable /debug/* endpoints, guarded by this X-Debug-Token value "
+             "(default: $SPAETZLI_DEBUG_TOKEN)",
+    )
+    parser.add_argument(
+        "--limit-of-devices",
+        type=int,
+        default=config.limits.limit_of_devices,
+        help=f"Devices a premium account may register (default: {config.limits.limit_of_devices})",
+    )
+    parser.add_argument(
+        "--max-upload-sessions",
+        type=int,
+        default=config.max_upload_sessions,
+        help=f"Concurrent upload sessions before uploads get 503 (default: {config.max_upload_sessions})",
+    )
+    parser.add_argument(
+        "--max-upload-inflight-mb",
+        type=int,
+        default=config.max_upload_inflight_mb,
+        help=f"Upload bytes in flight before uploads get 503 (default: {config.max_upload_inflight_mb})",
+    )
     parser.add_argument(
         "--data-dir",
         default="./data",
         help="Directory for storing data (default: ./data)",
     )
+    parser.add_argument(
+        "--backup-cache-mb",
+        type=int,
+        default=config.backup_cache_mb,
+        help=f"Memory budget for cached backups in MB (default: {config.backup_cache_mb})",
+    )
+    parser.add_argument(
+        "--scrub-interval",
+        type=int,
+        default=config.scrub_interval,
+        help=f"Seconds between backup integrity scrub passes, 0 to disable (default: {config.scrub_interval})",
+    )
+    parser.add_argument(
+        "--scrub-rate-mb",
+        type=float,
+        default=config.scrub_rate_mb,
+        help=f"Disk read budget of the scrubber in MB/s, 0 for unlimited (default: {config.scrub_rate_mb})",
+    )
+    parser.add_argument(
+        "--cluster-nodes",
+        default=None,
+        help="Comma-separated base URLs of all cluster nodes, enables cluster mode",
+    )
+    parser.add_argument(
+        "--cluster-self",
+        default=None,
+        help="This node's base URL, as listed in --cluster-nodes",
+    )
+    parser.add_argument(
+        "--cluster-redirect",
+        action="store_true",
+        help="Redirect requests for other nodes' users instead of forwarding them",
+    )
+    parser.add_argument(
+        "--cluster-token",
+        default=os.environ.get("SPAETZLI_CLUSTER_TOKEN"),
+        help="Shared token authenticating requests forwarded between cluster nodes "
+             "(default: $SPAETZLI_CLUSTER_TOKEN)",
+    )
+    parser.add_argument(
+        "--replicate-to",
+        action="append",
+        default=[],
+        help="Directory or peer node URL to replicate backups to (repeatable)",
+    )
+    parser.add_argument(
+        "--replication-token",
+        default=os.environ.get("SPAETZLI_REPLICATION_TOKEN"),
+        help="Shared token for sending and accepting replicas "
+             "(default: $SPAETZLI_REPLICATION_TOKEN)",
+    )
+    parser.add_argument(
+        "--compact-devices",
+        action="store_true",
+        help="Store devices column-wise to save memory with very many devices",
+    )
+    parser.add_argument(
+        "--watcher-feed",
+        default=None,
+        help="JSON lines file of price/ratio ticks to evaluate watchers against",
+    )
+    
+    
+    commands = parser.add_subparsers(dest="command", metavar="{export,import,rebalance}")
+    export_parser = commands.add_parser(
+        "export", help="Write a snapshot of a stopped server's data directory as a compressed tar stream",
+    )
+    export_parser.add_argument(
+        "-o", "--output",
+        default="-",
+        help="Archive file to write (default: stdout)",
+    )
+    export_parser.add_argument(
+        "--compression",
+        choices=["zstd", "gzip", "none"],
+        default="zstd",
+        help="Archive compression, zstd needs the zstandard package (default: zstd)",
+    )
+    export_parser.add_argument(
+        "--level",
+        type=int,
+        default=3,
+        help="Compression level (default: 3)",
+    )
+    export_parser.add_argument(
+        "--threads",
+        type=int,
+        default=-1,
+        help="zstd compression threads, -1 for one per CPU (default: -1)",
+    )
+    import_parser = commands.add_parser(
+        "import", help="Restore an exported archive into the data directory",
+    )
+    import_parser.add_argument(
+        "-i", "--input",
+        default="-",
+        help="Archive file to read, compression is detected (default: stdin)",
+    )
+    import_parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Threads verifying and installing backups (default: 4)",
+    )
+    rebalance_parser = commands.add_parser(
+        "rebalance", help="Copy backups of users this node hands over to their new owners",
+    )
+    rebalance_parser.add_argument(
+        "--to",
+        required=True,
+        help="Comma-separated base URLs of the new cluster membership",
+    )
+    for command_parser in (export_parser, import_parser, rebalance_parser):
+        # Also accepted after the command; SUPPRESS keeps a value given before it
+        command_parser.add_argument("--data-dir", default=argparse.SUPPRESS, help="Data directory")
     
     args = parser.parse_args()
     
     # Update config
     config.host = args.host
     config.port = args.port
+    config.uds = args.uds
     config.debug = args.debug
+    config.access_log_sample_rate = args.access_log_sample
     config.validate_signatures = args.validate_signatures
+    config.debug_token = args.debug_token
+    config.limits.limit_of_devices = args.limit_of_devices
+    config.max_upload_sessions = args.max_upload_sessions
+    config.max_upload_inflight_mb = args.max_upload_inflight_mb
+    config.backup_cache_mb = args.backup_cache_mb
+    config.compact_devices = args.compact_devices
+    config.scrub_interval = args.scrub_interval
+    config.scrub_rate_mb = args.scrub_rate_mb
+    config.replication_targets = args.replicate_to
+    config.replication_token = args.replication_token
+    if args.cluster_nodes:
+        config.cluster_nodes = [
+            node.strip().rstrip("/") for node in args.cluster_nodes.split(",") if node.strip()
+        ]
+        config.cluster_self = (args.cluster_self or "").rstrip("/") or None
+        config.cluster_redirect = args.cluster_redirect
+        config.cluster_token = args.cluster_token
+        if config.cluster_self not in config.cluster_nodes:
+            parser.error("--cluster-self must be one of --cluster-nodes")
+    if args.watcher_feed:
+        from pathlib import Path
+        config.watcher_feed = Path(args.watcher_feed)
+    if args.capture:
+        from pathlib import Path
+        config.capture_file = Path(args.capture)
     
     if args.data_dir:
         from pathlib import Path
         config.data_dir = Path(args.data_dir)
         config.backups_dir = config.data_dir / "backups"
-        config.data_dir.mkdir(parents=True, exist_ok=True)
-        config.backups_dir.mkdir(parents=True, exist_ok=True)
+    
+    if args.command == "rebalance":
+        _run_rebalance_command(args, parser)
+        return
+    if args.command:
+        _run_archive_command(args)
+        return
+    
+    if args.http2:
+        from pathlib import Path
+        from .app import app
+        from .http2 import generate_self_signed_cert, run_http2
+        
+        certfile = Path(args.certfile) if args.certfile else None
+        keyfile = Path(args.keyfile) if args.keyfile else None
+        if args.self_signed:
+            certfile, keyfile = generate_self_signed_cert(config.data_dir / "tls")
+        run_http2(app, config, certfile, keyfile)
+        return
+    
+    # Imported after argument parsing so --help stays fast
+    import uvicorn
+    
+    # uvloop and httptools are noticeably faster than the pure Python fallbacks
+    loop = "uvloop" if _has_module("uvloop") else "asyncio"
+    http = "httptools" if _has_module("httptools") else "h11"
+    
+    if config.debug:
+        # Reload needs an import string so the worker can re-import the app
+        app = "spaetzli_mock_server.app:app"
+    else:
+        # Pass the app object directly, the import string is only needed for reload
+        from .app import app
     
     # Run server
     uvicorn.run(
-        "spaetzli_mock_server.app:app",
+        app,
         host=config.host,
         port=config.port,
+        uds=config.uds,
         reload=config.debug,
+        loop=loop,
+        http=http,
         log_level="debug" if config.debug else "info",
     )
 
@@ -0,0 +1,73 @@
+"""Write-behind tracking of device activity (last seen timestamps)."""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """
+    Buffers per-device activity and flushes it to storage in batches.
+
+    `touch` only takes a small buffer lock, so request handlers never wait
+    for the storage lock. Repeated touches of the same device between
+    flushes coalesce into one update.
+    """
+
+    def __init__(self, storage: Storage, flush_interval: float = 5.0):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flushed_updates = 0
+
+    def touch(self, device_id: str) -> None:
+        """Record that a device was just active."""
+        if device_id:
+            now = int(time.time())
+            with self._pending_lock:
+                self._pending[device_id] = now
+
+    @property
+    def pending(self) -> bool:
+        """Whether there is buffered activity (a lock-free hint)."""
+        return bool(self._pending)
+
+    def flush(self) -> int:
+        """Apply buffered activity to storage. Returns the number of devices updated."""
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+            # Swap in a fresh buffer; touches from now on land in the new one,
+            # so the old one is ours alone while storage applies it
+            pending, self._pending = self._pending, {}
+        updated = self.storage.touch_devices(pending)
+        self.flushes += 1
+        self.flushed_updates += updated
+        return updated
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush device activity")
@@ -0,0 +1,153 @@
+"""Admission control for backup uploads."""
+
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import ServerConfig
+from .storage import Storage
+
+UPLOAD_PATH = "/nest/1/backup/range"
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _is_continuation(content_range: Optional[str]) -> bool:
+    """A Content-Range not starting at 0 continues an upload that was already admitted."""
+    if not content_range:
+        return False
+    try:
+        start = int(content_range.replace("bytes ", "").split("-", 1)[0])
+    except ValueError:
+        return False
+    return start > 0
+
+
+@dataclass(slots=True)
+class Admission:
+    """An admitted upload request, handed back to AdmissionController.release()."""
+    size: int
+    continuation: bool
+
+
+class AdmissionController:
+    """
+    Bounds concurrent upload sessions and the bytes they buffer.
+
+    A session is an upload request in flight or a chunked upload waiting for
+    its next chunk. Continuation chunks are exempt from the session limit (the
+    session already holds a slot) but still count against the byte budget.
+    Content-Range can be forged, so at most as many continuations are exempt
+    at a time as there are pending sessions; further ones count as sessions.
+    Only used from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, storage: Storage, config: ServerConfig):
+        self.storage = storage
+        self.config = config
+        self.active_requests = 0
+        self.active_continuations = 0
+        self.active_bytes = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_admit(self, size: int, continuation: bool) -> Optional[Admission]:
+        """Admit an upload request of `size` bytes, or refuse it (None)."""
+        pending_sessions, pending_bytes = self.storage.get_pending_upload_stats()
+        max_bytes = self.config.max_upload_inflight_mb * 1024 * 1024
+
+        continuation = continuation and self.active_continuations < pending_sessions
+        sessions = self.active_requests - self.active_continuations + pending_sessions
+        over_sessions = not continuation and sessions >= self.config.max_upload_sessions
+        in_flight = self.active_bytes + pending_bytes
+        # A lone request larger than the budget is let through rather than starved
+        over_bytes = in_flight > 0 and in_flight + size > max_bytes
+
+        if over_sessions or over_bytes:
+            self.rejected += 1
+            return None
+
+        self.active_requests += 1
+        self.active_continuations += continuation
+        self.active_bytes += size
+        self.admitted += 1
+        return Admission(size, continuation)
+
+    def release(self, admission: Admission) -> None:
+        self.active_requests -= 1
+        self.active_continuations -= admission.continuation
+        self.active_bytes -= admission.size
+
+    def stats(self) -> dict:
+        pending_sessions, pending_bytes = self.storage.get_pending_upload_stats()
+        return {
+            "active_requests": self.active_requests,
+            "active_continuations": self.active_continuations,
+            "active_bytes": self.active_bytes,
+            "pending_sessions": pending_sessions,
+            "pending_bytes": pending_bytes,
+            "max_sessions": self.config.max_upload_sessions,
+            "max_inflight_bytes": self.config.max_upload_inflight_mb * 1024 * 1024,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class UploadAdmissionMiddleware:
+    """
+    ASGI middleware applying admission control to backup uploads.
+
+    It runs before the multipart body is read, so refused uploads never get
+    buffered. Refusals are answered with 503 and Retry-After. Uploads without
+    a Content-Length (e.g. chunked transfer encoding) can't be budgeted and
+    are answered with 411.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != UPLOAD_PATH or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            size = int(_header(scope, b"content-length"))
+        except (TypeError, ValueError):
+            size = -1
+        if size < 0:
+            await self._reject(send, 411, "Content-Length required")
+            return
+        continuation = _is_continuation(_header(scope, b"content-range"))
+
+        admission = self.controller.try_admit(size, continuation)
+        if admission is None:
+            retry_after = str(self.controller.config.upload_retry_after).encode()
+            await self._reject(send, 503, "Server busy, retry later", [(b"retry-after", retry_after)])
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(admission)
+
+    @staticmethod
+    async def _reject(send, status: int, error: str, headers=()) -> None:
+        body = json.dumps({"error": error}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
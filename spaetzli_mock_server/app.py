@@ -2,77 +2,180 @@
 
 import logging
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from .config import config
-from .routes import api_router, nest_router
+from .activity import ActivityTracker
+from .admission import AdmissionController, UploadAdmissionMiddleware
+from .cache import ResponseCache
+from .capture import TrafficCapture, TrafficCaptureMiddleware
+from .cluster import ClusterMiddleware
+from .config import ServerConfig, config as default_config
+from .logs import AccessLogMiddleware, setup_logging, stop_logging
+from .routes import api_router, debug_router, nest_router, replication_router
+from .scrubber import BackupScrubber
+from .storage import Storage
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG if config.debug else logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
+    config: ServerConfig = app.state.config
+    storage: Storage = app.state.storage
+    # Set up here rather than at import time so importing the app has no side effects
+    log_listeners = setup_logging(config.debug)
+    config.ensure_dirs()
+    storage.load_state()
     logger.info("🍝 Spaetzli Mock Premium Server starting...")
-    logger.info(f"   Listening on {config.host}:{config.port}")
+    if config.uds:
+        logger.info(f"   Listening on unix:{config.uds}")
+    else:
+        logger.info(f"   Listening on {config.host}:{config.port}")
     logger.info(f"   Signature validation: {'enabled' if config.validate_signatures else 'disabled'}")
     logger.info(f"   Data directory: {config.data_dir.absolute()}")
+    if config.cluster_nodes:
+        mode = "redirect" if config.cluster_redirect else "forward"
+        logger.info(f"   Cluster: {config.cluster_self} of {len(config.cluster_nodes)} nodes ({mode})")
+    
+    evaluator = None
+    if config.watcher_feed:
+        # Imported lazily so numpy is only needed when evaluation is enabled
+        from .evaluation import WatcherEvaluator
+        from .feeds import FileFeed
+        
+        evaluator = WatcherEvaluator(storage, FileFeed(config.watcher_feed))
+        evaluator.start()
+        logger.info(f"   Watcher feed: {config.watcher_feed}")
+    
+    app.state.watcher_evaluator = evaluator
+    
+    scrubber = BackupScrubber(
+        storage,
+        interval=config.scrub_interval,
+        workers=config.scrub_workers,
+        rate_mb=config.scrub_rate_mb,
+    )
+    scrubber.start()
+    app.state.backup_scrubber = scrubber
+    
+    replicator = None
+    if config.replication_targets:
+        from .replication import Replicator, make_target
+        
+        targets = [make_target(spec, config.replication_token) for spec in config.replication_targets]
+        replicator = Replicator(storage, targets)
+        replicator.start()
+        logger.info(f"   Replicating backups to: {', '.join(config.replication_targets)}")
+    app.state.replicator = replicator
+    
+    traffic_capture: TrafficCapture = app.state.traffic_capture
+    if config.capture_file:
+        traffic_capture.start(config.capture_file)
+        logger.info(f"   Capturing traffic to: {config.capture_file}")
+    
+    activity: ActivityTracker = app.state.activity
+    activity.start()
     yield
+    
+    traffic_capture.stop()
+    activity.stop()
+    scrubber.stop()
+    storage.save_state()
+    if replicator:
+        replicator.stop()
+    if evaluator:
+        evaluator.stop()
     logger.info("🍝 Spaetzli Mock Premium Server shutting down...")
-
-
-app = FastAPI(
-    title="Spaetzli - Rotki Premium Mock Server",
-    description="Mock server for Rotki premium features",
-    version="0.1.0",
-    lifespan=lifespan,
-)
-
-# CORS middleware - allow all origins for development
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-# Include routers
-app.include_router(api_router)
-app.include_router(nest_router)
-
-
-@app.get("/")
-async def root():
-    """Health check endpoint."""
-    return {
-        "status": "ok",
-        "service": "spaetzli-mock-premium",
-        "version": "0.1.0",
-    }
-
-
-@app.get("/health")
-async def health():
-    """Health check endpoint."""
-    return {"status": "healthy"}
-
-
-# Error handlers
-@app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception):
-    """Handle uncaught exceptions."""
-    logger.exception(f"Unhandled error: {exc}")
-    return JSONResponse(
-        status_code=500,
-        content={"error": str(exc)},
+    stop_logging(log_listeners)
+
+
+def create_app(config: Optional[ServerConfig] = None, storage: Optional[Storage] = None) -> FastAPI:
+    """
+    Create an app serving `storage` with `config`.
+
+    The config defaults to the global instance set from the command line,
+    the storage to a new one for that config. Routes get them, and the
+    per-app services built here, through the dependencies in deps.py, so
+    several apps can share a process.
+    """
+    config = config or default_config
+    storage = storage or Storage(config)
+    
+    app = FastAPI(
+        title="Spaetzli - Rotki Premium Mock Server",
+        description="Mock server for Rotki premium features",
+        version="0.1.0",
+        lifespan=lifespan,
+    )
+    app.state.config = config
+    app.state.storage = storage
+    app.state.activity = ActivityTracker(storage)
+    app.state.admission = AdmissionController(storage, config)
+    app.state.response_cache = ResponseCache()
+    app.state.traffic_capture = TrafficCapture()
+    # Set by the lifespan, None until the app has started
+    app.state.watcher_evaluator = None
+    app.state.backup_scrubber = None
+    app.state.replicator = None
+    
+    # CORS middleware - allow all origins for development
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
     )
+    
+    # Refuse uploads beyond the session/byte limits before their body is buffered
+    app.add_middleware(UploadAdmissionMiddleware, controller=app.state.admission)
+    
+    # Send requests for users owned by other cluster nodes there (no-op outside cluster mode)
+    app.add_middleware(ClusterMiddleware, config=config)
+    
+    # Sampled structured access logs (off unless access_log_sample_rate > 0)
+    app.add_middleware(AccessLogMiddleware, sample_rate=lambda: config.access_log_sample_rate)
+    
+    # Sanitized traffic capture for replay (no-op unless config.capture_file is set)
+    app.add_middleware(TrafficCaptureMiddleware, capture=app.state.traffic_capture)
+    
+    # Include routers
+    app.include_router(api_router)
+    app.include_router(nest_router)
+    app.include_router(debug_router)
+    app.include_router(replication_router)
+    
+    @app.get("/")
+    async def root():
+        """Health check endpoint."""
+        return {
+            "status": "ok",
+            "service": "spaetzli-mock-premium",
+            "version": "0.1.0",
+        }
+    
+    @app.get("/health")
+    async def health():
+        """Health check endpoint."""
+        return {"status": "healthy"}
+    
+    # Error handlers
+    @app.exception_handler(Exception)
+    async def generic_exception_handler(request: Request, exc: Exception):
+        """Handle uncaught exceptions."""
+        logger.exception("Unhandled error: %s", exc)
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(exc)},
+        )
+    
+    return app
+
+
+# Default app for `uvicorn spaetzli_mock_server.app:app` and reload mode
+app = create_app()
@@ -0,0 +1,255 @@
+"""
+Export and import of a data directory as a compressed tar stream.
+
+Archive layout, in stream order:
+    manifest.json                   devices and watchers
+    backups/{user}_metadata.json    metadata of the next blob, including its hash
+    backups/{user}_backup.bin       the backup blob
+    ...
+
+Blobs are streamed in fixed-size chunks both ways, so memory use doesn't
+depend on how much data is exported or imported.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from .models import BackupMetadata
+from .storage import STATE_FILE, atomic_write
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+ARCHIVE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("zstd compression requires zstandard: pip install zstandard "
+                         "(or use --compression gzip)")
+    return zstandard
+
+
+def _hash_file(f: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+# ========== Export ==========
+
+def _open_consistent_backup(backups_dir: Path, user: str, retries: int = 3):
+    """
+    Open a backup blob together with the metadata it matches.
+
+    Storage replaces files atomically, so an open file never changes. If the
+    server stored a new backup between reading the metadata and opening the
+    blob, the hashes differ and both are read again.
+    """
+    meta_file = backups_dir / f"{user}_metadata.json"
+    for _ in range(retries):
+        metadata = BackupMetadata.from_dict(json.loads(meta_file.read_text()), user)
+        f = open(backups_dir / f"{user}_backup.bin", "rb")
+        if _hash_file(f) == metadata.data_hash:
+            f.seek(0)
+            return metadata, f
+        f.close()
+    return None, None
+
+
+def export_archive(
+    data_dir: Path,
+    out: BinaryIO,
+    compression: str = "zstd",
+    level: int = 3,
+    threads: int = -1,
+) -> dict:
+    """
+    Write a snapshot of a data directory to `out`.
+
+    zstd compresses on `threads` worker threads (-1: one per CPU). Backups are
+    included only if their blob matches the metadata hash. Devices and watchers
+    come from state.json, which a running server only writes on shutdown.
+    """
+    backups_dir = data_dir / "backups"
+    state_file = data_dir / STATE_FILE
+    state = json.loads(state_file.read_text()) if state_file.exists() else {}
+    stats = {"backups": 0, "bytes": 0, "skipped": 0}
+
+    compressor = None
+    if compression == "zstd":
+        compressor = _zstandard().ZstdCompressor(level=level, threads=threads).stream_writer(
+            out, closefd=False,
+        )
+        sink = compressor
+    elif compression == "gzip":
+        compressor = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=min(level, 9))
+        sink = compressor
+    else:
+        sink = out
+
+    with tarfile.open(fileobj=sink, mode="w|", bufsize=CHUNK_SIZE) as tar:
+        _add_bytes(tar, MANIFEST, json.dumps({
+            "version": ARCHIVE_VERSION,
+            "created": int(time.time()),
+            "devices": state.get("devices", []),
+            "watchers": state.get("watchers", []),
+        }).encode())
+
+        meta_files = sorted(backups_dir.glob("*_metadata.json")) if backups_dir.exists() else []
+        for meta_file in meta_files:
+            user = meta_file.name[:-len("_metadata.json")]
+            try:
+                metadata, f = _open_consistent_backup(backups_dir, user)
+            except FileNotFoundError:
+                metadata, f = None, None
+            if f is None:
+                logger.warning("Skipping backup of %s: no blob matching its metadata", user)
+                stats["skipped"] += 1
+                continue
+            with f:
+                _add_bytes(tar, f"backups/{user}_metadata.json", json.dumps(metadata.to_record()).encode())
+                info = tarfile.TarInfo(f"backups/{user}_backup.bin")
+                info.size = os.fstat(f.fileno()).st_size
+                info.mtime = metadata.upload_ts
+                tar.addfile(info, f)
+            stats["backups"] += 1
+            stats["bytes"] += info.size
+
+    if compressor is not None:
+        compressor.close()
+    out.flush()
+    return stats
+
+
+# ========== Import ==========
+
+def _open_decompressed(src: BinaryIO) -> BinaryIO:
+    """Detect the archive compression from its magic bytes."""
+    src = io.BufferedReader(src) if not hasattr(src, "peek") else src
+    magic = src.peek(4)[:4]
+    if magic == ZSTD_MAGIC:
+        return _zstandard().ZstdDecompressor().stream_reader(src, read_across_frames=True)
+    if magic[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=src, mode="rb")
+    return src
+
+
+class _Importer:
+    """Verifies and installs blobs on a worker pool while the stream is read."""
+
+    def __init__(self, backups_dir: Path, workers: int):
+        self.backups_dir = backups_dir
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="import")
+        # Bounds the blobs written to disk but not yet verified
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.stats = {"backups": 0, "bytes": 0, "rejected": 0}
+
+    def submit(self, metadata: BackupMetadata, tmp: Path) -> None:
+        self.slots.acquire()
+        self.futures.append(self.pool.submit(self._install, metadata, tmp))
+
+    def _install(self, metadata: BackupMetadata, tmp: Path) -> None:
+        try:
+            with open(tmp, "rb") as f:
+                actual = _hash_file(f)
+                os.fsync(f.fileno())
+            if actual != metadata.data_hash:
+                logger.error("Rejected backup of %s: hash mismatch", metadata.user)
+                tmp.unlink()
+                with self.lock:
+                    self.stats["rejected"] += 1
+                return
+            os.replace(tmp, self.backups_dir / f"{metadata.user}_backup.bin")
+            atomic_write(
+                self.backups_dir / f"{metadata.user}_metadata.json",
+                json.dumps(metadata.to_record()).encode(),
+            )
+            with self.lock:
+                self.stats["backups"] += 1
+                self.stats["bytes"] += metadata.data_size
+        finally:
+            self.slots.release()
+
+    def finish(self) -> dict:
+        self.pool.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+        return self.stats
+
+
+def import_archive(src: BinaryIO, data_dir: Path, workers: int = 4) -> dict:
+    """
+    Restore an archive into a data directory (the server must not be running).
+
+    Blobs are written to temporary files while reading the stream; worker
+    threads then check their hash against the metadata and move them into
+    place. Blobs failing the check are left out.
+    """
+    backups_dir = data_dir / "backups"
+    backups_dir.mkdir(parents=True, exist_ok=True)
+    importer = _Importer(backups_dir, workers)
+    manifest: Optional[dict] = None
+    metadata: Optional[BackupMetadata] = None
+
+    try:
+        with tarfile.open(fileobj=_open_decompressed(src), mode="r|", bufsize=CHUNK_SIZE) as tar:
+            for member in tar:
+                f = tar.extractfile(member)
+                if f is None:
+                    continue
+                if member.name == MANIFEST:
+                    manifest = json.loads(f.read())
+                    if manifest.get("version") != ARCHIVE_VERSION:
+                        raise ValueError(f"Unsupported archive version {manifest.get('version')}")
+                elif member.name.endswith("_metadata.json"):
+                    user = Path(member.name).name[:-len("_metadata.json")]
+                    metadata = BackupMetadata.from_dict(json.loads(f.read()), user)
+                elif member.name.endswith("_backup.bin"):
+                    user = Path(member.name).name[:-len("_backup.bin")]
+                    if metadata is None or metadata.user != user:
+                        raise ValueError(f"Archive has no metadata for {member.name}")
+                    tmp = backups_dir / f"{user}_backup.bin.import"
+                    with open(tmp, "wb") as out:
+                        shutil.copyfileobj(f, out, CHUNK_SIZE)
+                    importer.submit(metadata, tmp)
+                    metadata = None
+    finally:
+        stats = importer.finish()
+
+    if manifest is None:
+        raise ValueError("Archive has no manifest")
+    atomic_write(data_dir / STATE_FILE, json.dumps({
+        "devices": manifest["devices"],
+        "watchers": manifest["watchers"],
+    }).encode())
+    stats["devices"] = len(manifest["devices"])
+    stats["watchers"] = len(manifest["watchers"])
+    return stats
@@ -39,7 +39,7 @@ def validate_signature(
     """
     if not config.validate_signatures:
         # Accept any credentials in mock mode
-        logger.debug(f"Signature validation disabled, accepting request for {method}")
+        logger.debug("Signature validation disabled, accepting request for %s", method)
         return True
     
     # For strict mode, we'd need to know the secret
@@ -0,0 +1,136 @@
+"""In-memory caches: backup blobs and serialized list responses."""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+class BackupCache:
+    """
+    In-memory LRU cache of backup data bounded by a total byte budget.
+
+    Only the hot tier lives here; anything evicted is still on disk and
+    is re-read by the storage layer on the next miss. Not thread-safe,
+    callers are expected to hold the storage lock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._entries
+
+    @property
+    def size_bytes(self) -> int:
+        """Total bytes currently held in memory."""
+        return self._size
+
+    def get(self, user: str) -> Optional[bytes]:
+        """Return cached data for a user and mark it as recently used."""
+        data = self._entries.get(user)
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user)
+        self.hits += 1
+        return data
+
+    def put(self, user: str, data: bytes) -> bool:
+        """
+        Cache data for a user, evicting least recently used entries.
+
+        Returns False if the blob alone exceeds the budget and was not cached.
+        """
+        self.discard(user)
+        if len(data) > self.max_bytes:
+            return False
+
+        self._entries[user] = data
+        self._size += len(data)
+        self._evict()
+        return True
+
+    def discard(self, user: str) -> None:
+        """Drop a user's entry if present."""
+        data = self._entries.pop(user, None)
+        if data is not None:
+            self._size -= len(data)
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the byte budget, evicting as needed."""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self) -> None:
+        """Drop all cached entries (counters are kept)."""
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters and occupancy."""
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            _, data = self._entries.popitem(last=False)
+            self._size -= len(data)
+            self.evictions += 1
+
+
+class ResponseCache:
+    """
+    Pre-encoded response bodies keyed by (collection, user) and generation.
+
+    Only the body for the latest generation seen is kept per key, so a
+    change in storage (which bumps the generation) invalidates exactly that
+    entry in O(1) and memory stays bounded by the number of users.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[int, bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: Hashable, generation: int, build: Callable[[], Tuple[bytes, int]]) -> bytes:
+        """
+        Return the body for `key` at `generation`, building it on a miss.
+
+        `build` returns the encoded body and the generation it was read at,
+        which may be newer than `generation` if storage changed meanwhile.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        body, built_generation = build()
+        self._entries[key] = (built_generation, body)
+        return body
+
+    def clear(self) -> None:
+        """Drop all cached bodies (counters are kept)."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters and occupancy."""
+        return {
+            "entries": len(self._entries),
+            "size_bytes": sum(len(body) for _, body in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
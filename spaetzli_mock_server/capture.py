@@ -0,0 +1,295 @@
+"""Opt-in traffic capture: sanitized request logs for replay with scripts/replay.py."""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+from urllib.parse import parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_VERSION = 1
+CAPTURED_PREFIXES = ("/api/", "/nest/")
+# Headers kept verbatim, everything else (API-KEY, API-SIGN, ...) is dropped
+KEPT_HEADERS = (b"content-range",)
+AUTH_HEADERS = (b"api-key", b"api-sign")
+# Fields holding protocol vocabulary rather than user data, kept verbatim
+PUBLIC_FIELDS = frozenset({"compression", "platform", "type", "watcher_type"})
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class Sanitizer:
+    """
+    Replaces strings with pseudonyms of the same length.
+
+    Pseudonyms are keyed with a random per-capture secret, so they can't be
+    reversed, but are consistent within a capture: a device identifier
+    registered in one request is the one checked in a later request. Numbers
+    and booleans (also as strings, e.g. in query parameters) and the values
+    of PUBLIC_FIELDS are kept.
+    """
+
+    def __init__(self, secret: Optional[bytes] = None):
+        self._secret = secret or os.urandom(32)
+
+    def pseudonym(self, value: str) -> str:
+        if not value or value.isdigit() or value.lower() in ("true", "false"):
+            return value
+        digest = hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()
+        return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+    def value(self, value: Any) -> Any:
+        """Sanitize a decoded JSON value, keeping its structure and keys."""
+        if isinstance(value, str):
+            return self.pseudonym(value)
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.field(key, item) for key, item in value.items()}
+        return value
+
+    def field(self, name: str, value: Any) -> Any:
+        return value if name in PUBLIC_FIELDS else self.value(value)
+
+    def query(self, query_string: str) -> str:
+        return urlencode([(key, self.field(key, value)) for key, value in parse_qsl(query_string)])
+
+
+def _multipart_parts(body: bytes, boundary: bytes) -> Iterator[tuple]:
+    """Yield (name, filename, content) for each part of a multipart/form-data body."""
+    for part in body.split(b"--" + boundary)[1:]:
+        if part.startswith(b"--"):
+            break
+        head, _, content = part.partition(b"\r\n\r\n")
+        disposition = {}
+        for line in head.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("content-disposition:"):
+                for item in line.split(";")[1:]:
+                    key, _, value = item.strip().partition("=")
+                    disposition[key] = value.strip('"')
+        yield disposition.get("name"), disposition.get("filename"), content[:-2]
+
+
+def reduce_body(body: bytes, content_type: str) -> Union[bytes, dict, None]:
+    """
+    Drop the bulk of a request body before it is queued for capture.
+
+    JSON bodies are kept as they are. Multipart bodies become their form fields
+    and the sizes of their files, any other content just its size.
+    """
+    if not body:
+        return None
+    if content_type.startswith("application/json"):
+        return body
+    if content_type.startswith("multipart/form-data") and "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip('"').encode()
+        form: Dict[str, str] = {}
+        files: Dict[str, int] = {}
+        for name, filename, content in _multipart_parts(body, boundary):
+            if filename is not None:
+                files[name] = len(content)
+            else:
+                form[name] = content.decode("utf-8", "replace")
+        return {"form": form, "files": files}
+    return {"size": len(body)}
+
+
+def sanitize_body(body: Union[bytes, dict, None], sanitizer: Sanitizer) -> Optional[dict]:
+    """
+    Describe a body reduced by reduce_body() without its content.
+
+    JSON bodies keep their structure with strings pseudonymized, form fields
+    likewise; uploaded files and any other content are reduced to their size.
+    """
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        try:
+            return {"json": sanitizer.value(json.loads(body))}
+        except ValueError:
+            return {"size": len(body)}
+    if "form" in body:
+        form = {name: sanitizer.field(name, value) for name, value in body["form"].items()}
+        return {"form": form, "files": body["files"]}
+    return body
+
+
+def synthetic_blob(seed: str, size: int) -> bytes:
+    """Deterministic filler bytes standing in for a captured upload."""
+    return random.Random(seed).randbytes(size)
+
+
+def read_capture(path: Path) -> Iterator[dict]:
+    """
+    Yield the request records of a capture file.
+
+    Records are written as requests finish, so they come in completion order;
+    sort them by "t" for arrival order.
+    """
+    with gzip.open(path, "rt") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version: {header.get('version')}")
+        for line in f:
+            yield json.loads(line)
+
+
+class TrafficCapture:
+    """
+    Writes sanitized request records to a gzipped JSON-lines file.
+
+    The middleware only hands requests, with uploaded files reduced to their
+    size, to a queue; sanitizing, encoding and writing happen on a background
+    thread. Each record holds the arrival offset in seconds ("t"), method,
+    path, sanitized query and body, the kept headers, whether credentials
+    were sent and the response status. If the writer falls `max_queued`
+    records behind, further requests are dropped and counted.
+    """
+
+    def __init__(self, max_queued: int = 10000):
+        self.path: Optional[Path] = None
+        self.records = 0
+        self.dropped = 0
+        self._started = 0.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(max_queued)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None
+
+    def start(self, path: Path) -> None:
+        if self.active:
+            return
+        self.path = Path(path)
+        self.records = 0
+        self.dropped = 0
+        self._started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, args=(Sanitizer(),), name="traffic-capture", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        logger.info("Captured %d requests to %s (%d dropped)", self.records, self.path, self.dropped)
+
+    def record(self, arrived: float, scope, body: bytes, status: int, response_body: bytes) -> None:
+        """Queue one finished request; `arrived` is its time.monotonic() on arrival."""
+        reduced = reduce_body(body, _header(scope["headers"], b"content-type") or "")
+        try:
+            self._queue.put_nowait((arrived - self._started, scope, reduced, status, response_body))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self, sanitizer: Sanitizer) -> None:
+        with gzip.open(self.path, "wt") as f:
+            f.write(json.dumps({"version": CAPTURE_VERSION, "started_at": time.time()}) + "\n")
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    record = self._encode(sanitizer, *item)
+                except Exception:
+                    logger.exception("Could not capture request")
+                    continue
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                self.records += 1
+
+    @staticmethod
+    def _encode(sanitizer: Sanitizer, offset: float, scope, body, status: int, response_body: bytes) -> dict:
+        headers = scope["headers"]
+        record = {
+            "t": round(offset, 4),
+            "m": scope["method"],
+            "p": scope["path"],
+            "s": status,
+        }
+        query = scope.get("query_string", b"").decode("latin-1")
+        if query:
+            record["q"] = sanitizer.query(query)
+        kept = {name.decode(): _header(headers, name) for name in KEPT_HEADERS if _header(headers, name)}
+        if kept:
+            record["h"] = kept
+        if any(_header(headers, name) for name in AUTH_HEADERS):
+            record["a"] = 1
+        described = sanitize_body(body, sanitizer)
+        if described:
+            record["b"] = described
+        if response_body:
+            # Server-assigned upload ids, later requests refer to them
+            try:
+                upload_id = json.loads(response_body).get("upload_id")
+            except (ValueError, AttributeError):
+                upload_id = None
+            if upload_id:
+                record["u"] = sanitizer.pseudonym(upload_id)
+        return record
+
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware feeding /api/ and /nest/ requests to a TrafficCapture.
+
+    A no-op while the capture is not started. Request bodies are buffered
+    as they are read by the app, so captured uploads are briefly held twice,
+    until the finished request is handed to the capture.
+    """
+
+    def __init__(self, app, capture: TrafficCapture):
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.capture.active
+            or not scope["path"].startswith(CAPTURED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.monotonic()
+        body = bytearray()
+        response_body = bytearray()
+        status = 0
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and status == 206:
+                # Only partial uploads answer with something replay needs (the upload id)
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self.capture.record(arrived, scope, bytes(body), status or 500, bytes(response_body))
+
@@ -0,0 +1,272 @@
+"""Cluster mode: users are split across nodes by consistent hashing."""
+
+import hashlib
+import hmac
+import logging
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import ServerConfig
+from .replication import PeerTarget, ReplicationTarget, read_backup
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Set on forwarded requests so the receiving node never forwards them again,
+# its value is the cluster token
+FORWARDED_HEADER = b"x-spaetzli-forwarded"
+NODE_HEADER = b"x-spaetzli-node"
+
+# Only per-user routes are partitioned; health and debug routes stay local
+PARTITIONED_PREFIXES = ("/api/", "/nest/")
+
+# Hop-by-hop headers are not passed on when forwarding
+HOP_HEADERS = {b"connection", b"keep-alive", b"transfer-encoding", b"te", b"upgrade", b"host"}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Each node is placed at `vnodes` points on the ring and a key belongs to
+    the first point clockwise of its hash. Adding or removing a node only
+    moves the keys between its points and their predecessors, about 1/N of
+    all keys.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 128):
+        self.nodes = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("A hash ring needs at least one node")
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        index = bisect_right(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+def rebalance_plan(old: HashRing, new: HashRing, keys: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """Keys whose owner changes between two rings, as key -> (old owner, new owner)."""
+    plan = {}
+    for key in keys:
+        old_owner, new_owner = old.owner(key), new.owner(key)
+        if old_owner != new_owner:
+            plan[key] = (old_owner, new_owner)
+    return plan
+
+
+def apply_rebalance(
+    storage: Storage,
+    plan: Dict[str, Tuple[str, str]],
+    self_node: str,
+    token: Optional[str] = None,
+    target_for: Optional[Callable[[str], ReplicationTarget]] = None,
+    batch_size: int = 16,
+) -> Dict[str, List[str]]:
+    """
+    Copy the backups of the users this node hands over in `plan` to their new owners.
+
+    Backups are sent to the new owner's replication endpoint, so it must run
+    with the same replication `token`. Local copies are kept, so a failed
+    copy can simply be retried. Returns {"moved": [...], "failed": [...]}.
+    """
+    target_for = target_for or (lambda node: PeerTarget(node, token))
+    outgoing: Dict[str, List[str]] = {}
+    for user, (old_owner, new_owner) in sorted(plan.items()):
+        if old_owner == self_node and new_owner != self_node:
+            outgoing.setdefault(new_owner, []).append(user)
+
+    moved, failed = [], []
+    for new_owner, users in outgoing.items():
+        target = target_for(new_owner)
+        try:
+            for start in range(0, len(users), batch_size):
+                batch = []
+                for user in users[start:start + batch_size]:
+                    metadata = storage.get_backup_metadata(user)
+                    if metadata is None or metadata.corrupted:
+                        continue  # nothing (intact) to copy
+                    data = read_backup(storage, metadata)
+                    if data is None:
+                        failed.append(user)
+                    else:
+                        batch.append((metadata, data))
+                if not batch:
+                    continue
+                try:
+                    rejected = set(target.replicate(batch))
+                except Exception as e:
+                    logger.warning("Copying %d backups to %s failed: %s", len(batch), new_owner, e)
+                    rejected = {metadata.user for metadata, _ in batch}
+                for metadata, _ in batch:
+                    (failed if metadata.user in rejected else moved).append(metadata.user)
+        finally:
+            target.close()
+    return {"moved": moved, "failed": failed}
+
+
+def partition_key(scope) -> str:
+    """The user a request belongs to: its API key (Rotki sends one per premium account)."""
+    for name, value in scope["headers"]:
+        if name == b"api-key":
+            return value.decode("latin-1")
+    return "default"
+
+
+class ClusterMiddleware:
+    """
+    ASGI middleware sending requests for users owned by another node there.
+
+    In "forward" mode the request is proxied to the owner and its response
+    streamed back; in "redirect" mode the client gets a 307 to the owner.
+    A no-op unless cluster_nodes is configured.
+    """
+
+    def __init__(self, app, config: ServerConfig):
+        self.app = app
+        self.config = config
+        self._ring: Optional[HashRing] = None
+        self._ring_nodes: List[str] = []
+        self._client = None
+
+    @property
+    def ring(self) -> Optional[HashRing]:
+        # Built lazily so it follows config set after app creation
+        if self.config.cluster_nodes != self._ring_nodes:
+            self._ring_nodes = list(self.config.cluster_nodes)
+            self._ring = HashRing(self._ring_nodes) if self._ring_nodes else None
+        return self._ring
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.app(scope, receive, self._close_on_shutdown(send))
+            return
+
+        ring = self.ring
+        if (
+            ring is None
+            or scope["type"] != "http"
+            or not scope["path"].startswith(PARTITIONED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        owner = ring.owner(partition_key(scope))
+        forwarded = self._forwarded(scope)
+        if owner == self.config.cluster_self or forwarded:
+            await self.app(scope, receive, self._tag_response(send))
+        elif forwarded is not None:
+            # Not from a peer: serving it would bypass ownership, forwarding it could loop
+            await self._misdirected(send)
+        elif self.config.cluster_redirect:
+            await self._redirect(scope, send, owner)
+        else:
+            await self._forward(scope, receive, send, owner)
+
+    def _forwarded(self, scope) -> Optional[bool]:
+        """None if not marked as forwarded, else whether the mark carries the cluster token."""
+        for name, value in scope["headers"]:
+            if name == FORWARDED_HEADER:
+                token = self.config.cluster_token
+                return bool(token) and hmac.compare_digest(value, token.encode())
+        return None
+
+    def _tag_response(self, send):
+        node = (self.config.cluster_self or "").encode()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(NODE_HEADER, node)]
+            await send(message)
+
+        return send_wrapper
+
+    def _close_on_shutdown(self, send):
+        async def send_wrapper(message):
+            if message["type"] == "lifespan.shutdown.complete" and self._client is not None:
+                await self._client.aclose()
+                self._client = None
+            await send(message)
+
+        return send_wrapper
+
+    @staticmethod
+    async def _misdirected(send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 421,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": b'{"error": "Not the owner of this user"}'})
+
+    @staticmethod
+    def _target_url(scope, owner: str) -> str:
+        url = owner.rstrip("/") + scope["path"]
+        if scope["query_string"]:
+            url += "?" + scope["query_string"].decode("latin-1")
+        return url
+
+    async def _redirect(self, scope, send, owner: str) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 307,
+            "headers": [
+                (b"location", self._target_url(scope, owner).encode()),
+                (b"content-length", b"0"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _forward(self, scope, receive, send, owner: str) -> None:
+        if self._client is None:
+            # Imported lazily, httpx is only needed when forwarding
+            import httpx
+            self._client = httpx.AsyncClient(timeout=None)
+
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        headers = [(k, v) for k, v in scope["headers"] if k not in HOP_HEADERS]
+        headers.append((FORWARDED_HEADER, (self.config.cluster_token or "").encode()))
+        request = self._client.build_request(
+            scope["method"], self._target_url(scope, owner), headers=headers, content=bytes(body),
+        )
+        try:
+            response = await self._client.send(request, stream=True)
+        except Exception as e:
+            logger.warning("Forwarding to %s failed: %s", owner, e)
+            await send({
+                "type": "http.response.start",
+                "status": 502,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"error": "Owner node unreachable"}'})
+            return
+
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (k, v) for k, v in response.headers.raw if k.lower() not in HOP_HEADERS
+                ],
+            })
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
@@ -2,6 +2,7 @@
 
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import List, Optional
 
 
 @dataclass
@@ -28,21 +29,59 @@ class ServerConfig:
     """Server configuration."""
     host: str = "0.0.0.0"
     port: int = 8080
+    uds: Optional[str] = None  # Unix socket path, replaces host/port when set
     debug: bool = False
     
     # Storage paths
     data_dir: Path = field(default_factory=lambda: Path("./data"))
     backups_dir: Path = field(default_factory=lambda: Path("./data/backups"))
     
+    # Memory budget for hot backups kept in RAM (the rest is read from disk)
+    backup_cache_mb: int = 64
+    
+    # Keep devices in a column store (less memory per device, slower single reads)
+    compact_devices: bool = False
+    
+    # JSON lines tick file that drives watcher evaluation (disabled if None)
+    watcher_feed: Optional[Path] = None
+    
+    # Upload admission control: beyond these, uploads get 503 + Retry-After
+    max_upload_sessions: int = 32  # concurrent upload requests + pending chunked uploads
+    max_upload_inflight_mb: int = 256  # request bodies in flight + buffered chunks
+    upload_retry_after: int = 5  # seconds
+    upload_session_ttl: int = 3600  # seconds before an unfinished chunked upload is dropped
+    
+    # Background integrity scrubbing of stored backups
+    scrub_interval: int = 86400  # seconds between passes (0 disables scheduled passes)
+    scrub_workers: int = 2
+    scrub_rate_mb: float = 32.0  # disk read budget in MB/s shared by all workers (0 = unlimited)
+    
+    # Cluster mode: users are split across these nodes (base URLs) by consistent hashing
+    cluster_nodes: List[str] = field(default_factory=list)  # empty disables cluster mode
+    cluster_self: Optional[str] = None  # this node's entry in cluster_nodes
+    cluster_redirect: bool = False  # redirect (307) to the owner instead of forwarding
+    cluster_token: Optional[str] = None  # marks forwarded requests, peers serve them without rerouting
+    
+    # Backup replication: directories or peer node URLs each new backup is copied to
+    replication_targets: List[str] = field(default_factory=list)
+    replication_token: Optional[str] = None  # sent to peers, and required to accept replicas
+    
+    # Fraction of requests written to the structured access log (0 disables it)
+    access_log_sample_rate: float = 0.0
+    
+    # Sanitized capture of /api/ and /nest/ traffic for scripts/replay.py (None disables it)
+    capture_file: Optional[Path] = None
+    
     # Authentication
     validate_signatures: bool = False  # Set True for strict mode
+    debug_token: Optional[str] = None  # enables /debug/* when set (X-Debug-Token header)
     
     # Premium configuration
     limits: PremiumLimits = field(default_factory=PremiumLimits)
     capabilities: PremiumCapabilities = field(default_factory=PremiumCapabilities)
     
-    def __post_init__(self):
-        """Ensure directories exist."""
+    def ensure_dirs(self):
+        """Create the data directories. Called on startup, not at import time."""
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.backups_dir.mkdir(parents=True, exist_ok=True)
 
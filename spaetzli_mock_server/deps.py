@@ -0,0 +1,39 @@
+"""FastAPI dependencies resolving the config, storage and services of the serving app."""
+
+from typing import Annotated
+
+from fastapi import Depends, Request
+
+from .activity import ActivityTracker
+from .admission import AdmissionController
+from .cache import ResponseCache
+from .config import ServerConfig
+from .storage import Storage
+
+
+def get_config(request: Request) -> ServerConfig:
+    return request.app.state.config
+
+
+def get_storage(request: Request) -> Storage:
+    return request.app.state.storage
+
+
+def get_activity(request: Request) -> ActivityTracker:
+    return request.app.state.activity
+
+
+def get_admission(request: Request) -> AdmissionController:
+    return request.app.state.admission
+
+
+def get_response_cache(request: Request) -> ResponseCache:
+    return request.app.state.response_cache
+
+
+# Annotated aliases for route signatures, e.g. `storage: StorageDep`
+ConfigDep = Annotated[ServerConfig, Depends(get_config)]
+StorageDep = Annotated[Storage, Depends(get_storage)]
+ActivityDep = Annotated[ActivityTracker, Depends(get_activity)]
+AdmissionDep = Annotated[AdmissionController, Depends(get_admission)]
+ResponseCacheDep = Annotated[ResponseCache, Depends(get_response_cache)]
@@ -0,0 +1,238 @@
+"""Vectorized watcher evaluation against a local tick feed."""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .feeds import Tick, TickFeed
+from .models import Watcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WatcherSpec:
+    """Which watcher args hold the subject key and the threshold for a watcher type."""
+    key_arg: str
+    threshold_arg: str
+    op_arg: str = "op"
+
+
+DEFAULT_SPECS: Dict[str, WatcherSpec] = {
+    "makervault_collateralization_ratio": WatcherSpec(key_arg="vault_id", threshold_arg="ratio"),
+}
+
+# op -> (sign, inclusive): a watcher triggers when sign * (value - threshold) > 0,
+# or == 0 for inclusive ops
+_OPS = {
+    "gt": (1.0, False),
+    "ge": (1.0, True),
+    "lt": (-1.0, False),
+    "le": (-1.0, True),
+}
+
+
+@dataclass
+class TriggerEvent:
+    """A watcher that started triggering on a tick."""
+    identifier: str
+    watcher_type: str
+    key: str
+    value: float
+    threshold: float
+    ts: int
+
+    def to_dict(self) -> dict:
+        return {
+            "identifier": self.identifier,
+            "type": self.watcher_type,
+            "key": self.key,
+            "value": self.value,
+            "threshold": self.threshold,
+            "ts": self.ts,
+        }
+
+
+class _TypeColumns:
+    """Columnar view of all watchers of one type."""
+
+    def __init__(self, watchers: List[Watcher], spec: WatcherSpec):
+        identifiers = []
+        key_names: List[str] = []
+        key_pos: Dict[str, int] = {}
+        key_idx = []
+        thresholds = []
+        signs = []
+        inclusive = []
+
+        for watcher in watchers:
+            args = watcher.args
+            try:
+                key = str(args[spec.key_arg])
+                threshold = float(args[spec.threshold_arg])
+                sign, incl = _OPS[args.get(spec.op_arg, "gt")]
+            except (KeyError, TypeError, ValueError):
+                logger.debug("Skipping watcher %s with unusable args", watcher.identifier)
+                continue
+            pos = key_pos.get(key)
+            if pos is None:
+                pos = key_pos[key] = len(key_names)
+                key_names.append(key)
+            identifiers.append(watcher.identifier)
+            key_idx.append(pos)
+            thresholds.append(threshold)
+            signs.append(sign)
+            inclusive.append(incl)
+
+        self.identifiers = identifiers
+        self.key_names = key_names
+        self.key_pos = key_pos
+        self.key_idx = np.asarray(key_idx, dtype=np.intp)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.signs = np.asarray(signs, dtype=np.float64)
+        self.inclusive = np.asarray(inclusive, dtype=bool)
+        self.active = np.zeros(len(identifiers), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.identifiers)
+
+    def evaluate(self, values: Dict[str, float]) -> np.ndarray:
+        """Return indices of watchers that newly trigger for these values."""
+        current = np.full(len(self.key_names), np.nan)
+        for key, value in values.items():
+            pos = self.key_pos.get(key)
+            if pos is not None:
+                current[pos] = value
+
+        # Subjects missing from the tick are NaN and compare False everywhere
+        value = current[self.key_idx]
+        diff = self.signs * (value - self.thresholds)
+        hit = (diff > 0) | (self.inclusive & (diff == 0))
+        # Only report on the rising edge, not on every tick while it holds
+        new = hit & ~self.active
+        # Watchers whose subject isn't in this (partial) tick keep their state
+        present = ~np.isnan(value)
+        self.active[present] = hit[present]
+        return np.flatnonzero(new)
+
+
+class WatcherEngine:
+    """Evaluates all loaded watchers of a type in one vectorized pass per tick."""
+
+    def __init__(self, specs: Optional[Dict[str, WatcherSpec]] = None, max_events: int = 10_000):
+        self.specs = DEFAULT_SPECS if specs is None else specs
+        self._columns: Dict[str, _TypeColumns] = {}
+        self.events: Deque[TriggerEvent] = deque(maxlen=max_events)
+        self._events_lock = threading.Lock()  # the events are read from request threads
+        self.ticks_evaluated = 0
+
+    def __len__(self) -> int:
+        return sum(len(c) for c in self._columns.values())
+
+    def load(self, watchers: Iterable[Watcher]) -> None:
+        """(Re)build the columnar arrays from the given watchers."""
+        grouped: Dict[str, List[Watcher]] = {}
+        for watcher in watchers:
+            if watcher.watcher_type in self.specs:
+                grouped.setdefault(watcher.watcher_type, []).append(watcher)
+
+        columns = {}
+        for watcher_type, group in grouped.items():
+            cols = _TypeColumns(group, self.specs[watcher_type])
+            # Keep trigger state for watchers that survived the reload
+            old = self._columns.get(watcher_type)
+            if old is not None and len(old):
+                still_active = set(np.asarray(old.identifiers, dtype=object)[old.active])
+                if still_active:
+                    cols.active = np.fromiter(
+                        (i in still_active for i in cols.identifiers), dtype=bool, count=len(cols)
+                    )
+            columns[watcher_type] = cols
+        self._columns = columns
+
+    def evaluate(self, tick: Tick) -> List[TriggerEvent]:
+        """Evaluate a tick and record the watchers that triggered."""
+        self.ticks_evaluated += 1
+        cols = self._columns.get(tick.watcher_type)
+        if cols is None or not len(cols):
+            return []
+
+        triggered = cols.evaluate(tick.values)
+        events = [
+            TriggerEvent(
+                identifier=cols.identifiers[i],
+                watcher_type=tick.watcher_type,
+                key=cols.key_names[cols.key_idx[i]],
+                value=tick.values[cols.key_names[cols.key_idx[i]]],
+                threshold=float(cols.thresholds[i]),
+                ts=tick.ts,
+            )
+            for i in triggered
+        ]
+        with self._events_lock:
+            self.events.extend(events)
+        return events
+
+    def recent_events(self, limit: int) -> List[TriggerEvent]:
+        """The last `limit` recorded events, oldest first."""
+        with self._events_lock:
+            return list(self.events)[-limit:]
+
+
+class WatcherEvaluator:
+    """Background thread feeding ticks from a feed into a WatcherEngine."""
+
+    def __init__(
+        self,
+        storage,
+        feed: TickFeed,
+        engine: Optional[WatcherEngine] = None,
+        reload_interval: float = 5.0,
+        poll_timeout: float = 0.5,
+    ):
+        self.storage = storage
+        self.feed = feed
+        self.engine = engine or WatcherEngine()
+        self.reload_interval = reload_interval
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_reload = 0.0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="watcher-evaluator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.feed.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._step()
+            except Exception:
+                # Keep evaluating; a bad tick or feed error must not stop the thread
+                logger.exception("Watcher evaluation failed")
+                self._stop.wait(self.poll_timeout)
+
+    def _step(self) -> None:
+        ticks = self.feed.poll(self.poll_timeout)
+        if not ticks:
+            return
+        if time.monotonic() - self._last_reload >= self.reload_interval:
+            self.engine.load(self.storage.get_watchers())
+            self._last_reload = time.monotonic()
+        for tick in ticks:
+            for event in self.engine.evaluate(tick):
+                logger.info(
+                    "Watcher %s triggered: %s=%s vs %s",
+                    event.identifier, event.key, event.value, event.threshold,
+                )
@@ -0,0 +1,116 @@
+"""Local price/ratio feeds that drive watcher evaluation."""
+
+import json
+import logging
+import os
+import queue
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Tick:
+    """A batch of current values for one watcher type, keyed by subject (e.g. vault id)."""
+    watcher_type: str
+    values: Dict[str, float]
+    ts: int = field(default_factory=lambda: int(time.time()))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Tick":
+        return cls(
+            watcher_type=data["type"],
+            values={str(k): float(v) for k, v in data["values"].items()},
+            ts=int(data.get("ts") or time.time()),
+        )
+
+
+class TickFeed:
+    """Base class for tick sources."""
+
+    def poll(self, timeout: float) -> List[Tick]:
+        """Return the ticks available now, waiting up to `timeout` seconds for one."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the feed."""
+
+
+class InMemoryFeed(TickFeed):
+    """In-process feed, ticks are pushed by the caller (used in tests and benchmarks)."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tick]" = queue.Queue()
+
+    def push(self, tick: Tick) -> None:
+        self._queue.put(tick)
+
+    def poll(self, timeout: float) -> List[Tick]:
+        try:
+            ticks = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                ticks.append(self._queue.get_nowait())
+            except queue.Empty:
+                return ticks
+
+
+class FileFeed(TickFeed):
+    """
+    Tails a JSON lines file, one tick per line:
+
+        {"type": "makervault_collateralization_ratio", "values": {"24": 180.5}, "ts": 1700000000}
+
+    A file that was truncated or replaced (e.g. by log rotation) is read
+    again from the start.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._offset = 0
+        self._partial = b""
+        self._inode = None
+
+    def poll(self, timeout: float) -> List[Tick]:
+        ticks = self._read()
+        if not ticks and timeout > 0:
+            time.sleep(timeout)
+            ticks = self._read()
+        return ticks
+
+    def _read(self) -> List[Tick]:
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    if self._inode is not None:
+                        logger.info("%s was truncated or replaced, reading it from the start", self.path)
+                    self._inode = stat.st_ino
+                    self._offset = 0
+                    self._partial = b""
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        if not data:
+            return []
+        self._offset += len(data)
+
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()  # incomplete trailing line, if any
+        ticks = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ticks.append(Tick.from_dict(json.loads(line)))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                logger.warning("Skipping malformed tick in %s: %.200r", self.path, line)
+        return ticks
+
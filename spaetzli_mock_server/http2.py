@@ -0,0 +1,67 @@
+"""HTTP/2 serving mode, backed by hypercorn (optional dependency)."""
+
+import asyncio
+import subprocess
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .config import ServerConfig
+
+
+def generate_self_signed_cert(cert_dir: Path) -> Tuple[Path, Path]:
+    """
+    Create (or reuse) a self-signed certificate for localhost, for local testing only.
+
+    Returns (certfile, keyfile).
+    """
+    cert_dir.mkdir(parents=True, exist_ok=True)
+    certfile = cert_dir / "localhost.crt"
+    keyfile = cert_dir / "localhost.key"
+    if certfile.exists() and keyfile.exists():
+        return certfile, keyfile
+
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", str(keyfile), "-out", str(certfile),
+            "-days", "365", "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    keyfile.chmod(0o600)
+    return certfile, keyfile
+
+
+def run_http2(
+    app,
+    config: ServerConfig,
+    certfile: Optional[Path] = None,
+    keyfile: Optional[Path] = None,
+) -> None:
+    """
+    Serve the app with HTTP/2 support.
+
+    Without a certificate this speaks h2c (prior knowledge or Upgrade) next to
+    HTTP/1.1; with one, HTTP/2 is negotiated over TLS via ALPN.
+    """
+    try:
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+    except ImportError:
+        raise SystemExit("HTTP/2 mode requires hypercorn: pip install hypercorn")
+
+    hc_config = Config()
+    hc_config.bind = [f"unix:{config.uds}" if config.uds else f"{config.host}:{config.port}"]
+    hc_config.loglevel = "DEBUG" if config.debug else "INFO"
+    hc_config.accesslog = None
+    # One multiplexed connection carries all of a client's requests, so don't
+    # force it to reconnect after hypercorn's default of 1000
+    hc_config.keep_alive_max_requests = 100_000
+    if certfile and keyfile:
+        hc_config.certfile = str(certfile)
+        hc_config.keyfile = str(keyfile)
+        hc_config.alpn_protocols = ["h2", "http/1.1"]
+
+    asyncio.run(serve(app, hc_config))
@@ -0,0 +1,114 @@
+"""Logging setup: log records are handed to a queue and written by a background thread."""
+
+import json
+import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Tuple
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Loggers uvicorn configures with its own handlers
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+access_logger = logging.getLogger("spaetzli_mock_server.access")
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the message in the calling thread so the
+    record can be pickled; our queue never leaves the process, so the
+    event loop thread only pays for the enqueue.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+QueuedLoggers = List[Tuple[logging.Logger, QueueListener]]
+
+
+def _move_behind_queue(logger: logging.Logger) -> QueueListener:
+    """Replace a logger's handlers with a queue drained by a listener thread."""
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    logger.handlers = [_InProcessQueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+def setup_logging(debug: bool = False) -> QueuedLoggers:
+    """
+    Configure logging so that no log I/O happens on the event loop thread.
+
+    Returns the queued loggers, pass them to stop_logging() on shutdown.
+    """
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+
+    queued = []
+    for logger in [root] + [logging.getLogger(name) for name in UVICORN_LOGGERS]:
+        if logger.handlers and not any(isinstance(h, QueueHandler) for h in logger.handlers):
+            queued.append((logger, _move_behind_queue(logger)))
+    return queued
+
+
+def stop_logging(queued: QueuedLoggers) -> None:
+    """Flush pending records, stop the listener threads and restore direct handlers."""
+    for logger, listener in queued:
+        # Restore first so records logged after shutdown (e.g. by uvicorn) don't
+        # end up in a queue nobody drains
+        logger.handlers = list(listener.handlers)
+        listener.stop()
+
+
+class AccessLogMiddleware:
+    """
+    ASGI middleware emitting sampled, structured access logs.
+
+    The sampling decision is made before anything else, so unsampled requests
+    only cost one random() call. Records are JSON with route, status, latency
+    and response bytes.
+    """
+
+    def __init__(self, app, sample_rate):
+        self.app = app
+        # Callable so the rate can follow config changes made after app creation
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate():
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 0
+        sent = 0
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            access_logger.info(json.dumps({
+                "method": scope["method"],
+                "route": getattr(route, "path", scope["path"]),
+                "status": status or 500,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+                "bytes": sent,
+            }))
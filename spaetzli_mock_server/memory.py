@@ -0,0 +1,103 @@
+"""Process memory accounting and tracemalloc snapshots."""
+
+import gc
+import resource
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # Not Linux: fall back to the peak RSS (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_live_instances(classes: Iterable[type]) -> Dict[str, int]:
+    """Count live instances of the given classes by walking the GC heap (slow, O(heap))."""
+    wanted = {cls: 0 for cls in classes}
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in wanted:
+            wanted[cls] += 1
+    return {cls.__name__: count for cls, count in wanted.items()}
+
+
+class TracemallocSnapshots:
+    """Keeps the last few tracemalloc snapshots so they can be diffed later."""
+
+    def __init__(self, max_snapshots: int = 5):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def take(self) -> int:
+        """Take a snapshot and return its id."""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def get(self, snapshot_id: int) -> Optional[tracemalloc.Snapshot]:
+        with self._lock:
+            return self._snapshots.get(snapshot_id)
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._snapshots)
+
+    @staticmethod
+    def top(snapshot: tracemalloc.Snapshot, limit: int) -> List[dict]:
+        return [
+            {
+                "location": str(stat.traceback),
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+
+    @staticmethod
+    def diff(old: tracemalloc.Snapshot, new: tracemalloc.Snapshot, limit: int) -> List[dict]:
+        return [
+            {
+                "location": str(stat.traceback),
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in new.compare_to(old, "lineno")[:limit]
+        ]
+
+
+# Global snapshot store
+snapshots = TracemallocSnapshots()
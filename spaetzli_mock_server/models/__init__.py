@@ -1,7 +1,8 @@
 """Data models for the mock server."""
 
 from .device import Device
+from .device_table import DeviceTable
 from .backup import BackupMetadata
 from .watcher import Watcher
 
-__all__ = ["Device", "BackupMetadata", "Watcher"]
+__all__ = ["Device", "DeviceTable", "BackupMetadata", "Watcher"]
@@ -4,9 +4,10 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 import hashlib
+import sys
 
 
-@dataclass
+@dataclass(slots=True)
 class BackupMetadata:
     """Metadata for a stored database backup."""
     user: str
@@ -16,6 +17,11 @@ class BackupMetadata:
     data_size: int
     compression: str = "zlib"
     file_path: Optional[str] = None
+    corrupted: bool = False  # set by the scrubber when the stored bytes don't match data_hash
+    
+    def __post_init__(self):
+        self.user = sys.intern(self.user)
+        self.compression = sys.intern(self.compression)
     
     @classmethod
     def create_empty(cls) -> "BackupMetadata":
@@ -28,6 +34,28 @@ class BackupMetadata:
             data_size=0,
         )
     
+    @classmethod
+    def from_dict(cls, data: dict, user: str) -> "BackupMetadata":
+        """Create from a persisted metadata file (to_record() or the older to_dict() format)."""
+        return cls(
+            user=data.get("user", user),
+            upload_ts=data["upload_ts"],
+            last_modify_ts=data["last_modify_ts"],
+            data_hash=data["data_hash"],
+            data_size=data["data_size"],
+            compression=data.get("compression", "zlib"),
+            corrupted=data.get("corrupted", False),
+        )
+    
+    def to_record(self) -> dict:
+        """Convert to the persisted metadata file format."""
+        return {
+            **self.to_dict(),
+            "user": self.user,
+            "compression": self.compression,
+            "corrupted": self.corrupted,
+        }
+    
     def to_dict(self) -> dict:
         """Convert to API response format."""
         return {
@@ -1,20 +1,30 @@
 """Device model for registered premium devices."""
 
+import sys
 import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     """Represents a registered premium device."""
     device_identifier: str
     device_name: str
     platform: str
     user: str = "default"
-    created_at: int = field(default_factory=lambda: int(time.time()))
-    last_seen_at: int = field(default_factory=lambda: int(time.time()))
+    created_at: Optional[int] = None  # defaults to now
+    last_seen_at: Optional[int] = None  # defaults to created_at
+    
+    def __post_init__(self):
+        # Few distinct values shared by many devices: keep one copy of each
+        self.platform = sys.intern(self.platform)
+        self.user = sys.intern(self.user)
+        if self.created_at is None:
+            self.created_at = int(time.time())
+        if self.last_seen_at is None:
+            self.last_seen_at = self.created_at
     
     def to_dict(self) -> dict:
         """Convert to API response format."""
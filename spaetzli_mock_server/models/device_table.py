@@ -0,0 +1,86 @@
+"""Column-oriented store for large numbers of devices."""
+
+from array import array
+from typing import Dict, Iterator, List, MutableMapping
+
+from .device import Device
+
+
+class DeviceTable(MutableMapping[str, Device]):
+    """
+    Devices stored as columns instead of one object each.
+
+    Strings go in lists (platform and user are interned, so repeated values
+    cost one pointer) and timestamps in packed int64 arrays, which saves
+    the per-object header and the boxed ints of every Device.
+
+    Behaves like a dict of device_identifier -> Device, except that reads
+    return a fresh Device: changes must be written back by assigning it
+    again. Deleting moves the last row into the hole, so iteration order
+    is not insertion order once devices were deleted.
+    """
+
+    def __init__(self):
+        self._row: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._names: List[str] = []
+        self._platforms: List[str] = []
+        self._users: List[str] = []
+        self._created_at = array("q")
+        self._last_seen_at = array("q")
+
+    def __getitem__(self, device_id: str) -> Device:
+        row = self._row[device_id]
+        return Device(
+            device_identifier=self._ids[row],
+            device_name=self._names[row],
+            platform=self._platforms[row],
+            user=self._users[row],
+            created_at=self._created_at[row],
+            last_seen_at=self._last_seen_at[row],
+        )
+
+    def __setitem__(self, device_id: str, device: Device) -> None:
+        row = self._row.get(device_id)
+        if row is None:
+            self._row[device_id] = len(self._ids)
+            self._ids.append(device_id)
+            self._names.append(device.device_name)
+            self._platforms.append(device.platform)
+            self._users.append(device.user)
+            self._created_at.append(device.created_at)
+            self._last_seen_at.append(device.last_seen_at)
+            return
+        self._names[row] = device.device_name
+        self._platforms[row] = device.platform
+        self._users[row] = device.user
+        self._created_at[row] = device.created_at
+        self._last_seen_at[row] = device.last_seen_at
+
+    def __delitem__(self, device_id: str) -> None:
+        row = self._row.pop(device_id)
+        last = len(self._ids) - 1
+        columns = self._columns()
+        if row != last:
+            for column in columns:
+                column[row] = column[last]
+            self._row[self._ids[row]] = row
+        for column in columns:
+            column.pop()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._ids))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self._row
+
+    def clear(self) -> None:
+        self._row.clear()
+        for column in self._columns():
+            del column[:]
+
+    def _columns(self) -> tuple:
+        return (self._ids, self._names, self._platforms, self._users, self._created_at, self._last_seen_at)
@@ -1,17 +1,21 @@
 """Watcher model for price alerts."""
 
+import sys
 from dataclasses import dataclass, field
 from typing import Any, Dict
 from uuid import uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class Watcher:
     """Represents a premium watcher/alert."""
     identifier: str = field(default_factory=lambda: str(uuid4()))
     watcher_type: str = ""  # e.g., "makervault_collateralization_ratio"
     args: Dict[str, Any] = field(default_factory=dict)
     
+    def __post_init__(self):
+        self.watcher_type = sys.intern(self.watcher_type)
+    
     def to_dict(self) -> dict:
         """Convert to API response format."""
         return {
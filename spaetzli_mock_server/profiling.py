@@ -0,0 +1,117 @@
+"""On-demand profiling of the running server."""
+
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stacks of all threads from a background thread.
+
+    Nothing is hooked into the interpreter, so the profiled code runs at full
+    speed; the cost is one sys._current_frames() walk per interval.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl, speedscope, etc."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+def pstats_dump(profile: cProfile.Profile) -> bytes:
+    """Serialize a profile like Profile.dump_stats(), without a temp file."""
+    profile.create_stats()
+    buffer = io.BytesIO()
+    marshal.dump(profile.stats, buffer)
+    return buffer.getvalue()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling window is requested while another one runs."""
+
+
+class Profiler:
+    """Runs one profiling window at a time; costs nothing between windows."""
+
+    def __init__(self):
+        self.active = False
+
+    def _acquire(self) -> None:
+        # Only called from the event loop thread, no lock needed
+        if self.active:
+            raise ProfilerBusy()
+        self.active = True
+
+    async def sample(self, seconds: float, interval: float) -> str:
+        """Sample all thread stacks for `seconds`, return collapsed stacks."""
+        self._acquire()
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            self.active = False
+        return sampler.collapsed()
+
+    async def cprofile(self, seconds: float) -> bytes:
+        """Deterministically profile the event loop thread for `seconds`, return pstats data."""
+        self._acquire()
+        # cProfile hooks the thread it is enabled in, which here is the event
+        # loop thread running every async handler
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            self.active = False
+        return pstats_dump(profile)
+
+
+# Global profiler instance
+profiler = Profiler()
@@ -0,0 +1,305 @@
+"""Asynchronous replication of stored backups to secondary targets."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .models import BackupMetadata
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PATH = "/replication/1/backups"
+
+Batch = List[Tuple[BackupMetadata, bytes]]
+
+
+def read_backup(storage: Storage, metadata: BackupMetadata) -> Optional[bytes]:
+    """
+    A backup's bytes from disk, None if they're gone or don't match the metadata.
+
+    Reads bypass the backup cache, so copying backups elsewhere doesn't evict
+    hot ones or skew the cache statistics.
+    """
+    try:
+        data = storage.backup_path(metadata.user).read_bytes()
+    except FileNotFoundError:
+        return None
+    if hashlib.sha256(data).hexdigest() != metadata.data_hash:
+        logger.error("Not copying backup of %s, local copy fails its hash", metadata.user)
+        return None
+    return data
+
+
+class ReplicationTarget:
+    """Somewhere backups are copied to."""
+
+    name: str
+
+    def replicate(self, batch: Batch) -> List[str]:
+        """Copy a batch of backups. Returns the users whose copy failed."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryTarget(ReplicationTarget):
+    """A local directory or mount, laid out like backups_dir."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = str(self.path)
+
+    def replicate(self, batch: Batch) -> List[str]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        failed = []
+        for metadata, data in batch:
+            target = self.path / f"{metadata.user}_backup.bin"
+            tmp = target.with_name(target.name + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # Read back what landed on the target before making it visible
+            if hashlib.sha256(tmp.read_bytes()).hexdigest() != metadata.data_hash:
+                logger.error("Replica of %s in %s failed hash verification", metadata.user, self.path)
+                tmp.unlink()
+                failed.append(metadata.user)
+                continue
+            tmp.replace(target)
+            (self.path / f"{metadata.user}_metadata.json").write_text(json.dumps(metadata.to_record()))
+        return failed
+
+
+class PeerTarget(ReplicationTarget):
+    """Another spaetzli node, receiving batches on its replication endpoint."""
+
+    def __init__(self, url: str, token: Optional[str]):
+        # Imported lazily, httpx is only needed for peer targets
+        import httpx
+
+        self.url = url.rstrip("/")
+        self.name = self.url
+        self._client = httpx.Client(
+            timeout=60,
+            headers={"X-Replication-Token": token or ""},
+        )
+
+    def replicate(self, batch: Batch) -> List[str]:
+        manifest = [
+            {
+                "user": metadata.user,
+                "data_hash": metadata.data_hash,
+                "last_modify_ts": metadata.last_modify_ts,
+                "compression": metadata.compression,
+            }
+            for metadata, _ in batch
+        ]
+        files = [(f"backup_{i}", (metadata.user, data)) for i, (metadata, data) in enumerate(batch)]
+        response = self._client.post(
+            self.url + REPLICA_PATH,
+            data={"manifest": json.dumps(manifest)},
+            files=files,
+        )
+        response.raise_for_status()
+        return response.json()["rejected"]
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def make_target(spec: str, token: Optional[str]) -> ReplicationTarget:
+    """A target from its config entry: an http(s) URL for a peer, a path otherwise."""
+    if spec.startswith(("http://", "https://")):
+        return PeerTarget(spec, token)
+    return DirectoryTarget(Path(spec))
+
+
+class TargetWorker:
+    """
+    Replicates to one target from its own thread, so a slow or unreachable
+    target never holds up the others.
+
+    Pending backups are keyed by user: a backup stored again before it was
+    replicated replaces the queued one, and only the latest is copied.
+    """
+
+    def __init__(
+        self,
+        target: ReplicationTarget,
+        storage: Storage,
+        batch_window: float = 0.2,
+        batch_bytes: int = 64 * 1024 * 1024,
+        max_backoff: float = 30.0,
+    ):
+        self.target = target
+        self.storage = storage
+        self.batch_window = batch_window
+        self.batch_bytes = batch_bytes
+        self.max_backoff = max_backoff
+        # user -> (metadata, monotonic time first queued)
+        self._pending: Dict[str, Tuple[BackupMetadata, float]] = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.replicated = 0
+        self.replicated_bytes = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_success: Optional[float] = None  # unix timestamp
+
+    def enqueue(self, metadata: BackupMetadata) -> None:
+        with self._cond:
+            queued = self._pending.get(metadata.user)
+            # Lag counts from the oldest unreplicated version
+            since = queued[1] if queued else time.monotonic()
+            self._pending[metadata.user] = (metadata, since)
+            self._cond.notify()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name=f"replicate-{self.target.name}", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self.target.close()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait until nothing is pending or in flight. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _take_batch(self) -> List[Tuple[BackupMetadata, float]]:
+        with self._cond:
+            while not self._pending and not self._stop:
+                self._cond.wait()
+            if self._stop:
+                return []
+        # Let uploads arriving together go out together
+        time.sleep(self.batch_window)
+        with self._cond:
+            batch, size = [], 0
+            for user in list(self._pending):
+                metadata, since = self._pending[user]
+                if batch and size + metadata.data_size > self.batch_bytes:
+                    break
+                del self._pending[user]
+                batch.append((metadata, since))
+                size += metadata.data_size
+            self._in_flight = len(batch)
+        return batch
+
+    def _load(self, queued: List[Tuple[BackupMetadata, float]]) -> Batch:
+        batch = []
+        for metadata, _ in queued:
+            if self.storage.get_backup_metadata(metadata.user) is not metadata:
+                continue  # replaced meanwhile, the newer backup is queued instead
+            data = read_backup(self.storage, metadata)
+            if data is not None:
+                batch.append((metadata, data))
+        return batch
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while True:
+            queued = self._take_batch()
+            if not queued:
+                return
+            batch = self._load(queued)
+            try:
+                failed = set(self.target.replicate(batch)) if batch else set()
+            except Exception as e:
+                logger.warning("Replication to %s failed: %s", self.target.name, e)
+                failed = {metadata.user for metadata, _ in batch}
+
+            with self._cond:
+                self.batches += 1
+                for metadata, data in batch:
+                    if metadata.user in failed:
+                        continue
+                    self.replicated += 1
+                    self.replicated_bytes += len(data)
+                if len(failed) < len(batch):
+                    self.last_success = time.time()
+                self.failures += len(failed)
+                # Requeue failures, unless a newer backup of that user is already queued
+                for metadata, since in queued:
+                    if metadata.user in failed:
+                        self._pending.setdefault(metadata.user, (metadata, since))
+                self._in_flight = 0
+                self._cond.notify_all()
+
+            if failed:
+                backoff = min(max(backoff * 2, 0.5), self.max_backoff)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stop, timeout=backoff)
+            else:
+                backoff = 0.0
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            oldest = min((since for _, since in self._pending.values()), default=None)
+            return {
+                "target": self.target.name,
+                "pending": len(self._pending),
+                "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "replicated": self.replicated,
+                "replicated_bytes": self.replicated_bytes,
+                "batches": self.batches,
+                "failures": self.failures,
+                "last_success": self.last_success,
+            }
+
+
+class Replicator:
+    """Hooks into Storage and fans stored backups out to every target."""
+
+    def __init__(self, storage: Storage, targets: List[ReplicationTarget], **worker_options):
+        self.storage = storage
+        self.workers = [TargetWorker(target, storage, **worker_options) for target in targets]
+
+    def _on_backup_stored(self, metadata: BackupMetadata) -> None:
+        # Runs on the upload path: only queues, never copies
+        for worker in self.workers:
+            worker.enqueue(metadata)
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        self.storage.add_backup_listener(self._on_backup_stored)
+
+    def stop(self) -> None:
+        self.storage.remove_backup_listener(self._on_backup_stored)
+        for worker in self.workers:
+            worker.stop()
+
+    def wait_idle(self, timeout: float) -> bool:
+        return all(worker.wait_idle(timeout) for worker in self.workers)
+
+    def stats(self) -> dict:
+        targets = [worker.stats() for worker in self.workers]
+        return {
+            "lag_seconds": max((t["lag_seconds"] for t in targets), default=0.0),
+            "targets": targets,
+        }
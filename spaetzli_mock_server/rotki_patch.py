@@ -13,7 +13,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Configuration via environment variables
+# Configuration via environment variables. Besides http:// URLs, a server
+# listening on a Unix socket can be reached with http+unix://%2Fpath%2Fto.sock
 MOCK_SERVER_URL = os.environ.get("SPAETZLI_MOCK_URL", "http://localhost:8080")
 ENABLE_MOCK = os.environ.get("SPAETZLI_ENABLE", "0") == "1"
 
@@ -35,6 +36,9 @@ def patch_premium_urls():
         
         def patched_init(self, *args, **kwargs):
             original_init(self, *args, **kwargs)
+            if MOCK_SERVER_URL.startswith("http+unix://"):
+                from .unix_http import mount_unix_adapter
+                mount_unix_adapter(self.session)
             # Override URLs after original init
             self.rotki_api = f'{MOCK_SERVER_URL}/api/{self.apiversion}/'
             self.rotki_nest = f'{MOCK_SERVER_URL}/nest/{self.apiversion}/'
@@ -1,6 +1,8 @@
 """Route modules for the mock server."""
 
 from .api import router as api_router
+from .debug import router as debug_router
 from .nest import router as nest_router
+from .replication import router as replication_router
 
-__all__ = ["api_router", "nest_router"]
+__all__ = ["api_router", "debug_router", "nest_router", "replication_router"]
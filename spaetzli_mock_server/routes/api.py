@@ -3,17 +3,21 @@
 import logging
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
 
 from ..auth import require_auth
-from ..config import config
-from ..storage import storage
+from ..cache import ResponseCache
+from ..deps import ConfigDep, ResponseCacheDep, StorageDep
+from ..storage import Storage
 from ..models import Watcher
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/1")
 
+WATCHERS_PAGE_SIZE = 100
+WATCHERS_MAX_PAGE_SIZE = 1000
+
 
 def check_auth(api_key: Optional[str]) -> None:
     """Verify authentication or raise 401."""
@@ -21,9 +25,20 @@ def check_auth(api_key: Optional[str]) -> None:
         raise HTTPException(status_code=401, detail="API KEY signature mismatch")
 
 
+def all_watchers_response(storage: Storage, cache: ResponseCache) -> Response:
+    """All watchers, served from the response cache while they are unchanged."""
+    def build():
+        watchers, generation = storage.get_watchers_versioned()
+        return JSONResponse({"watchers": [w.to_dict() for w in watchers]}).body, generation
+    
+    body = cache.get_or_build(("watchers", "default"), storage.get_generation("watchers"), build)
+    return Response(content=body, media_type="application/json")
+
+
 @router.get("/last_data_metadata")
 async def get_last_data_metadata(
     request: Request,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """
@@ -52,6 +67,7 @@ async def get_last_data_metadata(
 @router.get("/statistics_rendererv2")
 async def get_statistics_renderer(
     request: Request,
+    config: ConfigDep,
     version: Optional[int] = None,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
@@ -112,18 +128,40 @@ async def get_statistics_renderer(
 @router.get("/watchers")
 async def get_watchers(
     request: Request,
+    storage: StorageDep,
+    cache: ResponseCacheDep,
+    watcher_type: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=WATCHERS_MAX_PAGE_SIZE),
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
-    """Get all watchers."""
+    """
+    Get watchers.
+    
+    Without query parameters all watchers are returned, as Rotki expects.
+    With watcher_type, cursor or limit a single page is returned together
+    with next_cursor, which is null on the last page.
+    """
     check_auth(api_key)
     
-    watchers = storage.get_watchers()
-    return {"watchers": [w.to_dict() for w in watchers]}
+    if watcher_type is None and cursor is None and limit is None:
+        return all_watchers_response(storage, cache)
+    
+    watchers, next_cursor = storage.list_watchers(
+        watcher_type=watcher_type,
+        cursor=cursor,
+        limit=limit or WATCHERS_PAGE_SIZE,
+    )
+    return {
+        "watchers": [w.to_dict() for w in watchers],
+        "next_cursor": next_cursor,
+    }
 
 
 @router.put("/watchers")
 async def add_watchers(
     request: Request,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Add new watchers."""
@@ -132,21 +170,21 @@ async def add_watchers(
     body = await request.json()
     watchers_data = body.get("watchers", [])
     
-    created = []
-    for w_data in watchers_data:
-        watcher = Watcher(
+    created = storage.add_watchers([
+        Watcher(
             watcher_type=w_data.get("type", ""),
             args=w_data.get("args", {}),
         )
-        storage.add_watcher(watcher)
-        created.append(watcher.to_dict())
+        for w_data in watchers_data
+    ])
     
-    return {"watchers": created}
+    return {"watchers": [w.to_dict() for w in created]}
 
 
 @router.patch("/watchers")
 async def edit_watchers(
     request: Request,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Edit existing watchers."""
@@ -155,34 +193,45 @@ async def edit_watchers(
     body = await request.json()
     watchers_data = body.get("watchers", [])
     
-    updated = []
-    for w_data in watchers_data:
-        identifier = w_data.get("identifier")
-        if identifier:
-            watcher = storage.update_watcher(identifier, w_data.get("args", {}))
-            if watcher:
-                updated.append(watcher.to_dict())
+    identifiers = [w_data.get("identifier") for w_data in watchers_data if w_data.get("identifier")]
+    if len(set(identifiers)) != len(identifiers):
+        # Which edit should win is ambiguous, so don't pick one
+        raise HTTPException(status_code=400, detail="Duplicate watcher identifiers")
+    updates = {
+        w_data["identifier"]: w_data.get("args", {})
+        for w_data in watchers_data
+        if w_data.get("identifier")
+    }
+    updated = storage.update_watchers(updates)
     
-    return {"watchers": updated}
+    return {"watchers": [w.to_dict() for w in updated]}
 
 
 @router.delete("/watchers")
 async def delete_watchers(
     request: Request,
+    storage: StorageDep,
+    cache: ResponseCacheDep,
+    affected_only: bool = False,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
-    """Delete watchers by identifier."""
+    """
+    Delete watchers by identifier.
+    
+    By default the remaining watchers are returned, as Rotki expects.
+    With ?affected_only=true only the deleted identifiers are returned.
+    """
     check_auth(api_key)
     
     body = await request.json()
     watcher_ids = body.get("watchers", [])
     
-    for watcher_id in watcher_ids:
-        storage.delete_watcher(watcher_id)
+    deleted = storage.delete_watchers(watcher_ids)
+    if affected_only:
+        return {"deleted": deleted}
     
     # Return remaining watchers
-    watchers = storage.get_watchers()
-    return {"watchers": [w.to_dict() for w in watchers]}
+    return all_watchers_response(storage, cache)
 
 
 # ========== Usage Analytics (Optional) ==========
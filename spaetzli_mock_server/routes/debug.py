@@ -0,0 +1,159 @@
+"""Operational debug routes (/debug/), disabled unless a debug token is configured."""
+
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response
+
+from ..deps import AdmissionDep, ConfigDep, ResponseCacheDep, StorageDep
+from ..memory import count_live_instances, rss_bytes, snapshots
+from ..models import BackupMetadata, Device, Watcher
+from ..profiling import ProfilerBusy, profiler
+
+logger = logging.getLogger(__name__)
+
+
+def check_debug_token(
+    config: ConfigDep,
+    debug_token: Optional[str] = Header(None, alias="X-Debug-Token"),
+) -> None:
+    """Require the configured debug token, and hide the routes if there is none."""
+    if not config.debug_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not debug_token or not hmac.compare_digest(debug_token, config.debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(check_debug_token)])
+
+
+@router.get("/admission")
+async def get_admission(admission: AdmissionDep):
+    """Current upload admission control state."""
+    return admission.stats()
+
+
+@router.get("/uploads")
+async def get_uploads(storage: StorageDep):
+    """Pending chunked uploads and uploads skipped as unchanged."""
+    sessions, pending_bytes = storage.get_pending_upload_stats()
+    return {
+        "pending_sessions": sessions,
+        "pending_bytes": pending_bytes,
+        **storage.get_deduplication_stats(),
+    }
+
+
+@router.get("/scrub")
+async def get_scrub(request: Request):
+    """Progress and results of backup integrity scrubbing."""
+    return request.app.state.backup_scrubber.stats()
+
+
+@router.post("/scrub")
+async def start_scrub(request: Request):
+    """Start a scrub pass now."""
+    scrubber = request.app.state.backup_scrubber
+    scrubber.trigger()
+    return scrubber.stats()
+
+
+@router.get("/replication")
+async def get_replication(request: Request):
+    """Per-target replication lag, throughput and failures."""
+    replicator = request.app.state.replicator
+    if replicator is None:
+        raise HTTPException(status_code=404, detail="Replication is not enabled")
+    return replicator.stats()
+
+
+# Plain def: FastAPI runs these in its threadpool, walking the GC heap or
+# taking/comparing snapshots can take seconds on a big heap
+@router.get("/watchers/events")
+async def get_watcher_events(request: Request, limit: int = Query(100, ge=1, le=10_000)):
+    """Watchers that recently started triggering, oldest first."""
+    evaluator = request.app.state.watcher_evaluator
+    if evaluator is None:
+        raise HTTPException(status_code=404, detail="Watcher evaluation is not enabled")
+    engine = evaluator.engine
+    return {
+        "watchers": len(engine),
+        "ticks_evaluated": engine.ticks_evaluated,
+        "events": [event.to_dict() for event in engine.recent_events(limit)],
+    }
+
+
+@router.get("/memory")
+def get_memory(
+    storage: StorageDep,
+    cache: ResponseCacheDep,
+    live_objects: bool = Query(False, description="Also count live instances on the GC heap (slow)"),
+):
+    """Memory held by storage, pending uploads and the process."""
+    stats = storage.get_memory_stats()
+    stats["response_cache"] = cache.stats()
+    stats["rss_bytes"] = rss_bytes()
+    if live_objects:
+        stats["live_objects"] = count_live_instances((Device, Watcher, BackupMetadata))
+    stats["tracemalloc"] = {"tracing": snapshots.tracing, "snapshots": snapshots.ids()}
+    return stats
+
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    """Start tracing allocations. Tracing slows the server down, stop it when done."""
+    snapshots.start(frames)
+    return {"tracing": True}
+
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc():
+    """Stop tracing allocations and drop stored snapshots."""
+    snapshots.stop()
+    return {"tracing": False}
+
+
+@router.post("/memory/snapshots")
+def take_snapshot(top: int = Query(20, ge=1, le=500)):
+    """Take a tracemalloc snapshot and return its top allocation sites."""
+    if not snapshots.tracing:
+        raise HTTPException(status_code=409, detail="tracemalloc is not running")
+    snapshot_id = snapshots.take()
+    return {"id": snapshot_id, "top": snapshots.top(snapshots.get(snapshot_id), top)}
+
+
+@router.get("/memory/snapshots/{snapshot_id}/diff/{other_id}")
+def diff_snapshots(snapshot_id: int, other_id: int, top: int = Query(20, ge=1, le=500)):
+    """Allocation growth from one stored snapshot to another."""
+    old, new = snapshots.get(snapshot_id), snapshots.get(other_id)
+    if old is None or new is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"from": snapshot_id, "to": other_id, "top": snapshots.diff(old, new, top)}
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=300),
+    mode: str = Query("sample", pattern="^(sample|cprofile)$"),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+):
+    """
+    Profile the running server for a window of `seconds`.
+
+    `sample` returns collapsed stacks of all threads (flamegraph.pl, speedscope);
+    `cprofile` returns a pstats file for the event loop thread (snakeviz, pstats).
+    """
+    try:
+        if mode == "sample":
+            stacks = await profiler.sample(seconds, interval_ms / 1000)
+            return PlainTextResponse(stacks)
+        data = await profiler.cprofile(seconds)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return Response(
+        content=data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="spaetzli.pstats"'},
+    )
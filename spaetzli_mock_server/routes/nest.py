@@ -9,8 +9,7 @@ from fastapi import APIRouter, Header, HTTPException, Request, Response, UploadF
 from fastapi.responses import JSONResponse
 
 from ..auth import require_auth
-from ..config import config
-from ..storage import storage
+from ..deps import ActivityDep, ConfigDep, ResponseCacheDep, StorageDep
 from ..models import Device, BackupMetadata
 
 logger = logging.getLogger(__name__)
@@ -28,6 +27,7 @@ def check_auth(api_key: Optional[str]) -> None:
 @router.get("/limits")
 async def get_limits(
     request: Request,
+    config: ConfigDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Get user limits and capabilities."""
@@ -51,21 +51,37 @@ async def get_limits(
 @router.get("/devices")
 async def get_devices(
     request: Request,
+    config: ConfigDep,
+    storage: StorageDep,
+    activity: ActivityDep,
+    cache: ResponseCacheDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Get list of registered devices."""
     check_auth(api_key)
     
-    devices = storage.get_devices()
-    return {
-        "devices": [d.to_dict() for d in devices],
-        "limit": config.limits.limit_of_devices,
-    }
+    # Make buffered activity visible before reporting lastSeenAt. Only then:
+    # flushing takes the storage lock, and a flush that changes a timestamp
+    # invalidates the cached response
+    if activity.pending:
+        activity.flush()
+    limit = config.limits.limit_of_devices
+    
+    def build():
+        devices, generation = storage.get_devices_versioned()
+        content = {"devices": [d.to_dict() for d in devices], "limit": limit}
+        return JSONResponse(content).body, generation
+    
+    # The limit is part of the key as it can be changed at runtime
+    body = cache.get_or_build(("devices", "default", limit), storage.get_generation("devices"), build)
+    return Response(content=body, media_type="application/json")
 
 
 @router.post("/devices/check")
 async def check_device(
     request: Request,
+    storage: StorageDep,
+    activity: ActivityDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Check if a device is registered."""
@@ -75,6 +91,7 @@ async def check_device(
     device_id = body.get("device_identifier", "")
     
     if storage.device_exists(device_id):
+        activity.touch(device_id)
         return Response(status_code=200)
     else:
         raise HTTPException(status_code=404, detail="Device not found")
@@ -83,6 +100,8 @@ async def check_device(
 @router.put("/devices")
 async def register_device(
     request: Request,
+    config: ConfigDep,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Register a new device."""
@@ -116,6 +135,8 @@ async def register_device(
 @router.patch("/devices")
 async def edit_device(
     request: Request,
+    storage: StorageDep,
+    activity: ActivityDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Edit a device's name."""
@@ -129,6 +150,7 @@ async def edit_device(
         raise HTTPException(status_code=400, detail="device_name required")
     
     if storage.update_device(device_id, device_name):
+        activity.touch(device_id)
         return Response(status_code=200)
     else:
         raise HTTPException(status_code=404, detail="Device not found")
@@ -137,6 +159,7 @@ async def edit_device(
 @router.delete("/devices")
 async def delete_device(
     request: Request,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Delete a registered device."""
@@ -156,6 +179,7 @@ async def delete_device(
 @router.get("/backup")
 async def get_backup(
     request: Request,
+    storage: StorageDep,
     api_key: Optional[str] = Header(None, alias="API-KEY"),
 ):
     """Download the stored database backup."""
@@ -176,6 +200,7 @@ async def get_backup(
 @router.post("/backup/range")
 async def upload_backup_chunk(
     request: Request,
+    storage: StorageDep,
     chunk_data: UploadFile = File(...),
     file_hash: str = Form(...),
     last_modify_ts: int = Form(...),
@@ -194,11 +219,23 @@ async def upload_backup_chunk(
     check_auth(api_key)
     
     user = "default"
+    is_first_chunk = upload_id is None
+    
+    # A device re-syncing an unchanged DB: answer its first chunk (already
+    # received and parsed by now) with the stored backup's metadata; 200 ends
+    # the upload, so the remaining chunks are never sent
+    if is_first_chunk:
+        metadata = storage.deduplicate_upload(
+            user, file_hash, last_modify_ts, total_size, chunk_data.size or 0
+        )
+        if metadata:
+            return JSONResponse(status_code=200, content=metadata.to_dict())
+    
     chunk_bytes = await chunk_data.read()
     
     # Parse content range
-    is_first_chunk = upload_id is None
     is_complete = True
+    start = 0
     
     if content_range:
         # Parse "bytes 0-999/1000" format
@@ -211,6 +248,10 @@ async def upload_backup_chunk(
         except:
             pass
     
+    if is_first_chunk and start > 0:
+        # Admitted as a continuation, it must not open a new session
+        raise HTTPException(status_code=400, detail="upload_id required to continue an upload")
+    
     if is_first_chunk and not is_complete:
         # Start chunked upload
         new_upload_id = str(uuid4())
@@ -0,0 +1,83 @@
+"""Replication routes (/replication/1/), receiving backup replicas from peer nodes."""
+
+import hashlib
+import hmac
+import json
+import logging
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Request
+from starlette.datastructures import UploadFile
+
+from ..deps import ConfigDep, StorageDep
+
+logger = logging.getLogger(__name__)
+
+# User names end up in backup file names, so no path separators or leading dots
+USER_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,127}")
+
+
+def _valid_entry(entry) -> bool:
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get("user"), str)
+        and USER_PATTERN.fullmatch(entry["user"]) is not None
+        and isinstance(entry.get("data_hash"), str)
+        and isinstance(entry.get("last_modify_ts"), int)
+        and isinstance(entry.get("compression", "zlib"), str)
+    )
+
+
+def check_replication_token(
+    config: ConfigDep,
+    replication_token: Optional[str] = Header(None, alias="X-Replication-Token"),
+) -> None:
+    """Require the configured replication token, and hide the routes if there is none."""
+    if not config.replication_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not replication_token or not hmac.compare_digest(replication_token, config.replication_token):
+        raise HTTPException(status_code=403, detail="Invalid replication token")
+
+
+router = APIRouter(prefix="/replication/1", dependencies=[Depends(check_replication_token)])
+
+
+@router.post("/backups")
+async def receive_backups(request: Request, storage: StorageDep, manifest: str = Form(...)):
+    """
+    Store a batch of replicated backups.
+
+    `manifest` is a JSON list of {user, data_hash, last_modify_ts, compression},
+    the i-th entry's data is in the file field `backup_{i}`. Entries whose data
+    is missing or doesn't match data_hash are rejected and left for the sender
+    to retry. Entries not newer than the stored backup are skipped, so a delayed
+    or retried replica never replaces a newer one.
+    """
+    try:
+        entries = json.loads(manifest)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid manifest")
+    if not isinstance(entries, list) or not all(_valid_entry(entry) for entry in entries):
+        raise HTTPException(status_code=400, detail="Invalid manifest entry")
+
+    form = await request.form()
+    stored, rejected, skipped = [], [], []
+    for i, entry in enumerate(entries):
+        upload = form.get(f"backup_{i}")
+        data = await upload.read() if isinstance(upload, UploadFile) else None
+        if data is None or hashlib.sha256(data).hexdigest() != entry["data_hash"]:
+            logger.warning("Rejected replica of %s: missing data or hash mismatch", entry["user"])
+            rejected.append(entry["user"])
+            continue
+        # Replicas are not replicated again, so two nodes can replicate to each other
+        metadata = storage.store_backup(
+            entry["user"],
+            data,
+            entry["last_modify_ts"],
+            entry.get("compression", "zlib"),
+            notify=False,
+            if_newer=True,
+        )
+        (stored if metadata else skipped).append(entry["user"])
+    return {"stored": stored, "rejected": rejected, "skipped": skipped}
@@ -0,0 +1,185 @@
+"""Background integrity scrubbing of stored backups."""
+
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .models import BackupMetadata
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 1024 * 1024
+
+
+class RateLimiter:
+    """Paces reads to `rate` bytes per second, shared by all callers."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, nbytes: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + nbytes / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class BackupScrubber:
+    """
+    Periodically re-hashes stored backup files against their metadata.
+
+    A pass hashes every backup in a small worker pool, with disk reads paced
+    by a shared rate limit so serving isn't starved of IO. Mismatching files
+    are handed to Storage.quarantine_backup().
+    """
+
+    def __init__(self, storage: Storage, interval: float, workers: int = 2, rate_mb: float = 32.0):
+        self.storage = storage
+        self.interval = interval
+        self.workers = workers
+        self.rate_mb = rate_mb
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+
+        self.running = False
+        self.passes = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.pass_started: Optional[float] = None
+        self.last_pass_seconds: Optional[float] = None
+        self.last_pass_finished: Optional[float] = None  # unix timestamp
+        self.mismatches = 0
+        self.repaired = 0
+        self.quarantined = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="backup-scrubber", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._trigger.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def trigger(self) -> None:
+        """Start a pass now instead of waiting for the schedule."""
+        self._trigger.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # An interval of 0 means passes only run when triggered
+            self._trigger.wait(self.interval or None)
+            self._trigger.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.scrub()
+            except Exception:
+                logger.exception("Backup scrub pass failed")
+
+    def scrub(self) -> None:
+        """Run one full pass over all stored backups."""
+        # Quarantined backups have no file left to check
+        backups = [m for m in self.storage.list_backup_metadata() if not m.corrupted]
+        limiter = RateLimiter(self.rate_mb * 1024 * 1024)
+        with self._stats_lock:
+            self.running = True
+            self.files_total = len(backups)
+            self.files_done = 0
+            self.bytes_total = sum(metadata.data_size for metadata in backups)
+            self.bytes_done = 0
+            self.pass_started = time.monotonic()
+
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="scrub") as pool:
+                for _ in pool.map(lambda metadata: self._check(metadata, limiter), backups):
+                    pass
+        finally:
+            with self._stats_lock:
+                self.running = False
+                self.passes += 1
+                self.last_pass_seconds = time.monotonic() - self.pass_started
+                self.last_pass_finished = time.time()
+        logger.info(
+            "Backup scrub pass done: %d files, %d bytes in %.1fs",
+            self.files_done, self.bytes_done, self.last_pass_seconds,
+        )
+
+    def _check(self, metadata: BackupMetadata, limiter: RateLimiter) -> None:
+        if self._stop.is_set():
+            return
+        digest = hashlib.sha256()
+        try:
+            with open(self.storage.backup_path(metadata.user), "rb") as f:
+                while not self._stop.is_set():
+                    limiter.acquire(READ_CHUNK)
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    with self._stats_lock:
+                        self.bytes_done += len(chunk)
+        except OSError as e:
+            # Includes a file replaced or removed mid-pass; re-checked next pass
+            logger.warning("Backup scrub could not read backup of %s: %s", metadata.user, e)
+            with self._stats_lock:
+                self.errors += 1
+            return
+        if self._stop.is_set():
+            return
+
+        if digest.hexdigest() != metadata.data_hash:
+            outcome = self.storage.quarantine_backup(metadata)
+            if outcome != "stale":
+                logger.error("Backup of %s failed its integrity check, %s", metadata.user, outcome)
+                with self._stats_lock:
+                    self.mismatches += 1
+                    if outcome == "repaired":
+                        self.repaired += 1
+                    else:
+                        self.quarantined += 1
+        with self._stats_lock:
+            self.files_done += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            if self.running:
+                elapsed = time.monotonic() - self.pass_started
+            else:
+                elapsed = self.last_pass_seconds
+            return {
+                "running": self.running,
+                "passes": self.passes,
+                "files_done": self.files_done,
+                "files_total": self.files_total,
+                "bytes_done": self.bytes_done,
+                "bytes_total": self.bytes_total,
+                "throughput_bytes_per_sec": round(self.bytes_done / elapsed) if elapsed else None,
+                "last_pass_seconds": self.last_pass_seconds,
+                "last_pass_finished": self.last_pass_finished,
+                "mismatches": self.mismatches,
+                "repaired": self.repaired,
+                "quarantined": self.quarantined,
+                "errors": self.errors,
+                "interval": self.interval,
+                "workers": self.workers,
+                "rate_mb": self.rate_mb,
+            }
+
@@ -2,25 +2,134 @@
 
 import hashlib
 import json
+import os
 import time
+import uuid
+from dataclasses import asdict
 from pathlib import Path
-from typing import Dict, List, Optional
+from bisect import bisect_right
+from itertools import islice
+from typing import Callable, Dict, List, MutableMapping, Optional, Tuple
 from threading import Lock
 
-from .models import Device, BackupMetadata, Watcher
-from .config import config
+from .cache import BackupCache
+from .models import Device, DeviceTable, BackupMetadata, Watcher
+from .config import ServerConfig
+
+STATE_FILE = "state.json"  # devices and watchers, saved on shutdown
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Write a file so readers see either the old or the new content, never a mix."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class WatcherIndex:
+    """
+    Insertion-ordered index of watchers, overall and per watcher type.
+    
+    Every watcher gets a monotonically increasing sequence number, so the
+    sorted sequence lists double as stable pagination cursors. Removing a
+    watcher only drops its seq from `_identifier_of`, leaving a tombstone in
+    the lists; a list is compacted in one pass once more than half of it is
+    tombstones, so removals cost amortized O(1) however many are batched.
+    """
+    
+    def __init__(self):
+        self._next_seq = 0
+        self._seq_of: Dict[str, int] = {}  # identifier -> seq
+        self._identifier_of: Dict[int, str] = {}  # seq -> identifier, live watchers only
+        # Sorted seqs of all watchers (key None) and per watcher type
+        self._seqs: Dict[Optional[str], List[int]] = {None: []}
+        self._dead: Dict[Optional[str], int] = {None: 0}  # tombstones per list
+    
+    def add(self, watcher: Watcher) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._seq_of[watcher.identifier] = seq
+        self._identifier_of[seq] = watcher.identifier
+        for key in (None, watcher.watcher_type):
+            self._seqs.setdefault(key, []).append(seq)
+            self._dead.setdefault(key, 0)
+    
+    def remove(self, watcher: Watcher) -> None:
+        seq = self._seq_of.pop(watcher.identifier)
+        del self._identifier_of[seq]
+        for key in (None, watcher.watcher_type):
+            self._dead[key] += 1
+            if self._dead[key] * 2 > len(self._seqs[key]):
+                self._compact(key)
+    
+    def page(
+        self,
+        watcher_type: Optional[str],
+        cursor: Optional[int],
+        limit: int,
+    ) -> Tuple[List[str], Optional[int]]:
+        """Return up to `limit` identifiers after `cursor`, and the next cursor."""
+        seqs = self._seqs.get(watcher_type, [])
+        pos = 0 if cursor is None else bisect_right(seqs, cursor)
+        identifiers: List[str] = []
+        last = None
+        while pos < len(seqs) and len(identifiers) < limit:
+            identifier = self._identifier_of.get(seqs[pos])
+            if identifier is not None:
+                identifiers.append(identifier)
+                last = seqs[pos]
+            pos += 1
+        more = any(seq in self._identifier_of for seq in islice(seqs, pos, None))
+        return identifiers, last if identifiers and more else None
+    
+    def clear(self) -> None:
+        self._seq_of.clear()
+        self._identifier_of.clear()
+        self._seqs = {None: []}
+        self._dead = {None: 0}
+    
+    def _compact(self, key: Optional[str]) -> None:
+        live = [seq for seq in self._seqs[key] if seq in self._identifier_of]
+        if live or key is None:
+            self._seqs[key] = live
+            self._dead[key] = 0
+        else:
+            del self._seqs[key], self._dead[key]
 
 
 class Storage:
     """Thread-safe in-memory storage with optional file persistence."""
     
-    def __init__(self):
+    def __init__(self, config: ServerConfig):
+        self.config = config
         self._lock = Lock()
-        self._devices: Dict[str, Device] = {}
+        # A dict, or a column store when holding very many devices
+        self._devices: MutableMapping[str, Device] = DeviceTable() if config.compact_devices else {}
         self._backups: Dict[str, BackupMetadata] = {}
         self._watchers: Dict[str, Watcher] = {}
-        self._backup_data: Dict[str, bytes] = {}  # user -> encrypted data
+        self._watcher_index = WatcherIndex()
+        # user -> encrypted data, hot entries only (full copy lives on disk)
+        self._backup_data = BackupCache(config.backup_cache_mb * 1024 * 1024)
         self._pending_uploads: Dict[str, dict] = {}  # upload_id -> chunk info
+        self._pending_bytes = 0  # total chunk bytes buffered in _pending_uploads
+        self._deduplicated_uploads = 0  # uploads skipped because the backup was unchanged
+        self._deduplicated_bytes = 0
+        # Called with the metadata of every newly stored backup (e.g. replication)
+        self._backup_listeners: List[Callable[[BackupMetadata], None]] = []
+        # (collection, user) -> generation, bumped on every change so readers
+        # can cache serialized responses (watchers are global: user "default")
+        self._generations: Dict[Tuple[str, str], int] = {}
+    
+    # ========== Generation Methods ==========
+    
+    def get_generation(self, collection: str, user: str = "default") -> int:
+        """Get the current generation of a user's "devices" or "watchers"."""
+        with self._lock:
+            return self._generations.get((collection, user), 0)
+    
+    def _bump(self, collection: str, user: str = "default") -> None:
+        key = (collection, user)
+        self._generations[key] = self._generations.get(key, 0) + 1
     
     # ========== Device Methods ==========
     
@@ -29,6 +138,12 @@ class Storage:
         with self._lock:
             return [d for d in self._devices.values() if d.user == user]
     
+    def get_devices_versioned(self, user: str = "default") -> Tuple[List[Device], int]:
+        """Get all devices for a user together with their generation."""
+        with self._lock:
+            devices = [d for d in self._devices.values() if d.user == user]
+            return devices, self._generations.get(("devices", user), 0)
+    
     def get_device(self, device_id: str) -> Optional[Device]:
         """Get a specific device."""
         with self._lock:
@@ -43,25 +158,51 @@ class Storage:
         """Add a new device. Returns False if device limit reached."""
         with self._lock:
             user_devices = [d for d in self._devices.values() if d.user == device.user]
-            if len(user_devices) >= config.limits.limit_of_devices:
+            if len(user_devices) >= self.config.limits.limit_of_devices:
                 return False
             self._devices[device.device_identifier] = device
+            self._bump("devices", device.user)
             return True
     
     def update_device(self, device_id: str, device_name: str) -> bool:
         """Update a device name."""
         with self._lock:
-            if device_id not in self._devices:
+            device = self._devices.get(device_id)
+            if device is None:
                 return False
-            self._devices[device_id].device_name = device_name
+            device.device_name = device_name
+            # Written back, a DeviceTable hands out copies
+            self._devices[device_id] = device
+            self._bump("devices", device.user)
             return True
     
+    def touch_devices(self, last_seen: Dict[str, int]) -> int:
+        """
+        Apply a batch of last-seen timestamps. Returns the number of devices updated.
+        
+        Only users with a changed device get their generation bumped, once.
+        """
+        updated = 0
+        changed_users = set()
+        with self._lock:
+            for device_id, ts in last_seen.items():
+                device = self._devices.get(device_id)
+                if device is not None and ts > device.last_seen_at:
+                    device.last_seen_at = ts
+                    self._devices[device_id] = device
+                    changed_users.add(device.user)
+                    updated += 1
+            for user in changed_users:
+                self._bump("devices", user)
+        return updated
+    
     def delete_device(self, device_id: str) -> bool:
         """Delete a device."""
         with self._lock:
-            if device_id not in self._devices:
+            device = self._devices.pop(device_id, None)
+            if device is None:
                 return False
-            del self._devices[device_id]
+            self._bump("devices", device.user)
             return True
     
     # ========== Backup Methods ==========
@@ -72,18 +213,49 @@ class Storage:
             return self._backups.get(user)
     
     def get_backup_data(self, user: str = "default") -> Optional[bytes]:
-        """Get the actual backup data."""
+        """Get the actual backup data, from memory if hot or from disk otherwise."""
+        with self._lock:
+            metadata = self._backups.get(user)
+            if metadata is None:
+                return None
+            data = self._backup_data.get(user)
+            if data is not None:
+                return data
+        
+        # Cache miss: read from disk outside the lock
+        try:
+            data = self.backup_path(user).read_bytes()
+        except FileNotFoundError:
+            return None
+        
         with self._lock:
-            return self._backup_data.get(user)
+            # Only admit if no newer backup was stored in the meantime
+            if self._backups.get(user) is metadata:
+                self._backup_data.put(user, data)
+        return data
+    
+    def get_backup_cache_stats(self) -> dict:
+        """Get hit/miss/eviction counters of the backup cache."""
+        with self._lock:
+            return self._backup_data.stats()
     
     def store_backup(
         self,
         user: str,
         data: bytes,
         last_modify_ts: int,
-        compression: str = "zlib"
-    ) -> BackupMetadata:
-        """Store a backup and return metadata."""
+        compression: str = "zlib",
+        notify: bool = True,
+        if_newer: bool = False,
+    ) -> Optional[BackupMetadata]:
+        """
+        Store a backup and return metadata.
+        
+        Backup listeners are notified unless `notify` is False (used for
+        backups that are themselves replicas). With `if_newer`, nothing is
+        stored and None returned unless `last_modify_ts` is newer than the
+        stored backup's.
+        """
         data_hash = hashlib.sha256(data).hexdigest()
         metadata = BackupMetadata(
             user=user,
@@ -95,28 +267,147 @@ class Storage:
         )
         
         with self._lock:
+            current = self._backups.get(user)
+            if if_newer and current is not None and current.last_modify_ts >= last_modify_ts:
+                return None
             self._backups[user] = metadata
-            self._backup_data[user] = data
-            
-            # Optionally persist to disk
-            backup_file = config.backups_dir / f"{user}_backup.bin"
-            backup_file.write_bytes(data)
+            self._backup_data.put(user, data)
             
-            meta_file = config.backups_dir / f"{user}_metadata.json"
-            meta_file.write_text(json.dumps(metadata.to_dict()))
+            # Persist to disk, which is the authoritative copy. Files are
+            # replaced rather than rewritten so open readers keep a whole copy.
+            self.config.backups_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.backup_path(user), data)
+            self._write_metadata_file(metadata)
         
+        if notify:
+            for listener in self._backup_listeners:
+                listener(metadata)
         return metadata
     
+    def add_backup_listener(self, listener: Callable[[BackupMetadata], None]) -> None:
+        """Register a callback for newly stored backups. It must return quickly."""
+        self._backup_listeners.append(listener)
+    
+    def remove_backup_listener(self, listener: Callable[[BackupMetadata], None]) -> None:
+        self._backup_listeners.remove(listener)
+    
+    def list_backup_metadata(self) -> List[BackupMetadata]:
+        """Snapshot of the metadata of all stored backups."""
+        with self._lock:
+            return list(self._backups.values())
+    
+    def quarantine_backup(self, metadata: BackupMetadata) -> str:
+        """
+        Handle a backup whose file doesn't match its hash.
+        
+        If the cached copy is intact the file is rewritten from it, otherwise
+        the file is moved to backups_dir/quarantine and the metadata marked
+        corrupted. Returns "repaired", "quarantined", or "stale" if a newer
+        backup replaced this one meanwhile.
+        """
+        user = metadata.user
+        with self._lock:
+            if self._backups.get(user) is not metadata:
+                return "stale"
+            
+            data = self._backup_data.get(user)
+            if data is not None and hashlib.sha256(data).hexdigest() == metadata.data_hash:
+                atomic_write(self.backup_path(user), data)
+                return "repaired"
+            
+            self._backup_data.discard(user)
+            quarantine_dir = self.config.backups_dir / "quarantine"
+            quarantine_dir.mkdir(parents=True, exist_ok=True)
+            # The random suffix keeps quarantines within the same second apart
+            target = quarantine_dir / f"{user}_backup.{int(time.time())}.{uuid.uuid4().hex[:8]}.bin"
+            self.backup_path(user).replace(target)
+            
+            metadata.corrupted = True
+            self._write_metadata_file(metadata, quarantined_path=str(target))
+            return "quarantined"
+    
+    def get_memory_stats(self) -> dict:
+        """Get bytes and object counts held by the storage, for memory accounting."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "backup_data": {
+                    "entries": len(self._backup_data),
+                    "bytes": self._backup_data.size_bytes,
+                },
+                "pending_uploads": {
+                    "sessions": len(self._pending_uploads),
+                    "bytes": self._pending_bytes,
+                    "by_session": {
+                        upload_id: {
+                            "user": upload["user"],
+                            "received_bytes": upload["received_size"],
+                            "total_size": upload["total_size"],
+                            "chunks": len(upload["chunks"]),
+                            "age_seconds": round(now - upload["started_at"], 1),
+                        }
+                        for upload_id, upload in self._pending_uploads.items()
+                    },
+                },
+                "objects": {
+                    "Device": len(self._devices),
+                    "Watcher": len(self._watchers),
+                    "BackupMetadata": len(self._backups),
+                },
+            }
+    
+    def backup_path(self, user: str) -> Path:
+        """Path of a user's backup file (the authoritative copy)."""
+        return self.config.backups_dir / f"{user}_backup.bin"
+    
+    def _write_metadata_file(self, metadata: BackupMetadata, **extra) -> None:
+        meta_file = self.config.backups_dir / f"{metadata.user}_metadata.json"
+        atomic_write(meta_file, json.dumps({**metadata.to_record(), **extra}).encode())
+    
+    # ========== Persistence Methods ==========
+    
+    def save_state(self) -> None:
+        """Save devices and watchers to data_dir (backups are persisted as they are stored)."""
+        with self._lock:
+            state = {
+                "devices": [asdict(device) for device in self._devices.values()],
+                "watchers": [asdict(watcher) for watcher in self._watchers.values()],
+            }
+        self.config.data_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.config.data_dir / STATE_FILE, json.dumps(state).encode())
+    
+    def load_state(self) -> None:
+        """Load devices, watchers and backup metadata persisted in data_dir."""
+        state_file = self.config.data_dir / STATE_FILE
+        state = json.loads(state_file.read_text()) if state_file.exists() else {}
+        backups = []
+        for meta_file in self.config.backups_dir.glob("*_metadata.json"):
+            user = meta_file.name[:-len("_metadata.json")]
+            backups.append(BackupMetadata.from_dict(json.loads(meta_file.read_text()), user))
+        
+        with self._lock:
+            for data in state.get("devices", []):
+                device = Device(**data)
+                self._devices[device.device_identifier] = device
+                self._bump("devices", device.user)
+            for data in state.get("watchers", []):
+                self._insert_watcher(Watcher(**data))
+            for metadata in backups:
+                self._backups[metadata.user] = metadata
+    
     # ========== Chunked Upload Methods ==========
     
     def start_chunked_upload(self, upload_id: str, total_size: int, user: str = "default"):
         """Initialize a chunked upload session."""
+        now = time.monotonic()
         with self._lock:
+            self._expire_uploads(now)
             self._pending_uploads[upload_id] = {
                 "user": user,
                 "total_size": total_size,
                 "received_size": 0,
                 "chunks": [],
+                "started_at": now,
             }
     
     def add_chunk(self, upload_id: str, chunk: bytes, offset: int) -> bool:
@@ -127,8 +418,66 @@ class Storage:
             upload = self._pending_uploads[upload_id]
             upload["chunks"].append((offset, chunk))
             upload["received_size"] += len(chunk)
+            self._pending_bytes += len(chunk)
             return True
     
+    def deduplicate_upload(
+        self, user: str, file_hash: str, last_modify_ts: int, total_size: int, received: int
+    ) -> Optional[BackupMetadata]:
+        """
+        Return the current backup's metadata if it already has `file_hash`.
+        
+        Lets an upload of an unchanged backup end after its first chunk
+        (`received` bytes). A newer `last_modify_ts` is taken over, as the
+        client would have set it on a full upload of the same bytes, and
+        backup listeners are notified of the change.
+        """
+        touched = False
+        with self._lock:
+            metadata = self._backups.get(user)
+            if (
+                metadata is None
+                or metadata.corrupted
+                or not file_hash
+                or metadata.data_hash != file_hash
+            ):
+                return None
+            if last_modify_ts > metadata.last_modify_ts:
+                metadata.last_modify_ts = last_modify_ts
+                self._write_metadata_file(metadata)
+                touched = True
+            self._deduplicated_uploads += 1
+            self._deduplicated_bytes += max(0, total_size - received)
+        
+        if touched:
+            for listener in self._backup_listeners:
+                listener(metadata)
+        return metadata
+    
+    def get_deduplication_stats(self) -> dict:
+        """Get the number of uploads skipped as unchanged and the bytes not received."""
+        with self._lock:
+            return {
+                "deduplicated_uploads": self._deduplicated_uploads,
+                "deduplicated_bytes": self._deduplicated_bytes,
+            }
+    
+    def get_pending_upload_stats(self) -> Tuple[int, int]:
+        """Get the number of pending chunked uploads and the bytes they buffer."""
+        with self._lock:
+            # Expired here too, as admission counts sessions before any new one starts
+            self._expire_uploads(time.monotonic())
+            return len(self._pending_uploads), self._pending_bytes
+    
+    def _expire_uploads(self, now: float) -> None:
+        # Drop abandoned sessions so they don't hold memory (and admission slots) forever
+        expired = [
+            uid for uid, upload in self._pending_uploads.items()
+            if now - upload["started_at"] > self.config.upload_session_ttl
+        ]
+        for uid in expired:
+            self._pending_bytes -= self._pending_uploads.pop(uid)["received_size"]
+    
     def finalize_upload(self, upload_id: str, last_modify_ts: int) -> Optional[BackupMetadata]:
         """Finalize a chunked upload and store the complete backup."""
         with self._lock:
@@ -136,6 +485,7 @@ class Storage:
                 return None
             
             upload = self._pending_uploads.pop(upload_id)
+            self._pending_bytes -= upload["received_size"]
             
             # Reassemble chunks in order
             chunks = sorted(upload["chunks"], key=lambda x: x[0])
@@ -155,10 +505,30 @@ class Storage:
         with self._lock:
             return list(self._watchers.values())
     
+    def get_watchers_versioned(self) -> Tuple[List[Watcher], int]:
+        """Get all watchers together with their generation."""
+        with self._lock:
+            return list(self._watchers.values()), self._generations.get(("watchers", "default"), 0)
+    
+    def list_watchers(
+        self,
+        watcher_type: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 100,
+    ) -> Tuple[List[Watcher], Optional[int]]:
+        """
+        Get one page of watchers in insertion order, optionally filtered by type.
+        
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        with self._lock:
+            identifiers, next_cursor = self._watcher_index.page(watcher_type, cursor, limit)
+            return [self._watchers[i] for i in identifiers], next_cursor
+    
     def add_watcher(self, watcher: Watcher) -> Watcher:
         """Add a new watcher."""
         with self._lock:
-            self._watchers[watcher.identifier] = watcher
+            self._insert_watcher(watcher)
             return watcher
     
     def update_watcher(self, identifier: str, args: dict) -> Optional[Watcher]:
@@ -167,16 +537,50 @@ class Storage:
             if identifier not in self._watchers:
                 return None
             self._watchers[identifier].args = args
+            self._bump("watchers")
             return self._watchers[identifier]
     
     def delete_watcher(self, identifier: str) -> bool:
         """Delete a watcher."""
         with self._lock:
-            if identifier not in self._watchers:
-                return False
-            del self._watchers[identifier]
-            return True
-
+            return self._remove_watcher(identifier)
+    
+    def add_watchers(self, watchers: List[Watcher]) -> List[Watcher]:
+        """Add several watchers atomically."""
+        with self._lock:
+            for watcher in watchers:
+                self._insert_watcher(watcher)
+            return watchers
+    
+    def update_watchers(self, updates: Dict[str, dict]) -> List[Watcher]:
+        """Update args of several watchers atomically. Unknown identifiers are skipped."""
+        updated = []
+        with self._lock:
+            for identifier, args in updates.items():
+                watcher = self._watchers.get(identifier)
+                if watcher is None:
+                    continue
+                watcher.args = args
+                self._bump("watchers")
+                updated.append(watcher)
+        return updated
+    
+    def delete_watchers(self, identifiers: List[str]) -> List[str]:
+        """Delete several watchers atomically. Returns the identifiers actually deleted."""
+        with self._lock:
+            return [i for i in identifiers if self._remove_watcher(i)]
+    
+    def _insert_watcher(self, watcher: Watcher) -> None:
+        self._remove_watcher(watcher.identifier)
+        self._watchers[watcher.identifier] = watcher
+        self._watcher_index.add(watcher)
+        self._bump("watchers")
+    
+    def _remove_watcher(self, identifier: str) -> bool:
+        watcher = self._watchers.pop(identifier, None)
+        if watcher is None:
+            return False
+        self._watcher_index.remove(watcher)
+        self._bump("watchers")
+        return True
 
-# Global storage instance
-storage = Storage()
@@ -0,0 +1,32 @@
+"""Shared fixtures: every test gets its own app, storage and data directory."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from spaetzli_mock_server.app import create_app
+from spaetzli_mock_server.config import ServerConfig
+from spaetzli_mock_server.storage import Storage
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Server config writing to a temporary data directory."""
+    config = ServerConfig(data_dir=tmp_path / "data", backups_dir=tmp_path / "data" / "backups")
+    config.ensure_dirs()
+    return config
+
+
+@pytest.fixture
+def storage(config):
+    return Storage(config)
+
+
+@pytest.fixture
+def app(config, storage):
+    return create_app(config, storage)
+
+
+@pytest.fixture
+def client(app):
+    """Create test client."""
+    return TestClient(app)
@@ -0,0 +1,68 @@
+"""Tests for exporting and importing data directories."""
+
+import gzip
+import hashlib
+import io
+import json
+
+import pytest
+
+from spaetzli_mock_server.archive import export_archive, import_archive
+from spaetzli_mock_server.models import BackupMetadata
+
+
+def make_data_dir(path):
+    backups = path / "backups"
+    backups.mkdir(parents=True)
+    for user, data in {"alice": b"a" * 5000, "bob": b"b" * 3000}.items():
+        (backups / f"{user}_backup.bin").write_bytes(data)
+        metadata = BackupMetadata(
+            user=user, upload_ts=1, last_modify_ts=2,
+            data_hash=hashlib.sha256(data).hexdigest(), data_size=len(data),
+        )
+        (backups / f"{user}_metadata.json").write_text(json.dumps(metadata.to_record()))
+    (path / "state.json").write_text(json.dumps({
+        "devices": [{"device_identifier": "d1", "device_name": "laptop", "platform": "linux"}],
+        "watchers": [{"identifier": "w1", "watcher_type": "t", "args": {}}],
+    }))
+    return path
+
+
+@pytest.mark.parametrize("compression", ["zstd", "gzip", "none"])
+def test_round_trip(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    source = make_data_dir(tmp_path / "source")
+    archive = io.BytesIO()
+    stats = export_archive(source, archive, compression=compression, threads=2)
+    assert stats == {"backups": 2, "bytes": 8000, "skipped": 0}
+
+    archive.seek(0)
+    stats = import_archive(archive, tmp_path / "target", workers=2)
+    assert stats == {"backups": 2, "bytes": 8000, "rejected": 0, "devices": 1, "watchers": 1}
+    for name in ("alice_backup.bin", "bob_backup.bin", "alice_metadata.json"):
+        assert (tmp_path / "target/backups" / name).read_bytes() == (source / "backups" / name).read_bytes()
+    state = json.loads((tmp_path / "target/state.json").read_text())
+    assert state["devices"][0]["device_identifier"] == "d1"
+
+
+def test_export_skips_blob_not_matching_metadata(tmp_path):
+    source = make_data_dir(tmp_path / "source")
+    (source / "backups/bob_backup.bin").write_bytes(b"changed")
+
+    stats = export_archive(source, io.BytesIO(), compression="none")
+    assert stats["backups"] == 1 and stats["skipped"] == 1
+
+
+def test_import_rejects_corrupted_blob(tmp_path):
+    source = make_data_dir(tmp_path / "source")
+    archive = io.BytesIO()
+    export_archive(source, archive, compression="gzip")
+
+    data = bytearray(gzip.decompress(archive.getvalue()))
+    data[data.index(b"b" * 3000)] = ord("x")
+    stats = import_archive(io.BytesIO(bytes(data)), tmp_path / "target")
+
+    assert stats["backups"] == 1 and stats["rejected"] == 1
+    assert not (tmp_path / "target/backups/bob_backup.bin").exists()
+    assert not list((tmp_path / "target/backups").glob("*.import"))
@@ -1,28 +1,52 @@
 """Basic tests for the mock server."""
 
+import gzip
+import hashlib
+import json
+import marshal
+import threading
+import time
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-
-from spaetzli_mock_server.app import app
-from spaetzli_mock_server.config import config
-from spaetzli_mock_server.storage import storage
-from spaetzli_mock_server.models import Device, Watcher
-
-
-@pytest.fixture
-def client():
-    """Create test client."""
-    return TestClient(app)
+from spaetzli_mock_server.activity import ActivityTracker
+from spaetzli_mock_server.app import create_app
+from spaetzli_mock_server.cache import BackupCache
+from spaetzli_mock_server.capture import TrafficCapture, read_capture
+from spaetzli_mock_server.config import ServerConfig
+from spaetzli_mock_server.replication import DirectoryTarget, PeerTarget, Replicator
+from spaetzli_mock_server.scrubber import BackupScrubber, RateLimiter
+from spaetzli_mock_server.storage import Storage
+from spaetzli_mock_server.models import BackupMetadata, Device, DeviceTable, Watcher
 
 
-@pytest.fixture(autouse=True)
-def reset_storage():
-    """Reset storage between tests."""
-    storage._devices.clear()
-    storage._watchers.clear()
-    storage._backups.clear()
-    storage._backup_data.clear()
-    yield
+class TestAppFactory:
+    """Test that apps created by create_app are isolated."""
+    
+    def test_apps_do_not_share_state(self, tmp_path):
+        clients = []
+        for name in ("one", "two"):
+            config = ServerConfig(data_dir=tmp_path / name, backups_dir=tmp_path / name / "backups")
+            config.limits.limit_of_devices = 1
+            clients.append(TestClient(create_app(config, Storage(config))))
+        headers = {"API-KEY": "test-key"}
+        
+        for client in clients:
+            response = client.put(
+                "/nest/1/devices",
+                headers=headers,
+                json={"device_identifier": "same-id", "device_name": "Device", "platform": "linux"},
+            )
+            assert response.status_code == 201
+        
+        clients[0].patch(
+            "/nest/1/devices",
+            headers=headers,
+            json={"device_identifier": "same-id", "device_name": "Renamed"},
+        )
+        names = [c.get("/nest/1/devices", headers=headers).json()["devices"][0]["device_name"] for c in clients]
+        assert names == ["Renamed", "Device"]
 
 
 class TestHealthEndpoints:
@@ -39,6 +63,23 @@ class TestHealthEndpoints:
         response = client.get("/health")
         assert response.status_code == 200
         assert response.json()["status"] == "healthy"
+    
+    def test_sampled_access_log(self, client, config, caplog, monkeypatch):
+        monkeypatch.setattr(config, "access_log_sample_rate", 1.0)
+        with caplog.at_level("INFO", logger="spaetzli_mock_server.access"):
+            client.get("/nest/1/limits", headers={"API-KEY": "test-key"})
+        
+        entry = json.loads(caplog.records[-1].getMessage())
+        assert entry["route"] == "/nest/1/limits"
+        assert entry["status"] == 200
+        assert entry["bytes"] > 0
+        assert entry["latency_ms"] >= 0
+        
+        caplog.clear()
+        monkeypatch.setattr(config, "access_log_sample_rate", 0.0)
+        with caplog.at_level("INFO", logger="spaetzli_mock_server.access"):
+            client.get("/health")
+        assert caplog.records == []
 
 
 class TestApiEndpoints:
@@ -102,10 +143,148 @@ class TestApiEndpoints:
         assert response.json()["watchers"] == []
 
 
+    def test_watchers_bulk_operations(self, client, storage):
+        headers = {"API-KEY": "test-key"}
+        
+        response = client.put(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [{"type": "test_watcher", "args": {"n": i}} for i in range(5)]}
+        )
+        ids = [w["identifier"] for w in response.json()["watchers"]]
+        assert len(ids) == 5
+        
+        response = client.patch(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [
+                {"identifier": ids[0], "args": {"n": 100}},
+                {"identifier": "missing", "args": {"n": 0}},
+            ]}
+        )
+        assert [w["args"] for w in response.json()["watchers"]] == [{"n": 100}]
+        
+        response = client.request(
+            "DELETE",
+            "/api/1/watchers?affected_only=true",
+            headers=headers,
+            json={"watchers": ids[:3] + ["missing"]}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"deleted": ids[:3]}
+        assert len(storage.get_watchers()) == 2
+        
+        response = client.patch(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [
+                {"identifier": ids[3], "args": {"n": 1}},
+                {"identifier": ids[3], "args": {"n": 2}},
+            ]}
+        )
+        assert response.status_code == 400
+        assert storage.get_watchers()[0].args == {"n": 3}
+    
+    def test_watcher_pages_skip_deleted_watchers(self, storage):
+        watchers = storage.add_watchers([
+            Watcher(watcher_type="even" if i % 2 == 0 else "odd", args={"n": i}) for i in range(20)
+        ])
+        # Deletes below the compaction threshold leave tombstones behind
+        storage.delete_watchers([w.identifier for w in watchers if w.args["n"] in (0, 1, 4, 19)])
+        
+        def all_pages(watcher_type):
+            seen, cursor = [], None
+            while True:
+                page, cursor = storage.list_watchers(watcher_type, cursor, limit=3)
+                assert page or cursor is None
+                seen.extend(w.args["n"] for w in page)
+                if cursor is None:
+                    return seen
+        
+        assert all_pages(None) == [i for i in range(20) if i not in (0, 1, 4, 19)]
+        assert all_pages("even") == [i for i in range(0, 20, 2) if i not in (0, 4)]
+        
+        # Deleting most of them compacts the lists
+        storage.delete_watchers([w.identifier for w in watchers if w.args["n"] not in (7, 8)])
+        assert all_pages(None) == [7, 8]
+        assert all_pages("odd") == [7]
+        assert len(storage._watcher_index._seqs[None]) <= 2 * 2  # at most half tombstones
+        storage.delete_watchers([w.identifier for w in watchers])
+        assert all_pages("odd") == []
+        assert "odd" not in storage._watcher_index._seqs
+
+    def test_watchers_pagination_by_type(self, client):
+        headers = {"API-KEY": "test-key"}
+        client.put(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [
+                {"type": "makervault_collateralization_ratio" if i % 2 else "other", "args": {"n": i}}
+                for i in range(7)
+            ]}
+        )
+        
+        seen = []
+        cursor = None
+        while True:
+            params = {"watcher_type": "makervault_collateralization_ratio", "limit": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get("/api/1/watchers", headers=headers, params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["watchers"]) <= 2
+            seen.extend(w["args"]["n"] for w in data["watchers"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        
+        assert seen == [1, 3, 5]
+        
+        response = client.get("/api/1/watchers", headers=headers, params={"limit": 5000})
+        assert response.status_code == 422
+    
+    def test_list_responses_cached_until_changed(self, client, app):
+        headers = {"API-KEY": "test-key"}
+        client.put(
+            "/nest/1/devices",
+            headers=headers,
+            json={"device_identifier": "cached-device", "device_name": "Old", "platform": "Linux"},
+        )
+        client.put(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [{"type": "makervault_collateralization_ratio", "args": {"n": 1}}]},
+        )
+        
+        first = [client.get(path, headers=headers).content for path in ("/nest/1/devices", "/api/1/watchers")]
+        misses = app.state.response_cache.misses
+        second = [client.get(path, headers=headers).content for path in ("/nest/1/devices", "/api/1/watchers")]
+        assert second == first
+        assert app.state.response_cache.misses == misses
+        
+        client.patch(
+            "/nest/1/devices",
+            headers=headers,
+            json={"device_identifier": "cached-device", "device_name": "New"},
+        )
+        identifier = json.loads(first[1])["watchers"][0]["identifier"]
+        client.patch(
+            "/api/1/watchers",
+            headers=headers,
+            json={"watchers": [{"identifier": identifier, "args": {"n": 2}}]},
+        )
+        
+        devices = client.get("/nest/1/devices", headers=headers).json()
+        watchers = client.get("/api/1/watchers", headers=headers).json()
+        assert devices["devices"][0]["device_name"] == "New"
+        assert watchers["watchers"][0]["args"] == {"n": 2}
+
+
 class TestNestEndpoints:
     """Test /nest/1/ endpoints."""
     
-    def test_limits(self, client):
+    def test_limits(self, client, config):
         response = client.get(
             "/nest/1/limits",
             headers={"API-KEY": "test-key"}
@@ -174,12 +353,198 @@ class TestNestEndpoints:
         # Verify deleted
         response = client.get("/nest/1/devices", headers=headers)
         assert len(response.json()["devices"]) == 0
+    
+    def test_unchanged_backup_upload_is_deduplicated(self, client, storage):
+        data = b"x" * 2000
+        stored = storage.store_backup(user="default", data=data, last_modify_ts=1)
+        notified = []
+        storage.add_backup_listener(notified.append)
+        
+        response = client.post(
+            "/nest/1/backup/range",
+            headers={"API-KEY": "test-key", "Content-Range": "bytes 0-999/2000"},
+            files={"chunk_data": ("chunk", data[:1000])},
+            data={"file_hash": stored.data_hash, "last_modify_ts": "5", "total_size": "2000"},
+        )
+        
+        # Answered as complete with the stored metadata, no upload session started
+        assert response.status_code == 200
+        assert response.json() == stored.to_dict()
+        assert response.json()["last_modify_ts"] == 5
+        assert notified == [stored]  # replication picks up the new timestamp
+        assert storage.get_pending_upload_stats() == (0, 0)
+        # Only the second chunk was spared, the first one was received
+        assert storage.get_deduplication_stats() == {
+            "deduplicated_uploads": 1,
+            "deduplicated_bytes": 1000,
+        }
+
+
+class TestUploadAdmission:
+    """Test upload admission control."""
+    
+    @staticmethod
+    def upload(client, data=b"x" * 100, content_range=None, upload_id=None):
+        headers = {"API-KEY": "test-key"}
+        if content_range:
+            headers["Content-Range"] = content_range
+        form = {"file_hash": "h", "last_modify_ts": "1", "total_size": "1000"}
+        if upload_id:
+            form["upload_id"] = upload_id
+        return client.post(
+            "/nest/1/backup/range",
+            headers=headers,
+            files={"chunk_data": ("chunk", data)},
+            data=form,
+        )
+    
+    def test_session_limit_rejects_new_uploads(self, client, app, config, monkeypatch):
+        monkeypatch.setattr(config, "max_upload_sessions", 1)
+        
+        response = self.upload(client, content_range="bytes 0-99/1000")
+        assert response.status_code == 206
+        upload_id = response.json()["upload_id"]
+        
+        # The pending chunked upload holds the only slot
+        rejected = app.state.admission.rejected
+        response = self.upload(client)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(config.upload_retry_after)
+        assert app.state.admission.rejected == rejected + 1
+        
+        # ...but its own continuation chunks are still accepted
+        response = self.upload(client, content_range="bytes 100-999/1000", upload_id=upload_id)
+        assert response.status_code == 200
+        assert self.upload(client).status_code == 200
+    
+    def test_abandoned_sessions_expire(self, client, config, monkeypatch):
+        monkeypatch.setattr(config, "max_upload_sessions", 1)
+        assert self.upload(client, content_range="bytes 0-99/1000").status_code == 206
+        assert self.upload(client).status_code == 503
+        
+        # The first upload is never continued; once its TTL has passed the slot is free again
+        monkeypatch.setattr(config, "upload_session_ttl", 0.01)
+        time.sleep(0.05)
+        assert self.upload(client).status_code == 200
+    
+    def test_forged_continuations_count_as_sessions(self, client, app, config, monkeypatch):
+        monkeypatch.setattr(config, "max_upload_sessions", 1)
+        assert self.upload(client, content_range="bytes 0-99/1000").status_code == 206
+        
+        # Claims to continue an upload but has no upload id: refused, no new session
+        assert self.upload(client, content_range="bytes 100-199/1000").status_code == 400
+        assert app.state.admission.storage.get_pending_upload_stats()[0] == 1
+        
+        # Only one continuation per pending session is exempt from the session limit
+        controller = app.state.admission
+        first = controller.try_admit(100, continuation=True)
+        assert first is not None and first.continuation
+        assert controller.try_admit(100, continuation=True) is None
+        controller.release(first)
+        assert controller.active_requests == controller.active_continuations == 0
+    
+    def test_uploads_without_length_refused(self, client):
+        response = client.post(
+            "/nest/1/backup/range",
+            headers={"API-KEY": "test-key", "Content-Type": "multipart/form-data; boundary=b"},
+            content=iter([b"--b--\r\n"]),
+        )
+        assert response.status_code == 411
+    
+    def test_byte_budget(self, client, config, monkeypatch):
+        monkeypatch.setattr(config, "max_upload_inflight_mb", 1)
+        response = self.upload(client, data=b"x" * 600_000, content_range="bytes 0-599999/2000000")
+        assert response.status_code == 206
+        
+        response = self.upload(client, data=b"x" * 600_000)
+        assert response.status_code == 503
+    
+    def test_debug_admission_endpoint(self, client, config, monkeypatch):
+        assert client.get("/debug/admission").status_code == 404
+        
+        monkeypatch.setattr(config, "debug_token", "secret")
+        assert client.get("/debug/admission", headers={"X-Debug-Token": "wrong"}).status_code == 403
+        response = client.get("/debug/admission", headers={"X-Debug-Token": "secret"})
+        assert response.status_code == 200
+        assert response.json()["active_requests"] == 0
+
+
+class TestDebugEndpoints:
+    """Test the memory and profiling debug endpoints."""
+    
+    HEADERS = {"X-Debug-Token": "secret"}
+    
+    @pytest.fixture(autouse=True)
+    def debug_token(self, config, monkeypatch):
+        monkeypatch.setattr(config, "debug_token", "secret")
+    
+    def test_memory_report(self, client, storage):
+        storage.store_backup("testuser", b"x" * 1000, last_modify_ts=1)
+        storage.start_chunked_upload("up1", 5000, user="testuser")
+        storage.add_chunk("up1", b"y" * 200, 0)
+        
+        response = client.get("/debug/memory", params={"live_objects": True}, headers=self.HEADERS)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["backup_data"] == {"entries": 1, "bytes": 1000}
+        assert data["pending_uploads"]["bytes"] == 200
+        assert data["pending_uploads"]["by_session"]["up1"]["received_bytes"] == 200
+        assert data["objects"]["BackupMetadata"] == 1
+        assert data["live_objects"]["BackupMetadata"] >= 1
+        assert data["rss_bytes"] > 0
+    
+    def test_tracemalloc_snapshots(self, client):
+        assert client.post("/debug/memory/snapshots", headers=self.HEADERS).status_code == 409
+        
+        client.post("/debug/memory/tracemalloc/start", headers=self.HEADERS)
+        try:
+            first = client.post("/debug/memory/snapshots", headers=self.HEADERS).json()["id"]
+            retained = [bytearray(1024) for _ in range(100)]
+            second = client.post("/debug/memory/snapshots", headers=self.HEADERS).json()["id"]
+            
+            response = client.get(f"/debug/memory/snapshots/{first}/diff/{second}", headers=self.HEADERS)
+            assert response.status_code == 200
+            assert sum(stat["size_diff_bytes"] for stat in response.json()["top"]) > 0
+            assert client.get(f"/debug/memory/snapshots/{first}/diff/999", headers=self.HEADERS).status_code == 404
+            del retained
+        finally:
+            client.post("/debug/memory/tracemalloc/stop", headers=self.HEADERS)
+    
+    def test_profile(self, client):
+        response = client.get("/debug/profile", params={"seconds": 0.2}, headers=self.HEADERS)
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+        
+        response = client.get(
+            "/debug/profile", params={"seconds": 0.2, "mode": "cprofile"}, headers=self.HEADERS
+        )
+        assert response.status_code == 200
+        assert marshal.loads(response.content)
 
 
 class TestStorage:
     """Test storage layer."""
     
-    def test_device_limit(self):
+    def test_generations_bump_on_change(self, storage):
+        device = Device(device_identifier="gen-device", device_name="Device", platform="Test")
+        assert storage.get_generation("devices") == 0
+        storage.add_device(device)
+        storage.update_device("gen-device", "Renamed")
+        storage.touch_devices({"gen-device": device.last_seen_at + 10})
+        storage.touch_devices({"gen-device": 0})  # not newer, nothing changes
+        storage.delete_device("gen-device")
+        assert storage.get_generation("devices") == 4
+        assert storage.get_generation("devices", "someone-else") == 0
+        
+        watcher = storage.add_watcher(Watcher(watcher_type="test"))
+        storage.update_watcher(watcher.identifier, {"a": 1})
+        _, generation = storage.get_watchers_versioned()
+        assert generation == storage.get_generation("watchers") == 2
+    
+    def test_device_limit(self, storage, config):
         """Test that device limit is enforced."""
         original_limit = config.limits.limit_of_devices
         config.limits.limit_of_devices = 2
@@ -204,7 +569,59 @@ class TestStorage:
         finally:
             config.limits.limit_of_devices = original_limit
     
-    def test_backup_storage(self):
+    def test_activity_flush_coalesces(self, storage):
+        """Buffered device activity is applied in one batch."""
+        device = Device(device_identifier="active", device_name="Active", platform="Test")
+        device.last_seen_at = 0
+        storage.add_device(device)
+        
+        tracker = ActivityTracker(storage)
+        for _ in range(5):
+            tracker.touch("active")
+        tracker.touch("unknown-device")
+        assert device.last_seen_at == 0
+        
+        assert tracker.flush() == 1
+        assert device.last_seen_at > 0
+        assert tracker.flush() == 0
+    
+    def test_activity_touch_concurrent_with_flush(self, storage, config):
+        config.limits.limit_of_devices = 200
+        for i in range(200):
+            device = Device(device_identifier=f"d{i}", device_name="n", platform="linux")
+            device.last_seen_at = 0
+            storage.add_device(device)
+        tracker = ActivityTracker(storage)
+        
+        def touch_all():
+            for _ in range(20):
+                for i in range(200):
+                    tracker.touch(f"d{i}")
+        
+        threads = [threading.Thread(target=touch_all) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            tracker.flush()
+        tracker.flush()
+        
+        assert all(storage.get_device(f"d{i}").last_seen_at > 0 for i in range(200))
+    
+    def test_device_list_stays_cached_without_new_activity(self, client, app, storage):
+        headers = {"API-KEY": "test-key"}
+        storage.add_device(Device(device_identifier="d1", device_name="n", platform="linux"))
+        storage.touch_devices({"d1": 2**40})
+        cache = app.state.response_cache
+        
+        client.get("/nest/1/devices", headers=headers)
+        client.get("/nest/1/devices", headers=headers)
+        # A check that doesn't advance lastSeenAt leaves the cached list valid
+        client.post("/nest/1/devices/check", headers=headers, json={"device_identifier": "d1"})
+        client.get("/nest/1/devices", headers=headers)
+        assert (cache.hits, cache.misses) == (2, 1)
+        assert not app.state.activity.pending
+    
+    def test_backup_storage(self, storage):
         """Test backup storage and retrieval."""
         test_data = b"encrypted database content"
         
@@ -219,3 +636,320 @@ class TestStorage:
         
         retrieved = storage.get_backup_data("test-user")
         assert retrieved == test_data
+    
+    def test_compact_device_store(self, storage, monkeypatch):
+        monkeypatch.setattr(storage, "_devices", DeviceTable())
+        for i in range(3):
+            assert storage.add_device(Device(device_identifier=f"d{i}", device_name=f"n{i}", platform="linux"))
+        
+        assert storage.update_device("d1", "renamed")
+        assert storage.touch_devices({"d2": 2**40}) == 1
+        assert storage.delete_device("d0")
+        
+        devices = {d.device_identifier: d for d in storage.get_devices()}
+        assert set(devices) == {"d1", "d2"}
+        assert devices["d1"].device_name == "renamed"
+        assert devices["d2"].last_seen_at == 2**40
+        assert not storage.device_exists("d0")
+        assert storage.get_device("d2").platform == "linux"
+        
+        storage._devices.clear()
+        assert len(storage._devices) == 0 and storage.get_devices() == []
+        assert storage.add_device(Device(device_identifier="d1", device_name="again", platform="linux"))
+        assert storage.get_device("d1").device_name == "again"
+    
+    def test_device_timestamps_default_to_one_now(self):
+        device = Device(device_identifier="d", device_name="n", platform="linux")
+        assert device.created_at == device.last_seen_at
+        assert device.platform is Device(device_identifier="e", device_name="m", platform="".join(["lin", "ux"])).platform
+    
+    def test_state_survives_restart(self, storage, config):
+        storage.add_device(Device(device_identifier="d1", device_name="laptop", platform="linux"))
+        watcher = storage.add_watcher(Watcher(watcher_type="t", args={"a": "1"}))
+        metadata = storage.store_backup(user="test-user", data=b"backup", last_modify_ts=1)
+        storage.save_state()
+        
+        restarted = Storage(config)
+        restarted.load_state()
+        assert restarted.get_device("d1").device_name == "laptop"
+        assert restarted.list_watchers(watcher_type="t")[0][0].identifier == watcher.identifier
+        assert restarted.get_backup_metadata("test-user") == metadata
+        assert restarted.get_backup_data("test-user") == b"backup"
+
+
+class TestBackupCache:
+    """Test the tiered backup cache."""
+    
+    def test_lru_eviction_within_budget(self):
+        cache = BackupCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        assert cache.get("a") == b"1234"  # a is now most recent
+        cache.put("c", b"1234")
+        
+        assert "b" not in cache
+        assert "a" in cache and "c" in cache
+        assert cache.size_bytes == 8
+        assert cache.evictions == 1
+    
+    def test_oversized_blob_not_cached(self):
+        cache = BackupCache(max_bytes=4)
+        assert cache.put("a", b"12345") is False
+        assert cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+    
+    def test_evicted_backup_served_from_disk(self, storage):
+        original_budget = storage._backup_data.max_bytes
+        storage._backup_data.resize(0)
+        try:
+            storage.store_backup(user="cold-user", data=b"cold data", last_modify_ts=1)
+            assert "cold-user" not in storage._backup_data
+            assert storage.get_backup_data("cold-user") == b"cold data"
+        finally:
+            storage._backup_data.resize(original_budget)
+        
+        # Re-read from disk is admitted back into the hot tier
+        assert storage.get_backup_data("cold-user") == b"cold data"
+        assert "cold-user" in storage._backup_data
+        
+        hits = storage.get_backup_cache_stats()["hits"]
+        storage.get_backup_data("cold-user")
+        assert storage.get_backup_cache_stats()["hits"] == hits + 1
+
+
+class TestBackupScrubber:
+    """Test integrity scrubbing of stored backups."""
+    
+    def test_scrub_detects_corruption(self, storage, config):
+        storage.store_backup(user="intact", data=b"intact data", last_modify_ts=1)
+        storage.store_backup(user="cached", data=b"cached data", last_modify_ts=1)
+        storage.store_backup(user="broken", data=b"broken data", last_modify_ts=1)
+        storage.backup_path("cached").write_bytes(b"bit rot")
+        storage.backup_path("broken").write_bytes(b"bit rot")
+        storage._backup_data.discard("broken")
+        
+        scrubber = BackupScrubber(storage, interval=0, workers=2, rate_mb=0)
+        scrubber.scrub()
+        
+        stats = scrubber.stats()
+        assert stats["files_done"] == stats["files_total"] == 3
+        assert stats["mismatches"] == 2
+        assert stats["repaired"] == 1 and stats["quarantined"] == 1
+        
+        # Intact cached copy is written back
+        assert storage.backup_path("cached").read_bytes() == b"cached data"
+        
+        # No intact copy: file moved aside and metadata marked
+        assert storage.get_backup_metadata("broken").corrupted
+        assert not storage.backup_path("broken").exists()
+        assert storage.get_backup_data("broken") is None
+        meta = json.loads((config.backups_dir / "broken_metadata.json").read_text())
+        assert meta["corrupted"] is True
+        
+        # Corrupted backups are not re-hashed on the next pass
+        scrubber.scrub()
+        assert scrubber.stats()["files_total"] == 2
+    
+    def test_repeated_quarantines_keep_every_file(self, storage, config):
+        for data in (b"first", b"second"):
+            storage.store_backup(user="broken", data=data, last_modify_ts=1)
+            storage.backup_path("broken").write_bytes(b"bit rot")
+            storage._backup_data.discard("broken")
+            assert storage.quarantine_backup(storage.get_backup_metadata("broken")) == "quarantined"
+        
+        quarantined = list((config.backups_dir / "quarantine").iterdir())
+        assert len(quarantined) == 2
+    
+    def test_rate_limit(self):
+        limiter = RateLimiter(rate=1000)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire(100)
+        assert time.monotonic() - start >= 0.15
+
+
+class TestReplication:
+    """Test asynchronous backup replication."""
+    
+    def test_directory_target(self, storage, tmp_path):
+        replicator = Replicator(storage, [DirectoryTarget(tmp_path)], batch_window=0.01)
+        replicator.start()
+        try:
+            storage.store_backup(user="alice", data=b"first", last_modify_ts=1)
+            storage.store_backup(user="alice", data=b"second", last_modify_ts=2)
+            storage.store_backup(user="bob", data=b"bob's", last_modify_ts=1)
+            assert replicator.wait_idle(timeout=5)
+        finally:
+            replicator.stop()
+        
+        assert (tmp_path / "alice_backup.bin").read_bytes() == b"second"
+        assert (tmp_path / "bob_backup.bin").read_bytes() == b"bob's"
+        meta = json.loads((tmp_path / "alice_metadata.json").read_text())
+        assert meta["data_hash"] == storage.get_backup_metadata("alice").data_hash
+        stats = replicator.stats()
+        assert stats["lag_seconds"] == 0.0
+        assert stats["targets"][0]["failures"] == 0
+    
+    def test_failed_batches_are_retried(self, storage, tmp_path):
+        class FlakyTarget(DirectoryTarget):
+            calls = 0
+            
+            def replicate(self, batch):
+                self.calls += 1
+                if self.calls == 1:
+                    raise OSError("target unavailable")
+                return super().replicate(batch)
+        
+        target = FlakyTarget(tmp_path)
+        replicator = Replicator(storage, [target], batch_window=0.01)
+        replicator.start()
+        try:
+            storage.store_backup(user="alice", data=b"data", last_modify_ts=1)
+            assert replicator.wait_idle(timeout=5)
+        finally:
+            replicator.stop()
+        
+        assert target.calls == 2
+        assert (tmp_path / "alice_backup.bin").read_bytes() == b"data"
+        assert replicator.stats()["targets"][0]["failures"] == 1
+    
+    def test_peer_endpoint_verifies_hashes(self, client, storage, config, monkeypatch):
+        target = PeerTarget("http://testserver", "secret")
+        target._client = client
+        good = BackupMetadata(
+            user="replica", upload_ts=1, last_modify_ts=1,
+            data_hash=hashlib.sha256(b"replica").hexdigest(), data_size=7,
+        )
+        bad = BackupMetadata(
+            user="tampered", upload_ts=1, last_modify_ts=1, data_hash="0" * 64, data_size=3,
+        )
+        
+        client.headers["X-Replication-Token"] = "secret"
+        with pytest.raises(httpx.HTTPStatusError):
+            target.replicate([(good, b"replica")])  # replication disabled: 404
+        
+        monkeypatch.setattr(config, "replication_token", "secret")
+        assert target.replicate([(good, b"replica"), (bad, b"abc")]) == ["tampered"]
+        assert storage.get_backup_data("replica") == b"replica"
+        assert storage.get_backup_metadata("tampered") is None
+    
+    def test_peer_endpoint_rejects_malformed_manifests(self, client, config, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "replication_token", "secret")
+        headers = {"X-Replication-Token": "secret"}
+        data_hash = hashlib.sha256(b"x").hexdigest()
+        manifests = [
+            {"entries": []},
+            [{"user": "../../escaped", "data_hash": data_hash, "last_modify_ts": 1}],
+            [{"user": "..", "data_hash": data_hash, "last_modify_ts": 1}],
+            [{"user": "alice", "data_hash": data_hash}],
+        ]
+        for manifest in manifests:
+            response = client.post(
+                "/replication/1/backups",
+                headers=headers,
+                data={"manifest": json.dumps(manifest)},
+                files={"backup_0": ("backup", b"x")},
+            )
+            assert response.status_code == 400
+        assert not list(tmp_path.rglob("*escaped*"))
+    
+    def test_peer_endpoint_skips_stale_replicas(self, client, storage, config, monkeypatch):
+        monkeypatch.setattr(config, "replication_token", "secret")
+        storage.store_backup(user="alice", data=b"newer", last_modify_ts=5)
+        
+        def send(data, last_modify_ts, backup):
+            manifest = [{
+                "user": "alice",
+                "data_hash": hashlib.sha256(data).hexdigest(),
+                "last_modify_ts": last_modify_ts,
+            }]
+            fields = {"manifest": json.dumps(manifest)}
+            files = None
+            if backup == "file":
+                files = {"backup_0": ("backup", data)}
+            else:
+                fields["backup_0"] = data.decode()
+            response = client.post(
+                "/replication/1/backups",
+                headers={"X-Replication-Token": "secret"},
+                data=fields,
+                files=files,
+            )
+            assert response.status_code == 200
+            return response.json()
+        
+        assert send(b"older", 4, "file")["skipped"] == ["alice"]
+        assert send(b"same age", 5, "file")["skipped"] == ["alice"]
+        assert storage.get_backup_data("alice") == b"newer"
+        # Data sent as a plain form field instead of a file
+        assert send(b"newest", 6, "field")["rejected"] == ["alice"]
+        assert send(b"newest", 6, "file")["stored"] == ["alice"]
+        assert storage.get_backup_data("alice") == b"newest"
+    
+    def test_replication_bypasses_backup_cache(self, storage, tmp_path):
+        storage.store_backup(user="alice", data=b"data", last_modify_ts=1)
+        before = storage.get_backup_cache_stats()
+        replicator = Replicator(storage, [DirectoryTarget(tmp_path / "replica")])
+        batch = replicator.workers[0]._load([(storage.get_backup_metadata("alice"), 0.0)])
+        assert batch[0][1] == b"data"
+        assert storage.get_backup_cache_stats() == before
+
+
+class TestTrafficCapture:
+    """Test sanitized traffic capture."""
+    
+    def test_capture_is_sanitized_and_size_matched(self, client, app, tmp_path):
+        headers = {"API-KEY": "secret-key"}
+        app.state.traffic_capture.start(tmp_path / "capture.jsonl.gz")
+        try:
+            client.put(
+                "/nest/1/devices",
+                headers=headers,
+                json={"device_identifier": "laptop-of-alice", "device_name": "Alice", "platform": "linux"},
+            )
+            client.post("/nest/1/devices/check", headers=headers, json={"device_identifier": "laptop-of-alice"})
+            client.post(
+                "/nest/1/backup/range",
+                headers={**headers, "Content-Range": "bytes 0-3/10"},
+                data={"file_hash": "f" * 64, "last_modify_ts": "1", "compression": "zlib", "total_size": "10"},
+                files={"chunk_data": ("db", b"abcd")},
+            )
+            client.get("/health")  # not captured
+        finally:
+            app.state.traffic_capture.stop()
+        
+        raw = (tmp_path / "capture.jsonl.gz").read_bytes()
+        records = list(read_capture(tmp_path / "capture.jsonl.gz"))
+        assert [r["s"] for r in records] == [201, 200, 206]
+        assert all(r["a"] == 1 for r in records)
+        
+        register, check, upload = [r.get("b") for r in records]
+        device = register["json"]
+        assert check["json"]["device_identifier"] == device["device_identifier"]  # consistent pseudonyms
+        assert device["device_identifier"] != "laptop-of-alice"
+        assert len(device["device_identifier"]) == len("laptop-of-alice")
+        assert device["platform"] == "linux"
+        
+        assert upload["files"] == {"chunk_data": 4}
+        assert upload["form"]["compression"] == "zlib"
+        assert upload["form"]["total_size"] == "10"
+        assert records[2]["h"] == {"content-range": "bytes 0-3/10"}
+        assert len(records[2]["u"]) == 36
+        
+        text = gzip.decompress(raw)
+        assert b"secret-key" not in text and b"alice" not in text.lower()
+    
+    def test_queue_holds_file_sizes_and_is_bounded(self):
+        capture = TrafficCapture(max_queued=1)  # not started, so nothing drains the queue
+        body = (
+            b'--b\r\nContent-Disposition: form-data; name="total_size"\r\n\r\n10\r\n'
+            b'--b\r\nContent-Disposition: form-data; name="chunk_data"; filename="db"\r\n\r\n'
+            + b"x" * 10 + b"\r\n--b--\r\n"
+        )
+        scope = {"headers": [(b"content-type", b"multipart/form-data; boundary=b")]}
+        capture.record(0.0, scope, body, 200, b"")
+        capture.record(0.0, scope, body, 200, b"")
+        
+        queued = capture._queue.get_nowait()[2]
+        assert queued == {"form": {"total_size": "10"}, "files": {"chunk_data": 10}}
+        assert capture.dropped == 1
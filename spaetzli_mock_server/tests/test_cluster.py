@@ -0,0 +1,178 @@
+"""Tests for cluster mode."""
+
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("uvicorn")
+
+from fastapi.testclient import TestClient
+
+from spaetzli_mock_server.app import create_app
+from spaetzli_mock_server.cluster import HashRing, apply_rebalance, rebalance_plan
+from spaetzli_mock_server.config import ServerConfig
+from spaetzli_mock_server.replication import PeerTarget
+from spaetzli_mock_server.storage import Storage
+
+
+def key_owned_by(ring: HashRing, node: str) -> str:
+    return next(f"key-{i}" for i in range(10_000) if ring.owner(f"key-{i}") == node)
+
+
+class TestHashRing:
+
+    def test_owner_is_stable(self):
+        ring = HashRing(["http://a", "http://b", "http://c"])
+        same = HashRing(["http://c", "http://a", "http://b"])
+        assert all(ring.owner(f"user-{i}") == same.owner(f"user-{i}") for i in range(100))
+
+    def test_keys_spread_over_nodes(self):
+        ring = HashRing(["http://a", "http://b", "http://c"])
+        counts = {}
+        for i in range(3000):
+            owner = ring.owner(f"user-{i}")
+            counts[owner] = counts.get(owner, 0) + 1
+        assert all(700 < count < 1300 for count in counts.values())
+
+    def test_adding_node_moves_few_keys(self):
+        keys = [f"user-{i}" for i in range(4000)]
+        old = HashRing(["http://a", "http://b", "http://c"])
+        new = HashRing(["http://a", "http://b", "http://c", "http://d"])
+        plan = rebalance_plan(old, new, keys)
+
+        # Ideally 1/4 of the keys move, and all of them to the new node
+        assert 0.15 < len(plan) / len(keys) < 0.35
+        assert all(new_owner == "http://d" for _, new_owner in plan.values())
+
+
+def test_forwarded_mark_needs_cluster_token(config, storage):
+    nodes = ["http://127.0.0.1:1", "http://127.0.0.1:2"]
+    config.cluster_nodes = nodes
+    config.cluster_self = nodes[0]
+    config.cluster_redirect = True
+    key = key_owned_by(HashRing(nodes), nodes[1])
+
+    with TestClient(create_app(config, storage), follow_redirects=False) as client:
+        # A client claiming to be a peer is neither served nor rerouted
+        for mark in ("", "guess"):
+            headers = {"API-KEY": key, "X-Spaetzli-Forwarded": mark}
+            assert client.get("/nest/1/limits", headers=headers).status_code == 421
+
+        config.cluster_token = "cluster-secret"
+        headers = {"API-KEY": key, "X-Spaetzli-Forwarded": "guess"}
+        assert client.get("/nest/1/limits", headers=headers).status_code == 421
+        headers["X-Spaetzli-Forwarded"] = "cluster-secret"
+        response = client.get("/nest/1/limits", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["X-Spaetzli-Node"] == nodes[0]
+
+        # Unmarked requests are still sent to the owner
+        assert client.get("/nest/1/limits", headers={"API-KEY": key}).status_code == 307
+
+
+def test_rebalance_copies_moved_backups(storage, tmp_path):
+    old = HashRing(["http://a", "http://b"])
+    new = HashRing(["http://a", "http://b", "http://c"])
+    users = [f"user-{i}" for i in range(40)]
+    for user in users:
+        storage.store_backup(user=user, data=user.encode(), last_modify_ts=1)
+    plan = rebalance_plan(old, new, users)
+    handed_over = sorted(user for user, (owner, _) in plan.items() if owner == "http://a")
+    assert handed_over
+
+    config = ServerConfig(data_dir=tmp_path / "c", backups_dir=tmp_path / "c" / "backups")
+    config.ensure_dirs()
+    config.replication_token = "secret"
+    receiver = Storage(config)
+    client = TestClient(create_app(config, receiver))
+
+    def target_for(node):
+        assert node == "http://c"
+        target = PeerTarget(node, "secret")
+        target._client = client
+        client.headers["X-Replication-Token"] = "secret"
+        return target
+
+    result = apply_rebalance(storage, plan, "http://a", target_for=target_for, batch_size=3)
+    assert sorted(result["moved"]) == handed_over and result["failed"] == []
+    for user in handed_over:
+        assert receiver.get_backup_data(user) == user.encode()
+        assert receiver.get_backup_metadata(user).data_hash == storage.get_backup_metadata(user).data_hash
+    # Users handed over by the other node are left to it
+    assert all(receiver.get_backup_metadata(user) is None for user in users if user not in handed_over)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    """Two local nodes: node 0 redirects, node 1 forwards."""
+    nodes = [f"http://127.0.0.1:{free_port()}" for _ in range(2)]
+    processes = []
+    for i, node in enumerate(nodes):
+        cmd = [
+            sys.executable, "-m", "spaetzli_mock_server",
+            "--host", "127.0.0.1", "--port", node.rsplit(":", 1)[1],
+            "--data-dir", str(tmp_path / f"node{i}"),
+            "--cluster-nodes", ",".join(nodes), "--cluster-self", node,
+        ]
+        if i == 0:
+            cmd.append("--cluster-redirect")
+        processes.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    try:
+        for node in nodes:
+            deadline = time.monotonic() + 15
+            while True:
+                try:
+                    httpx.get(f"{node}/health")
+                    break
+                except httpx.TransportError:
+                    assert time.monotonic() < deadline, f"{node} did not start"
+                    time.sleep(0.05)
+        yield nodes
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def test_requests_reach_owner(cluster):
+    redirecting, forwarding = cluster
+    ring = HashRing(cluster)
+
+    # A node serves its own users
+    key = key_owned_by(ring, forwarding)
+    response = httpx.get(f"{forwarding}/nest/1/limits", headers={"API-KEY": key})
+    assert response.status_code == 200
+    assert response.headers["X-Spaetzli-Node"] == forwarding
+
+    # Redirect mode points the client at the owner
+    response = httpx.get(f"{redirecting}/nest/1/limits?x=1", headers={"API-KEY": key})
+    assert response.status_code == 307
+    assert response.headers["Location"] == f"{forwarding}/nest/1/limits?x=1"
+
+    # Forward mode proxies to the owner, which stores the data
+    key = key_owned_by(ring, redirecting)
+    response = httpx.post(
+        f"{forwarding}/nest/1/backup/range",
+        headers={"API-KEY": key},
+        files={"chunk_data": ("chunk", b"owned elsewhere")},
+        data={"file_hash": "h", "last_modify_ts": "1", "total_size": "15"},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Spaetzli-Node"] == redirecting
+
+    response = httpx.get(f"{redirecting}/nest/1/backup", headers={"API-KEY": key})
+    assert response.content == b"owned elsewhere"
+
+    # Unpartitioned routes are always answered locally
+    assert "X-Spaetzli-Node" not in httpx.get(f"{forwarding}/health").headers
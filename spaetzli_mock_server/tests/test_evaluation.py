@@ -0,0 +1,170 @@
+"""Tests for the watcher evaluation engine."""
+
+import json
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from fastapi.testclient import TestClient
+
+from spaetzli_mock_server.app import create_app
+from spaetzli_mock_server.evaluation import WatcherEngine, WatcherEvaluator
+from spaetzli_mock_server.feeds import FileFeed, InMemoryFeed, Tick
+from spaetzli_mock_server.models import Watcher
+
+VAULT_RATIO = "makervault_collateralization_ratio"
+
+
+def vault_watcher(vault_id: str, ratio: float, op: str) -> Watcher:
+    return Watcher(watcher_type=VAULT_RATIO, args={"vault_id": vault_id, "ratio": str(ratio), "op": op})
+
+
+class TestWatcherEngine:
+    """Test vectorized evaluation."""
+    
+    def test_operators_and_rising_edge(self):
+        watchers = [
+            vault_watcher("1", 150, "lt"),
+            vault_watcher("1", 150, "le"),
+            vault_watcher("2", 200, "gt"),
+            vault_watcher("3", 100, "ge"),
+            Watcher(watcher_type="unknown", args={}),
+        ]
+        engine = WatcherEngine()
+        engine.load(watchers)
+        assert len(engine) == 4
+        
+        events = engine.evaluate(Tick(VAULT_RATIO, {"1": 150.0, "2": 250.0}))
+        assert {e.identifier for e in events} == {watchers[1].identifier, watchers[2].identifier}
+        
+        # Still triggering, so nothing new is reported
+        assert engine.evaluate(Tick(VAULT_RATIO, {"1": 150.0, "2": 250.0})) == []
+        
+        events = engine.evaluate(Tick(VAULT_RATIO, {"1": 149.0, "3": 100.0}))
+        assert {e.identifier for e in events} == {watchers[0].identifier, watchers[3].identifier}
+        assert len(engine.events) == 4
+    
+    def test_partial_tick_keeps_trigger_state(self):
+        watchers = [vault_watcher("1", 150, "lt"), vault_watcher("2", 150, "lt")]
+        engine = WatcherEngine()
+        engine.load(watchers)
+        assert len(engine.evaluate(Tick(VAULT_RATIO, {"1": 100.0, "2": 100.0}))) == 2
+        
+        # Vault 2 is missing from this tick, which says nothing about its ratio
+        assert engine.evaluate(Tick(VAULT_RATIO, {"1": 100.0})) == []
+        assert engine.evaluate(Tick(VAULT_RATIO, {"1": 100.0, "2": 100.0})) == []
+        
+        # A tick with vault 2 back above the threshold ends its alert
+        assert engine.evaluate(Tick(VAULT_RATIO, {"2": 200.0})) == []
+        events = engine.evaluate(Tick(VAULT_RATIO, {"2": 100.0}))
+        assert [e.key for e in events] == ["2"]
+    
+    def test_reload_keeps_trigger_state(self):
+        watcher = vault_watcher("1", 150, "lt")
+        engine = WatcherEngine()
+        engine.load([watcher])
+        assert len(engine.evaluate(Tick(VAULT_RATIO, {"1": 100.0}))) == 1
+        
+        engine.load([watcher, vault_watcher("2", 150, "lt")])
+        events = engine.evaluate(Tick(VAULT_RATIO, {"1": 100.0, "2": 100.0}))
+        assert [e.key for e in events] == ["2"]
+    
+    def test_skips_malformed_args(self):
+        engine = WatcherEngine()
+        engine.load([
+            Watcher(watcher_type=VAULT_RATIO, args={"vault_id": "1"}),
+            Watcher(watcher_type=VAULT_RATIO, args={"vault_id": "1", "ratio": "x"}),
+            Watcher(watcher_type=VAULT_RATIO, args={"vault_id": "1", "ratio": "1", "op": "eq"}),
+        ])
+        assert len(engine) == 0
+
+
+class TestFeeds:
+    """Test tick feeds."""
+    
+    def test_in_memory_feed_drains(self):
+        feed = InMemoryFeed()
+        assert feed.poll(timeout=0.01) == []
+        feed.push(Tick(VAULT_RATIO, {"1": 1.0}))
+        feed.push(Tick(VAULT_RATIO, {"1": 2.0}))
+        assert [t.values["1"] for t in feed.poll(timeout=0.01)] == [1.0, 2.0]
+    
+    def test_file_feed_tails_complete_lines(self, tmp_path):
+        path = tmp_path / "ticks.jsonl"
+        feed = FileFeed(path)
+        assert feed.poll(timeout=0) == []
+        
+        line = json.dumps({"type": VAULT_RATIO, "values": {"24": 180.5}, "ts": 1})
+        path.write_text(line + "\n" + line[:10])
+        ticks = feed.poll(timeout=0)
+        assert len(ticks) == 1 and ticks[0].values == {"24": 180.5}
+        
+        with open(path, "a") as f:
+            f.write(line[10:] + "\n")
+        assert len(feed.poll(timeout=0)) == 1
+    
+    def test_file_feed_follows_truncation_and_rotation(self, tmp_path):
+        path = tmp_path / "ticks.jsonl"
+        feed = FileFeed(path)
+        line = lambda value: json.dumps({"type": VAULT_RATIO, "values": {"24": value}}) + "\n"
+        path.write_text(line(1.0) + line(2.0))
+        assert len(feed.poll(timeout=0)) == 2
+        
+        path.write_text(line(3.0))  # truncated in place
+        assert [t.values["24"] for t in feed.poll(timeout=0)] == [3.0]
+        
+        path.rename(tmp_path / "ticks.jsonl.1")
+        path.write_text(line(4.0) + line(5.0) + line(6.0))
+        assert [t.values["24"] for t in feed.poll(timeout=0)] == [4.0, 5.0, 6.0]
+    
+    def test_file_feed_skips_malformed_lines(self, tmp_path):
+        path = tmp_path / "ticks.jsonl"
+        line = json.dumps({"type": VAULT_RATIO, "values": {"24": 180.5}})
+        path.write_text("\n".join(["{not json", '{"values": {}}', '{"type": "x", "values": {"1": "y"}}', line]) + "\n")
+        ticks = FileFeed(path).poll(timeout=0)
+        assert [t.values for t in ticks] == [{"24": 180.5}]
+    
+    def test_evaluator_survives_feed_errors(self, storage):
+        class FlakyFeed(InMemoryFeed):
+            failures = 1
+            
+            def poll(self, timeout):
+                if self.failures:
+                    self.failures -= 1
+                    raise OSError("feed unavailable")
+                return super().poll(timeout)
+        
+        storage.add_watcher(vault_watcher("1", 150, "lt"))
+        feed = FlakyFeed()
+        evaluator = WatcherEvaluator(storage, feed, reload_interval=0, poll_timeout=0.01)
+        evaluator.start()
+        try:
+            feed.push(Tick(VAULT_RATIO, {"1": 100.0}))
+            deadline = time.monotonic() + 5
+            while not evaluator.engine.events and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            evaluator.stop()
+        assert len(evaluator.engine.events) == 1
+    
+    def test_events_listed_on_debug_route(self, config, storage, tmp_path):
+        config.debug_token = "token"
+        config.watcher_feed = tmp_path / "ticks.jsonl"
+        storage.add_watcher(vault_watcher("1", 150, "lt"))
+        headers = {"X-Debug-Token": "token"}
+        with TestClient(create_app(config, storage)) as client:
+            config.watcher_feed.write_text(json.dumps({"type": VAULT_RATIO, "values": {"1": 100}, "ts": 7}) + "\n")
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                data = client.get("/debug/watchers/events", headers=headers).json()
+                if data["events"]:
+                    break
+                time.sleep(0.01)
+        
+        assert data["watchers"] == 1
+        assert data["events"] == [
+            {"identifier": storage.get_watchers()[0].identifier, "type": VAULT_RATIO,
+             "key": "1", "value": 100.0, "threshold": 150.0, "ts": 7},
+        ]
@@ -0,0 +1,43 @@
+"""Tests for serving and reaching the mock server over a Unix socket."""
+
+import threading
+import time
+
+import pytest
+
+requests = pytest.importorskip("requests")
+uvicorn = pytest.importorskip("uvicorn")
+
+from spaetzli_mock_server.unix_http import mount_unix_adapter, socket_path_from_url, unix_socket_url
+
+
+@pytest.fixture
+def uds_server(app, tmp_path):
+    socket_path = str(tmp_path / "mock.sock")
+    server = uvicorn.Server(uvicorn.Config(app, uds=socket_path, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "server did not start"
+        time.sleep(0.01)
+    yield socket_path
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+def test_url_round_trip():
+    url = unix_socket_url("/run/spaetzli/mock.sock")
+    assert url == "http+unix://%2Frun%2Fspaetzli%2Fmock.sock"
+    assert socket_path_from_url(url + "/api/1/") == "/run/spaetzli/mock.sock"
+
+
+def test_requests_over_unix_socket(uds_server):
+    session = requests.Session()
+    mount_unix_adapter(session)
+    base = unix_socket_url(uds_server)
+    
+    assert session.get(f"{base}/health").json() == {"status": "healthy"}
+    response = session.get(f"{base}/nest/1/limits", headers={"API-KEY": "test-key"})
+    assert response.status_code == 200
+    assert "limit_of_devices" in response.json()
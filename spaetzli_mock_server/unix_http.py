@@ -0,0 +1,92 @@
+"""
+requests transport adapter for http+unix:// URLs.
+
+The socket path is percent-encoded into the host part of the URL, e.g.
+http+unix://%2Frun%2Fspaetzli%2Fmock.sock/api/1/ talks to /run/spaetzli/mock.sock.
+
+This module only depends on requests/urllib3 so it can be copied into the
+Rotki tree by scripts/apply_patch.py.
+"""
+
+import socket
+import threading
+from urllib.parse import quote, unquote, urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+SCHEME = "http+unix"
+
+
+def unix_socket_url(socket_path: str) -> str:
+    """Build the base URL for a server listening on a Unix socket."""
+    return f"{SCHEME}://{quote(socket_path, safe='')}"
+
+
+def socket_path_from_url(url: str) -> str:
+    """Extract the socket path from an http+unix:// URL."""
+    return unquote(urlparse(url).netloc)
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, **kwargs):
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+
+class UnixHTTPConnectionPool(HTTPConnectionPool):
+    """Keep-alive connection pool for one Unix socket."""
+
+    def __init__(self, socket_path: str, **kwargs):
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> UnixHTTPConnection:
+        return UnixHTTPConnection(self.socket_path, timeout=self.timeout.connect_timeout)
+
+
+class UnixAdapter(HTTPAdapter):
+    """Routes http+unix:// requests to a pooled Unix socket connection."""
+
+    def __init__(self, pool_maxsize: int = 10, **kwargs):
+        super().__init__(pool_maxsize=pool_maxsize, **kwargs)
+        self._unix_pool_maxsize = pool_maxsize
+        self._unix_pools = {}
+        self._unix_pools_lock = threading.Lock()
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self.get_connection(request.url, proxies)
+
+    def get_connection(self, url, proxies=None):
+        socket_path = socket_path_from_url(url)
+        with self._unix_pools_lock:
+            pool = self._unix_pools.get(socket_path)
+            if pool is None:
+                pool = UnixHTTPConnectionPool(socket_path, maxsize=self._unix_pool_maxsize)
+                self._unix_pools[socket_path] = pool
+            return pool
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+    def close(self):
+        super().close()
+        with self._unix_pools_lock:
+            for pool in self._unix_pools.values():
+                pool.close()
+            self._unix_pools.clear()
+
+
+def mount_unix_adapter(session) -> None:
+    """Make a requests session handle http+unix:// URLs."""
+    session.mount(f"{SCHEME}://", UnixAdapter())